@@ -1,34 +1,49 @@
 import os
-from flask import Flask, jsonify
+from flask import jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 from sqlalchemy import text
+from app.asgi import AdaptiveFlask
 from app.config import build_runtime_config, cors_origins_from_env
+from app.database import configure_engine, register_replica_routing
 from app.extensions import db, jwt
+from app.services.cancellation import RequestCancelled
 
 
 def create_app():
     load_dotenv()
-    app = Flask(__name__)
+    app = AdaptiveFlask(__name__)
 
     runtime = build_runtime_config()
     app.config.update(runtime)
     app_env = runtime["APP_ENV"]
-    database_uri = runtime["SQLALCHEMY_DATABASE_URI"]
 
     cors_origins = cors_origins_from_env()
     CORS(
         app,
         resources={r"/api/*": {"origins": cors_origins}},
         supports_credentials=False,
+        expose_headers=["X-Access-Token", "Server-Timing", "Idempotent-Replayed"],
     )
 
     db.init_app(app)
     jwt.init_app(app)
 
+    from app.middleware import register_middleware
+    from app.services.token_claims import register_token_refresh
+    from app.services.token_revocation import register_token_revocation
+
+    register_middleware(app)
+    register_token_refresh(app)
+    register_token_revocation(app)
+    if app.config.get("SQLALCHEMY_BINDS"):
+        register_replica_routing(app)
+
+    from app.migrations import register_migration_commands
     from app.routes import register_blueprints
 
     register_blueprints(app)
+    register_migration_commands(app)
 
     @app.get("/")
     def root():
@@ -58,17 +73,23 @@ def create_app():
     def not_found(_):
         return jsonify({"error": "not found"}), 404
 
+    @app.errorhandler(RequestCancelled)
+    def request_cancelled(_):
+        # nginx's "client closed request"; only seen by clients that cancelled through the API.
+        return jsonify({"error": "request cancelled"}), 499
+
     @app.errorhandler(500)
     def server_error(_):
         return jsonify({"error": "internal server error"}), 500
 
     with app.app_context():
         from app import models
+        from app.migrations import run_migrations
 
-        db.create_all()
-        if database_uri.startswith("sqlite"):
-            db.session.execute(text("PRAGMA journal_mode=WAL"))
-            db.session.execute(text("PRAGMA synchronous=NORMAL"))
-            db.session.commit()
+        for engine in db.engines.values():
+            configure_engine(engine)
+        # Replicas receive the schema through replication; only the primary is migrated here.
+        if app.config["MIGRATE_ON_STARTUP"]:
+            run_migrations(db.engine)
 
     return app
@@ -0,0 +1,313 @@
+"""ASGI serving for the upstream-bound endpoints.
+
+Views written as `async def` (chat, suggestions, downloads, generated style
+questions) are awaited on the server's event loop, so one process can hold
+hundreds of in-flight LLM/TTS waits. Every other route runs unchanged on a
+thread pool, with its request body read from the client as the view consumes
+it and its response (e.g. streamed exports) sent chunk by chunk, so neither
+is held in memory whole. Under gunicorn/WSGI the same async views still work
+through Flask's per-request event loop (asgiref's async_to_sync, which is
+why asgiref stays in the requirements).
+
+asgiref's `WsgiToAsgi` is not used here: it runs every WSGI call through
+`sync_to_async` with its default single shared thread, so requests would be
+served one at a time; it spools the whole body before the view starts; it
+never cancels a view whose client has gone; and a coroutine view would hold
+that thread for the whole upstream wait instead of yielding to the loop.
+
+On the native path everything up to the view's first `await` (before_request
+hooks, JWT verification and its revocation/user lookups in `jwt_required`)
+runs on a pool thread, and only the view's coroutine runs on the loop.
+"""
+import asyncio
+import inspect
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from flask import Flask, request_started
+from werkzeug.exceptions import HTTPException
+
+
+_native_dispatch: ContextVar[bool] = ContextVar("asgi_native_dispatch", default=False)
+# Response chunks a WSGI thread may queue ahead of a slow client.
+_QUEUED_CHUNKS = 8
+
+
+class AdaptiveFlask(Flask):
+    def ensure_sync(self, func):
+        # Decorators such as jwt_required call ensure_sync on the view they wrap; on the
+        # ASGI path hand the un-started coroutine back so it is awaited on the server loop.
+        if _native_dispatch.get() and inspect.iscoroutinefunction(func):
+            return func
+        return super().ensure_sync(func)
+
+    def _preprocess_and_dispatch(self):
+        rv = self.preprocess_request()
+        if rv is None:
+            rv = self.dispatch_request()
+        return rv
+
+    async def _full_dispatch_request_async(self):
+        self._got_first_request = True
+        try:
+            request_started.send(self, _async_wrapper=self.ensure_sync)
+            # before/after_request hooks and jwt_required touch the database (claims,
+            # revocation, replica stickiness, refreshed tokens), so they run on a thread;
+            # the thread returns the view's coroutine without starting it.
+            rv = await asyncio.to_thread(self._preprocess_and_dispatch)
+            if inspect.isawaitable(rv):
+                rv = await rv
+        except Exception as e:
+            rv = self.handle_user_exception(e)
+        return await asyncio.to_thread(self.finalize_request, rv)
+
+    async def handle_async_request(self, environ):
+        """`wsgi_app` for coroutine views: same hooks, error handling and teardown."""
+        token = _native_dispatch.set(True)
+        ctx = self.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                return await self._full_dispatch_request_async()
+            except Exception as e:
+                error = e
+                return self.handle_exception(e)
+            except:  # noqa: E722
+                error = sys.exc_info()[1]
+                raise
+        finally:
+            if error is not None and self.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+            _native_dispatch.reset(token)
+
+
+def _environ(scope: dict) -> dict:
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+        "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        # The body ends where the client's last `http.request` message says it does.
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin1").upper().replace("-", "_")
+        if name not in {"CONTENT_LENGTH", "CONTENT_TYPE"}:
+            name = f"HTTP_{name}"
+        value = raw_value.decode("latin1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def _asgi_headers(headers) -> list[tuple[bytes, bytes]]:
+    return [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]
+
+
+class _BodyStream(io.RawIOBase):
+    """`wsgi.input` for a pool thread: pulls `http.request` messages from the loop as the view reads."""
+
+    def __init__(self, receive, loop: asyncio.AbstractEventLoop):
+        self._receive = receive
+        self._loop = loop
+        self._pending = b""
+        self._more = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._more = False
+                break
+            self._pending = message.get("body", b"")
+            self._more = message.get("more_body", False)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class AsgiAdapter:
+    """ASGI callable around an AdaptiveFlask app (`uvicorn asgi:app`)."""
+
+    def __init__(self, flask_app: AdaptiveFlask, threads: int | None = None):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or int(os.getenv("ASGI_WSGI_THREADS", "12")),
+            thread_name_prefix="wsgi",
+        )
+        self.async_endpoints = {
+            endpoint
+            for endpoint, view in flask_app.view_functions.items()
+            if inspect.iscoroutinefunction(inspect.unwrap(view))
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        environ = _environ(scope)
+        if not self._is_async_route(environ):
+            environ["wsgi.input"] = io.BufferedReader(_BodyStream(receive, asyncio.get_running_loop()))
+            await self._serve_wsgi(environ, send)
+            return
+
+        # Async views parse their (small JSON) bodies on the loop, so read them up front.
+        environ["wsgi.input"] = io.BytesIO(await _read_body(receive))
+        response = await self._until_disconnect(self.flask_app.handle_async_request(environ), receive)
+        if response is None:
+            return
+        try:
+            await send(
+                {"type": "http.response.start", "status": response.status_code, "headers": _asgi_headers(response.headers.to_wsgi_list())}
+            )
+            for chunk in response.iter_encoded():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            response.close()
+
+    @staticmethod
+    async def _until_disconnect(handler, receive):
+        """Await the view, cancelling it (and its upstream calls) if the client goes away first."""
+        view = asyncio.ensure_future(handler)
+
+        async def disconnected() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        watcher = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait({view, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            view.cancel()
+            raise
+        finally:
+            watcher.cancel()
+        if not view.done():
+            view.cancel()
+            try:
+                await view
+            except asyncio.CancelledError:
+                pass
+            return None
+        return view.result()
+
+    def _is_async_route(self, environ: dict) -> bool:
+        # Preflight and HEAD keep Flask's automatic handling.
+        if environ["REQUEST_METHOD"] in {"OPTIONS", "HEAD"}:
+            return False
+        try:
+            endpoint, _args = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False
+        return endpoint in self.async_endpoints
+
+    async def _serve_wsgi(self, environ: dict, send) -> None:
+        """Run a sync route on the pool and relay its output as it is produced.
+
+        The pool thread hands chunks over through a small queue and blocks while
+        it is full, so a slow client throttles the view instead of the worker
+        buffering its whole response.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=_QUEUED_CHUNKS)
+        stop = threading.Event()
+
+        def put(item) -> None:
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def run() -> None:
+            try:
+                started = {}
+
+                def start_response(status, headers, exc_info=None):
+                    started["status"] = int(status.split(" ", 1)[0])
+                    started["headers"] = headers
+
+                iterable = self.flask_app(environ, start_response)
+                try:
+                    put(("start", started))
+                    for chunk in iterable:
+                        if stop.is_set():
+                            break
+                        if chunk:
+                            put(("body", chunk))
+                finally:
+                    if hasattr(iterable, "close"):
+                        iterable.close()
+                put(("end", None))
+            except BaseException as exc:  # handed to the loop, which owns the connection
+                put(("error", exc))
+
+        worker = loop.run_in_executor(self.executor, run)
+        finished = False
+        try:
+            while True:
+                kind, payload = await chunks.get()
+                if kind == "start":
+                    await send({"type": "http.response.start", "status": payload["status"], "headers": _asgi_headers(payload["headers"])})
+                elif kind == "body":
+                    await send({"type": "http.response.body", "body": payload, "more_body": True})
+                else:
+                    finished = True
+                    if kind == "error":
+                        raise payload
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+        finally:
+            if not finished:
+                # The client went away or the server is stopping: let the thread close the iterable.
+                stop.set()
+                while (await chunks.get())[0] not in {"end", "error"}:
+                    pass
+            await worker
+
+    async def _lifespan(self, receive, send) -> None:
+        from app.services.openai_service import close_async_client, open_async_client
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await open_async_client()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_async_client()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -1,5 +1,7 @@
 import os
 
+from app.database import engine_options, replica_binds
+
 
 def is_truthy(value: str | None, default: bool = False) -> bool:
     if value is None:
@@ -33,14 +35,13 @@ def build_runtime_config() -> dict:
         "JWT_ACCESS_TOKEN_EXPIRES": int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES_SECONDS", "86400")),
         "SQLALCHEMY_DATABASE_URI": database_uri,
         "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "SQLALCHEMY_ENGINE_OPTIONS": engine_options(database_uri),
+        # Production migrates once per deploy (gunicorn master or `flask migrate`), not in every worker.
+        "MIGRATE_ON_STARTUP": is_truthy(os.getenv("MIGRATE_ON_STARTUP"), default=not is_production),
     }
 
-    if database_uri.startswith("sqlite"):
-        config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-            "connect_args": {
-                "timeout": int(os.getenv("SQLITE_TIMEOUT_SECONDS", "30")),
-                "check_same_thread": False,
-            }
-        }
+    replicas = replica_binds()
+    if replicas:
+        config["SQLALCHEMY_BINDS"] = replicas
 
     return config
@@ -0,0 +1,199 @@
+import logging
+import os
+import random
+import tempfile
+import time
+from functools import wraps
+from pathlib import Path
+
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+
+logger = logging.getLogger("app.database")
+
+REPLICA_BIND_PREFIX = "replica_"
+_unhealthy_until: dict[str, float] = {}
+
+
+def _int_env(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def engine_options(database_uri: str) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured backend."""
+    if database_uri.startswith("sqlite"):
+        return {
+            "connect_args": {
+                "timeout": _int_env("SQLITE_TIMEOUT_SECONDS", 30),
+                "check_same_thread": False,
+            }
+        }
+    # Per gunicorn worker: pool_size + max_overflow connections at most.
+    return {
+        "pool_size": _int_env("DB_POOL_SIZE", 5),
+        "max_overflow": _int_env("DB_MAX_OVERFLOW", 5),
+        "pool_timeout": _int_env("DB_POOL_TIMEOUT_SECONDS", 10),
+        "pool_recycle": _int_env("DB_POOL_RECYCLE_SECONDS", 1800),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1").strip().lower() in {"1", "true", "yes", "on"},
+    }
+
+
+def sqlite_pragmas() -> dict[str, str]:
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": str(_int_env("SQLITE_BUSY_TIMEOUT_MS", _int_env("SQLITE_TIMEOUT_SECONDS", 30) * 1000)),
+        # Negative cache_size is in KiB rather than pages.
+        "cache_size": str(-_int_env("SQLITE_CACHE_SIZE_KB", 20000)),
+        "mmap_size": str(_int_env("SQLITE_MMAP_SIZE_BYTES", 256 * 1024 * 1024)),
+        "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _apply_postgres_settings(dbapi_connection, _connection_record):
+    timeout_ms = _int_env("DB_STATEMENT_TIMEOUT_MS", 15000)
+    if timeout_ms <= 0:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SET statement_timeout = {timeout_ms}")
+    finally:
+        cursor.close()
+    dbapi_connection.commit()
+
+
+def configure_engine(engine) -> None:
+    """Apply per-connection settings to every pooled connection, not just the first one."""
+    if engine.dialect.name == "sqlite":
+        listener = _apply_sqlite_pragmas
+    elif engine.dialect.name == "postgresql":
+        listener = _apply_postgres_settings
+    else:
+        return
+    if not event.contains(engine, "connect", listener):
+        event.listen(engine, "connect", listener)
+
+
+def dispose_engines(app) -> None:
+    """Forget pooled connections inherited from a forking parent (gunicorn --preload).
+
+    close=False leaves the parent's sockets alone; the child opens its own on first use.
+    """
+    from app.extensions import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def replica_binds() -> dict[str, str]:
+    """SQLALCHEMY_BINDS entries for DATABASE_REPLICA_URLS (comma separated)."""
+    urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    return {f"{REPLICA_BIND_PREFIX}{idx}": url for idx, url in enumerate(urls)}
+
+
+class RoutingSession(Session):
+    """Sends reads to the replica chosen for this request; flushes always go to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get("db_replica")
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _sticky_dir() -> Path:
+    return Path(os.getenv("REPLICA_STICKY_DIR", Path(tempfile.gettempdir()) / "adaptive_replica_sticky"))
+
+
+def _request_user_id() -> str | None:
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _recently_wrote(user_id: str | None) -> bool:
+    if user_id is None:
+        return False
+    # One stat() per read; files are shared by every worker on the host.
+    try:
+        written_at = (_sticky_dir() / str(user_id)).stat().st_mtime
+    except OSError:
+        return False
+    return time.time() - written_at < float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+
+def mark_user_wrote(user_id) -> None:
+    path = _sticky_dir() / str(user_id)
+    try:
+        path.touch()
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+def _choose_replica(engines) -> str | None:
+    now = time.monotonic()
+    healthy = [key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX) and _unhealthy_until.get(key, 0) <= now]
+    return random.choice(healthy) if healthy else None
+
+
+def read_only(view):
+    """Serve a pure-read view from a replica unless the requester wrote within the sticky window."""
+    from app.extensions import db
+    from app.services import metrics
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replica = _choose_replica(db.engines)
+        if replica is None or _recently_wrote(_request_user_id()):
+            return view(*args, **kwargs)
+
+        g.db_replica = replica
+        try:
+            response = view(*args, **kwargs)
+            metrics.inc_counter("db_replica_reads_total", {"replica": replica})
+            return response
+        except DBAPIError as exc:
+            # Reads are safe to repeat: park the replica and answer from the primary.
+            _unhealthy_until[replica] = time.monotonic() + float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+            metrics.inc_counter("db_replica_fallbacks_total", {"replica": replica})
+            logger.warning("replica %s failed, falling back to primary: %s", replica, exc.__class__.__name__)
+            db.session.rollback()
+            g.pop("db_replica", None)
+            return view(*args, **kwargs)
+        finally:
+            g.pop("db_replica", None)
+
+    return wrapper
+
+
+def register_replica_routing(app) -> None:
+    from app.services import metrics
+
+    metrics.describe("db_replica_reads_total", "counter", "Read-only requests answered from a replica.")
+    metrics.describe("db_replica_fallbacks_total", "counter", "Replica failures that fell back to the primary.")
+    _unhealthy_until.clear()
+
+    @app.after_request
+    def _remember_writer(response):
+        if request.method not in {"GET", "HEAD", "OPTIONS"} and response.status_code < 400:
+            user_id = _request_user_id()
+            if user_id is not None:
+                mark_user_wrote(user_id)
+        return response
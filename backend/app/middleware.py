@@ -0,0 +1,114 @@
+import logging
+import os
+import time
+
+from flask import g, request
+from flask import json as flask_json
+from flask_jwt_extended import get_jwt_identity
+
+from app.config import cors_origins_from_env, is_truthy
+from app.services import metrics
+from app.services.profiler import profiling_available, register_profiler
+from app.services.provider_telemetry import set_failure_reason
+from app.services.query_inspector import install_query_listeners, report_request_queries, request_query_count
+from app.services.request_timing import (
+    request_times,
+    request_timing_breakdown,
+    server_timing_header,
+    start_request_timing,
+)
+
+
+slow_request_logger = logging.getLogger("app.slow_requests")
+
+metrics.describe("http_requests_total", "counter", "HTTP requests by route, method and status code.")
+metrics.describe("http_request_duration_seconds", "histogram", "HTTP request latency by route and method.")
+metrics.describe("http_requests_in_flight", "gauge", "HTTP requests currently being served.")
+metrics.describe("http_request_db_queries", "histogram", "SQL statements executed per request.")
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+def _current_user_id() -> str | None:
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _attach_timings(response, breakdown: list[dict]) -> None:
+    if response.is_streamed or not response.is_json:
+        return
+    payload = response.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return
+    payload["_timings"] = breakdown
+    response.set_data(flask_json.dumps(payload))
+
+
+def register_middleware(app):
+    install_query_listeners()
+    slow_threshold_ms = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))
+    server_timing_enabled = is_truthy(os.getenv("SERVER_TIMING_ENABLED"), default=True)
+    timings_field_enabled = is_truthy(os.getenv("SERVER_TIMING_DEBUG_FIELD"))
+    origins = cors_origins_from_env()
+    timing_allow_origin = origins if isinstance(origins, str) else ", ".join(origins)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_started_at = time.perf_counter()
+        g.request_metric_labels = {"route": _route_label(), "method": request.method}
+        start_request_timing()
+        set_failure_reason(None)
+        metrics.inc_gauge("http_requests_in_flight", g.request_metric_labels)
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.get("request_started_at")
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        labels = g.request_metric_labels
+        metrics.observe("http_request_duration_seconds", labels, elapsed)
+        metrics.inc_counter("http_requests_total", dict(labels, status=str(response.status_code)))
+        query_count = request_query_count()
+        metrics.observe("http_request_db_queries", labels, query_count, buckets=QUERY_COUNT_BUCKETS)
+        report_request_queries(labels["route"])
+
+        if server_timing_enabled:
+            breakdown = request_timing_breakdown(elapsed)
+            response.headers["Server-Timing"] = server_timing_header(breakdown)
+            response.headers["Timing-Allow-Origin"] = timing_allow_origin
+            if timings_field_enabled or app.debug:
+                _attach_timings(response, breakdown)
+
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms >= slow_threshold_ms:
+            times = request_times()
+            slow_request_logger.warning(
+                "slow request route=%s method=%s status=%s user_id=%s total_ms=%.1f db_ms=%.1f queries=%d upstream_ms=%.1f",
+                labels["route"],
+                labels["method"],
+                response.status_code,
+                _current_user_id(),
+                elapsed_ms,
+                times.get("db", 0.0) * 1000,
+                query_count,
+                times.get("upstream", 0.0) * 1000,
+            )
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(_exc):
+        labels = g.pop("request_metric_labels", None)
+        if labels is not None:
+            metrics.inc_gauge("http_requests_in_flight", labels, -1)
+        metrics.flush()
+
+    # Profiling hooks are only installed when the facility is enabled for this deployment.
+    if profiling_available():
+        register_profiler(app)
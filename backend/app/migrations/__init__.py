@@ -0,0 +1,139 @@
+"""Versioned schema migrations.
+
+Each module in `app/migrations/versions` named `v<NNNN>_<slug>.py` defines
+`upgrade(conn)`; pending versions run in order, each in its own transaction,
+and are recorded in `schema_migrations`. Migrations spell out their own DDL
+(never the live models) so a version means the same schema forever, and stay
+idempotent (`IF NOT EXISTS`, `checkfirst`) for databases that predate them.
+Concurrent boots are serialized by `migration_lock`.
+"""
+import fcntl
+import importlib
+import logging
+import pkgutil
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+
+from app.migrations import versions
+
+
+logger = logging.getLogger("app.migrations")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(120), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+_MODULE = re.compile(r"^v(\d{4})_(\w+)$")
+
+
+def available_migrations() -> list[tuple[int, str, object]]:
+    found = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        match = _MODULE.match(info.name)
+        if match:
+            module = importlib.import_module(f"{versions.__name__}.{info.name}")
+            found.append((int(match.group(1)), match.group(2), module))
+    return sorted(found, key=lambda item: item[0])
+
+
+@contextmanager
+def migration_lock(engine):
+    """Hold a cross-process lock on the database's migrations (advisory lock on Postgres, file lock on SQLite)."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": 4_039_000})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": 4_039_000})
+                conn.commit()
+        return
+    database = engine.url.database if engine.dialect.name == "sqlite" else None
+    if not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.migrate.lock", "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def applied_versions(engine) -> set[int]:
+    with engine.begin() as conn:
+        conn.execute(CreateTable(schema_migrations, if_not_exists=True))
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine) -> list[int]:
+    """Apply pending migrations and return the versions applied by this call."""
+    with migration_lock(engine):
+        done = applied_versions(engine)
+        applied = []
+        for version, name, module in available_migrations():
+            if version in done:
+                continue
+            try:
+                with engine.begin() as conn:
+                    module.upgrade(conn)
+                    conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+            except IntegrityError:
+                # Another worker recorded this version first (databases without a lock).
+                continue
+            logger.info("applied migration %04d_%s", version, name)
+            applied.append(version)
+        return applied
+
+
+def migration_status(engine) -> list[dict]:
+    with migration_lock(engine):
+        done = applied_versions(engine)
+    return [{"version": v, "name": n, "applied": v in done} for v, n, _m in available_migrations()]
+
+
+def migrate_from_env() -> list[int]:
+    """Migrate the configured primary without building the app (gunicorn master, release steps)."""
+    from dotenv import load_dotenv
+    from sqlalchemy import create_engine
+
+    from app.config import build_runtime_config
+    from app.database import configure_engine
+
+    load_dotenv()
+    config = build_runtime_config()
+    engine = create_engine(config["SQLALCHEMY_DATABASE_URI"], **config["SQLALCHEMY_ENGINE_OPTIONS"])
+    configure_engine(engine)
+    try:
+        return run_migrations(engine)
+    finally:
+        engine.dispose()
+
+
+def register_migration_commands(app) -> None:
+    @app.cli.command("migrate")
+    def migrate_command():
+        """Apply pending schema migrations to the primary database."""
+        from app.extensions import db
+
+        applied = run_migrations(db.engine)
+        click.echo(f"applied: {applied or 'nothing pending'}")
+
+    @app.cli.command("migrations")
+    def migrations_command():
+        """List migrations and whether they are applied."""
+        from app.extensions import db
+
+        for row in migration_status(db.engine):
+            click.echo(f"{row['version']:04d} {row['name']:<30} {'applied' if row['applied'] else 'pending'}")
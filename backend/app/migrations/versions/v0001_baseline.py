@@ -0,0 +1,110 @@
+"""Schema as of the first versioned release; a no-op for databases created by the old create_all().
+
+The tables are spelled out here rather than taken from app.models, so this
+migration keeps meaning the same thing after the models change. Later
+schema changes belong in new migrations.
+"""
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text
+
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("name", String(120), nullable=False),
+    Column("email", String(255), nullable=False, unique=True, index=True),
+    Column("password_hash", String(255), nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Column("updated_at", DateTime, nullable=False),
+)
+Table(
+    "learning_style",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("learning_style", String(20), nullable=False),
+    Column("visual_score", Integer, nullable=False),
+    Column("auditory_score", Integer, nullable=False),
+    Column("kinesthetic_score", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+Table(
+    "chat_history",
+    metadata,
+    Column("chat_id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("question", Text, nullable=False),
+    Column("response", Text, nullable=False),
+    Column("response_type", String(20), nullable=False),
+    Column("learning_style_used", String(20), nullable=False),
+    Column("timestamp", DateTime, nullable=False, index=True),
+)
+Table(
+    "chat_feedback",
+    metadata,
+    Column("feedback_id", Integer, primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chat_history.chat_id"), nullable=False, index=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("rating", Integer, nullable=False),
+    Column("comment", String(600)),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+Table(
+    "practice_activity",
+    metadata,
+    Column("activity_id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("task_name", String(200), nullable=False),
+    Column("status", String(40), nullable=False),
+    Column("code_submitted", Text),
+    Column("time_spent", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+Table(
+    "downloads",
+    metadata,
+    Column("download_id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("content_type", String(50), nullable=False),
+    Column("file_path", String(255), nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+)
+Table(
+    "claims_versions",
+    metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False, index=True),
+)
+Table(
+    "revoked_tokens",
+    metadata,
+    Column("jti", String(64), primary_key=True),
+    Column("user_id", Integer, nullable=False, index=True),
+    Column("expires_at", DateTime, nullable=False, index=True),
+    Column("revoked_at", DateTime, nullable=False, index=True),
+)
+Table(
+    "token_watermarks",
+    metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("not_before_ms", BigInteger, nullable=False),
+    Column("updated_at", DateTime, nullable=False, index=True),
+)
+Table(
+    "password_reset_tokens",
+    metadata,
+    Column("token", String(128), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("expires_at", DateTime, nullable=False),
+    Column("used", Boolean, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn)
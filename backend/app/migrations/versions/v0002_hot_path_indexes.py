@@ -0,0 +1,24 @@
+"""Composite indexes for per-user history/download/practice listings and one feedback row per chat."""
+from sqlalchemy import text
+
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_chat_history_user_timestamp ON chat_history (user_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_history_timestamp ON chat_history (timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_downloads_user_timestamp ON downloads (user_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_practice_activity_user_updated ON practice_activity (user_id, updated_at DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_users_created_at ON users (created_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_chat_feedback_chat_user ON chat_feedback (chat_id, user_id)",
+]
+
+
+def upgrade(conn):
+    # Keep the newest feedback per (chat, user) so the unique index can be built.
+    conn.execute(
+        text(
+            "DELETE FROM chat_feedback WHERE feedback_id NOT IN "
+            "(SELECT MAX(feedback_id) FROM chat_feedback GROUP BY chat_id, user_id)"
+        )
+    )
+    for statement in INDEXES:
+        conn.execute(text(statement))
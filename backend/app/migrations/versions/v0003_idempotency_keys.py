@@ -0,0 +1,20 @@
+"""Stored responses for POST requests retried with the same Idempotency-Key."""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text
+
+
+idempotency_keys = Table(
+    "idempotency_keys",
+    MetaData(),
+    Column("key_hash", String(64), primary_key=True),
+    Column("user_id", Integer, nullable=False, index=True),
+    Column("request_hash", String(64), nullable=False),
+    Column("status", String(20), nullable=False),
+    Column("status_code", Integer),
+    Column("response_body", Text),
+    Column("created_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False, index=True),
+)
+
+
+def upgrade(conn):
+    idempotency_keys.create(conn, checkfirst=True)
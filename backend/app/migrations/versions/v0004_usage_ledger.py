@@ -0,0 +1,19 @@
+"""Per-user, per-day upstream usage (tokens, images, TTS characters) for quotas and the admin report."""
+from sqlalchemy import BigInteger, Column, Date, DateTime, Integer, MetaData, Table
+
+
+usage_ledger = Table(
+    "usage_ledger",
+    MetaData(),
+    Column("user_id", Integer, primary_key=True),
+    Column("day", Date, primary_key=True, index=True),
+    Column("tokens", BigInteger, nullable=False),
+    Column("images", Integer, nullable=False),
+    Column("tts_chars", BigInteger, nullable=False),
+    Column("calls", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+def upgrade(conn):
+    usage_ledger.create(conn, checkfirst=True)
@@ -0,0 +1,20 @@
+"""MinHash signatures of answered questions, used to reuse answers for paraphrased questions."""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary, MetaData, String, Table
+
+
+metadata = MetaData()
+# Only here so the foreign key resolves; created by the baseline.
+Table("chat_history", metadata, Column("chat_id", Integer, primary_key=True))
+question_signatures = Table(
+    "question_signatures",
+    metadata,
+    Column("signature_id", Integer, primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chat_history.chat_id"), nullable=False, unique=True),
+    Column("learning_style", String(20), nullable=False),
+    Column("signature", LargeBinary, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+
+def upgrade(conn):
+    question_signatures.create(conn, checkfirst=True)
@@ -0,0 +1,22 @@
+"""Status rows for background roster imports."""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text
+
+
+roster_import_jobs = Table(
+    "roster_import_jobs",
+    MetaData(),
+    Column("job_id", String(32), primary_key=True),
+    Column("created_by", Integer, nullable=False, index=True),
+    Column("status", String(20), nullable=False),
+    Column("total", Integer, nullable=False),
+    Column("processed", Integer, nullable=False),
+    Column("summary", Text),
+    Column("report", Text),
+    Column("error", String(255)),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+def upgrade(conn):
+    roster_import_jobs.create(conn, checkfirst=True)
@@ -0,0 +1,6 @@
+"""Index question_signatures.created_at for the answer index's overlapping refreshes."""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_question_signatures_created_at ON question_signatures (created_at)"))
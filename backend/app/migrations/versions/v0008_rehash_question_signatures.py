@@ -0,0 +1,9 @@
+"""Drop question signatures hashed with the old filler list (it dropped Java keywords such as "for" and "do").
+
+The rows only enable answer reuse; questions answered from now on are indexed again.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("DELETE FROM question_signatures"))
@@ -10,7 +10,7 @@ class User(db.Model):
     name = db.Column(db.String(120), nullable=False)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
@@ -35,7 +35,7 @@ class ChatHistory(db.Model):
     response = db.Column(db.Text, nullable=False)
     response_type = db.Column(db.String(20), nullable=False)
     learning_style_used = db.Column(db.String(20), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
 
 class ChatFeedback(db.Model):
@@ -73,6 +73,41 @@ class Download(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 
+# Composite indexes for the per-user listings (newest first); existing databases
+# get them from migration 0002.
+db.Index("ix_chat_history_user_timestamp", ChatHistory.user_id, ChatHistory.timestamp.desc())
+db.Index("ix_downloads_user_timestamp", Download.user_id, Download.timestamp.desc())
+db.Index("ix_practice_activity_user_updated", PracticeActivity.user_id, PracticeActivity.updated_at.desc())
+db.Index("uq_chat_feedback_chat_user", ChatFeedback.chat_id, ChatFeedback.user_id, unique=True)
+
+
+class ClaimsVersion(db.Model):
+    __tablename__ = "claims_versions"
+
+    # No FK to users: the row must outlive account deletion so stale tokens are detected.
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class TokenWatermark(db.Model):
+    __tablename__ = "token_watermarks"
+
+    # Tokens for this user issued before `not_before_ms` are rejected; kept after account deletion.
+    user_id = db.Column(db.Integer, primary_key=True)
+    not_before_ms = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 class PasswordResetToken(db.Model):
     __tablename__ = "password_reset_tokens"
 
@@ -90,3 +125,57 @@ class PasswordResetToken(db.Model):
             expires_at=datetime.utcnow() + timedelta(minutes=max(5, ttl_minutes)),
             used=False,
         )
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of (user, endpoint, Idempotency-Key header), so keys from different users never collide.
+    key_hash = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending/done
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class UsageLedger(db.Model):
+    __tablename__ = "usage_ledger"
+
+    # One row per user per UTC day; workers add to it in batches (see services/usage_ledger.py).
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    tokens = db.Column(db.BigInteger, default=0, nullable=False)
+    images = db.Column(db.Integer, default=0, nullable=False)
+    tts_chars = db.Column(db.BigInteger, default=0, nullable=False)
+    calls = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class QuestionSignature(db.Model):
+    __tablename__ = "question_signatures"
+
+    # MinHash signature of an AI-answered ChatHistory question (see services/answer_index.py).
+    signature_id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey("chat_history.chat_id"), nullable=False, unique=True)
+    learning_style = db.Column(db.String(20), nullable=False)
+    signature = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class RosterImportJob(db.Model):
+    __tablename__ = "roster_import_jobs"
+
+    # Progress of a background roster import (see services/roster_import.py).
+    job_id = db.Column(db.String(32), primary_key=True)
+    created_by = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), default="queued", nullable=False)  # queued/importing/upgrading_hashes/done/failed
+    total = db.Column(db.Integer, default=0, nullable=False)
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    summary = db.Column(db.Text, nullable=True)
+    report = db.Column(db.Text, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -1,13 +1,14 @@
-from app.routes.admin import admin_bp
-from app.routes.auth import auth_bp
-from app.routes.chat import chat_bp
-from app.routes.dashboard import dashboard_bp
-from app.routes.download import download_bp
-from app.routes.practice import practice_bp
-from app.routes.style import style_bp
-
-
 def register_blueprints(app):
+    # Imported here so `app.routes` (and the services behind it) only loads when an app is built.
+    from app.routes.admin import admin_bp
+    from app.routes.auth import auth_bp
+    from app.routes.chat import chat_bp
+    from app.routes.dashboard import dashboard_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.download import download_bp
+    from app.routes.practice import practice_bp
+    from app.routes.style import style_bp
+
     # Public/auth and learner flows
     app.register_blueprint(auth_bp)
     app.register_blueprint(style_bp)
@@ -17,3 +18,5 @@ def register_blueprints(app):
     app.register_blueprint(dashboard_bp)
     # Admin only
     app.register_blueprint(admin_bp)
+    # Operations
+    app.register_blueprint(metrics_bp)
@@ -1,12 +1,22 @@
 from datetime import datetime, timedelta
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func
 
+from app.database import read_only
 from app.extensions import db
 from app.models import User, LearningStyle, ChatHistory, PracticeActivity, Download, ChatFeedback
 from app.services.admin_auth import is_admin_email
+from app.services.export_service import EXPORT_DATASETS, EXPORT_FORMATS, export_filename, parse_export_date, stream_export
+from app.services import profiler
+from app.services.cancellation import wasted_report
+from app.services.provider_resilience import breaker_states
+from app.services.provider_telemetry import provider_report
+from app.services.roster_import import RosterError, job_status, parse_roster, start_import_job
+from app.services.token_claims import current_is_admin
+from app.services.token_revocation import revoke_all_for_user
+from app.services.usage_ledger import top_consumers
 from app.services.user_cleanup import delete_user_with_related_data
 
 
@@ -15,16 +25,17 @@ admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 
 def _require_admin():
     user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user:
+    is_admin = current_is_admin(user_id)
+    if is_admin is None:
         return None, (jsonify({"error": "user not found"}), 404)
-    if not is_admin_email(user.email):
+    if not is_admin:
         return None, (jsonify({"error": "admin access required"}), 403)
-    return user, None
+    return user_id, None
 
 
 @admin_bp.get("/summary")
 @jwt_required()
+@read_only
 def summary():
     _, err = _require_admin()
     if err:
@@ -77,6 +88,7 @@ def summary():
 
 @admin_bp.get("/users")
 @jwt_required()
+@read_only
 def users():
     _, err = _require_admin()
     if err:
@@ -89,24 +101,48 @@ def users():
         query = query.filter((User.name.ilike(pattern)) | (User.email.ilike(pattern)))
 
     rows = query.order_by(User.created_at.desc()).limit(200).all()
+    user_ids = [u.user_id for u in rows]
+    styles, chats, downloads, practice = {}, {}, {}, {}
+    if user_ids:
+        # One grouped query per table instead of four lookups per listed user.
+        styles = dict(
+            db.session.query(LearningStyle.user_id, LearningStyle.learning_style)
+            .filter(LearningStyle.user_id.in_(user_ids))
+            .all()
+        )
+        chats = dict(
+            db.session.query(ChatHistory.user_id, func.count(ChatHistory.chat_id))
+            .filter(ChatHistory.user_id.in_(user_ids))
+            .group_by(ChatHistory.user_id)
+            .all()
+        )
+        downloads = dict(
+            db.session.query(Download.user_id, func.count(Download.download_id))
+            .filter(Download.user_id.in_(user_ids))
+            .group_by(Download.user_id)
+            .all()
+        )
+        practice = dict(
+            db.session.query(PracticeActivity.user_id, func.count(PracticeActivity.activity_id))
+            .filter(PracticeActivity.user_id.in_(user_ids))
+            .group_by(PracticeActivity.user_id)
+            .all()
+        )
+
     result = []
     for u in rows:
-        style = LearningStyle.query.get(u.user_id)
-        chats = db.session.query(func.count(ChatHistory.chat_id)).filter(ChatHistory.user_id == u.user_id).scalar() or 0
-        downloads = db.session.query(func.count(Download.download_id)).filter(Download.user_id == u.user_id).scalar() or 0
-        practice = db.session.query(func.count(PracticeActivity.activity_id)).filter(PracticeActivity.user_id == u.user_id).scalar() or 0
         result.append(
             {
                 "user_id": u.user_id,
                 "name": u.name,
                 "email": u.email,
                 "is_admin": is_admin_email(u.email),
-                "learning_style": style.learning_style if style else None,
+                "learning_style": styles.get(u.user_id),
                 "created_at": u.created_at.isoformat(),
                 "stats": {
-                    "chats": chats,
-                    "downloads": downloads,
-                    "practice": practice,
+                    "chats": chats.get(u.user_id, 0),
+                    "downloads": downloads.get(u.user_id, 0),
+                    "practice": practice.get(u.user_id, 0),
                 },
             }
         )
@@ -116,10 +152,10 @@ def users():
 @admin_bp.delete("/users/<int:user_id>")
 @jwt_required()
 def delete_user(user_id: int):
-    admin_user, err = _require_admin()
+    admin_id, err = _require_admin()
     if err:
         return err
-    if admin_user.user_id == user_id:
+    if admin_id == user_id:
         return jsonify({"error": "cannot delete own admin account"}), 400
 
     target = User.query.get(user_id)
@@ -130,8 +166,60 @@ def delete_user(user_id: int):
     return jsonify({"message": "user deleted", "user_id": user_id})
 
 
+@admin_bp.post("/users/<int:user_id>/revoke-tokens")
+@jwt_required()
+def revoke_user_tokens(user_id: int):
+    _, err = _require_admin()
+    if err:
+        return err
+    if not db.session.get(User, user_id):
+        return jsonify({"error": "user not found"}), 404
+
+    revoke_all_for_user(user_id)
+    db.session.commit()
+    return jsonify({"message": "tokens revoked", "user_id": user_id})
+
+
+@admin_bp.post("/users/import")
+@jwt_required()
+def import_users():
+    admin_id, err = _require_admin()
+    if err:
+        return err
+
+    upload = request.files.get("file")
+    if upload is not None:
+        raw = upload.read().decode("utf-8-sig", errors="replace")
+        fmt = "json" if (upload.filename or "").lower().endswith(".json") else "csv"
+    else:
+        raw = request.get_data(as_text=True)
+        fmt = "json" if request.is_json else "csv"
+    if not raw.strip():
+        return jsonify({"error": "roster is empty"}), 400
+
+    try:
+        rows = parse_roster(raw, fmt)
+    except RosterError as exc:
+        return jsonify({"error": str(exc)}), 400
+    job = start_import_job(rows, admin_id)
+    return jsonify(job), 202, {"Location": job["status_url"]}
+
+
+@admin_bp.get("/users/import/<job_id>")
+@jwt_required()
+def import_status(job_id: str):
+    _, err = _require_admin()
+    if err:
+        return err
+    job = job_status(job_id)
+    if job is None:
+        return jsonify({"error": "import job not found"}), 404
+    return jsonify(job)
+
+
 @admin_bp.get("/analytics")
 @jwt_required()
+@read_only
 def analytics():
     _, err = _require_admin()
     if err:
@@ -186,3 +274,142 @@ def analytics():
             },
         }
     )
+
+
+@admin_bp.get("/providers")
+@jwt_required()
+def providers():
+    _, err = _require_admin()
+    if err:
+        return err
+    report = provider_report()
+    report["breakers"] = breaker_states()
+    report["cancellations"] = wasted_report()
+    return jsonify(report)
+
+
+@admin_bp.get("/usage")
+@jwt_required()
+def usage():
+    _, err = _require_admin()
+    if err:
+        return err
+    try:
+        days = min(90, max(1, int(request.args.get("days", 7))))
+        limit = min(200, max(1, int(request.args.get("limit", 20))))
+    except ValueError:
+        return jsonify({"error": "days and limit must be integers"}), 400
+    return jsonify(top_consumers(days=days, limit=limit))
+
+
+@admin_bp.get("/profiling")
+@jwt_required()
+def profiling_status():
+    _, err = _require_admin()
+    if err:
+        return err
+    return jsonify(
+        {
+            "available": profiler.profiling_available(),
+            "settings": profiler.load_settings(),
+            "results": profiler.list_results(),
+        }
+    )
+
+
+@admin_bp.put("/profiling")
+@jwt_required()
+def start_profiling():
+    _, err = _require_admin()
+    if err:
+        return err
+    if not profiler.profiling_available():
+        return jsonify({"error": "profiling is disabled; set PROFILING_ENABLED=1"}), 409
+
+    data = request.get_json() or {}
+    try:
+        sample_rate = float(data.get("sample_rate", 0.05))
+        duration_seconds = int(data.get("duration_seconds", 300))
+        max_profiles = int(data.get("max_profiles", 50))
+    except (TypeError, ValueError):
+        return jsonify({"error": "sample_rate, duration_seconds and max_profiles must be numbers"}), 400
+    routes = data.get("routes") or []
+    if not isinstance(routes, list):
+        return jsonify({"error": "routes must be a list of route rules"}), 400
+
+    settings = profiler.configure(
+        sample_rate=sample_rate,
+        routes=[str(r) for r in routes],
+        duration_seconds=duration_seconds,
+        use_tracemalloc=bool(data.get("tracemalloc", False)),
+        max_profiles=max_profiles,
+    )
+    return jsonify({"message": "profiling session started", "settings": settings})
+
+
+@admin_bp.delete("/profiling")
+@jwt_required()
+def stop_profiling():
+    _, err = _require_admin()
+    if err:
+        return err
+    return jsonify({"message": "profiling stopped", "settings": profiler.disable()})
+
+
+@admin_bp.post("/profiling/snapshot")
+@jwt_required()
+def tracemalloc_snapshot():
+    _, err = _require_admin()
+    if err:
+        return err
+    if not profiler.profiling_available():
+        return jsonify({"error": "profiling is disabled; set PROFILING_ENABLED=1"}), 409
+    result = profiler.capture_tracemalloc_snapshot()
+    if "error" in result:
+        return jsonify(result), 409
+    return jsonify(result)
+
+
+@admin_bp.get("/profiling/files/<name>")
+@jwt_required()
+def profiling_file(name: str):
+    _, err = _require_admin()
+    if err:
+        return err
+    path = profiler.result_path(name)
+    if not path:
+        return jsonify({"error": "profile not found"}), 404
+    return send_file(path, as_attachment=True)
+
+
+@admin_bp.get("/export")
+@jwt_required()
+def export_data():
+    _, err = _require_admin()
+    if err:
+        return err
+
+    dataset = (request.args.get("dataset") or "chats").strip().lower()
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({"error": f"dataset must be one of {sorted(EXPORT_DATASETS)}"}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {sorted(EXPORT_FORMATS)}"}), 400
+
+    try:
+        filters = {
+            "user_id": int(request.args["user_id"]) if request.args.get("user_id") else None,
+            "since": parse_export_date(request.args.get("since")),
+            "until": parse_export_date(request.args.get("until")),
+        }
+    except ValueError:
+        return jsonify({"error": "user_id must be an integer and since/until ISO dates"}), 400
+    filters["style"] = (request.args.get("style") or "").strip().lower() or None
+    filters["status"] = (request.args.get("status") or "").strip() or None
+    filters["content_type"] = (request.args.get("content_type") or "").strip() or None
+
+    return Response(
+        stream_with_context(stream_export(dataset, fmt, filters)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={export_filename(dataset, fmt, filters['user_id'])}"},
+    )
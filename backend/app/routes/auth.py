@@ -1,16 +1,26 @@
 from datetime import datetime
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from app.extensions import db
 from app.models import User, PasswordResetToken
 from app.services.admin_auth import is_admin_email
+from app.services.export_service import EXPORT_DATASETS, EXPORT_FORMATS, export_filename, stream_export
+from app.services.password_hashing import HashingBusyError, hash_password, verify_and_upgrade
+from app.services.token_claims import bump_claims_version, issue_access_token_for
+from app.services.token_revocation import revoke_all_for_user, revoke_token
 from app.services.user_cleanup import delete_user_with_related_data
 
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
 
+@auth_bp.errorhandler(HashingBusyError)
+def hashing_busy(_exc):
+    response = jsonify({"error": "too many sign-in requests, please retry shortly"})
+    response.headers["Retry-After"] = "2"
+    return response, 503
+
+
 @auth_bp.post("/register")
 def register():
     data = request.get_json() or {}
@@ -26,7 +36,7 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({"error": "email already exists"}), 409
 
-    user = User(name=name, email=email, password_hash=generate_password_hash(password))
+    user = User(name=name, email=email, password_hash=hash_password(password))
     db.session.add(user)
     db.session.commit()
 
@@ -40,10 +50,11 @@ def login():
     password = data.get("password", "")
 
     user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user or not verify_and_upgrade(user, password):
         return jsonify({"error": "invalid credentials"}), 401
+    db.session.commit()
 
-    token = create_access_token(identity=str(user.user_id))
+    token = issue_access_token_for(user)
     user_payload = {
         "user_id": user.user_id,
         "name": user.name,
@@ -65,12 +76,13 @@ def login_user():
     password = data.get("password", "")
 
     user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user or not verify_and_upgrade(user, password):
         return jsonify({"error": "invalid credentials"}), 401
+    db.session.commit()
     if is_admin_email(user.email):
         return jsonify({"error": "use admin login for this account"}), 403
 
-    token = create_access_token(identity=str(user.user_id))
+    token = issue_access_token_for(user)
     return jsonify(
         {
             "access_token": token,
@@ -91,12 +103,13 @@ def login_admin():
     password = data.get("password", "")
 
     user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user or not verify_and_upgrade(user, password):
         return jsonify({"error": "invalid credentials"}), 401
+    db.session.commit()
     if not is_admin_email(user.email):
         return jsonify({"error": "admin access required"}), 403
 
-    token = create_access_token(identity=str(user.user_id))
+    token = issue_access_token_for(user)
     return jsonify(
         {
             "access_token": token,
@@ -150,13 +163,19 @@ def update_me():
         existing = User.query.filter(User.email == email, User.user_id != user_id).first()
         if existing:
             return jsonify({"error": "email already exists"}), 409
+        if email != user.email:
+            # Admin role is derived from the email, so outstanding claims go stale.
+            bump_claims_version(user_id)
         user.email = email
 
     if "password" in data:
         password = str(data.get("password", ""))
         if len(password) < 6:
             return jsonify({"error": "password must be at least 6 characters"}), 400
-        user.password_hash = generate_password_hash(password)
+        user.password_hash = hash_password(password)
+        # Sign out other sessions; this one gets a fresh token via X-Access-Token.
+        revoke_all_for_user(user_id)
+        g.claims_refresh_user = user_id
 
     db.session.commit()
     return jsonify(
@@ -172,10 +191,30 @@ def update_me():
     )
 
 
+@auth_bp.get("/me/export")
+@jwt_required()
+def export_me():
+    user_id = int(get_jwt_identity())
+    dataset = (request.args.get("dataset") or "chats").strip().lower()
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({"error": f"dataset must be one of {sorted(EXPORT_DATASETS)}"}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {sorted(EXPORT_FORMATS)}"}), 400
+
+    return Response(
+        stream_with_context(stream_export(dataset, fmt, {"user_id": user_id})),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={export_filename(dataset, fmt, user_id)}"},
+    )
+
+
 @auth_bp.post("/logout")
 @jwt_required()
 def logout():
-    return jsonify({"message": "logout successful on client token removal"})
+    revoke_token(get_jwt())
+    db.session.commit()
+    return jsonify({"message": "logout successful"})
 
 
 @auth_bp.delete("/me")
@@ -232,7 +271,8 @@ def reset_password():
     if not user:
         return jsonify({"error": "user not found"}), 404
 
-    user.password_hash = generate_password_hash(new_password)
+    user.password_hash = hash_password(new_password)
+    revoke_all_for_user(user.user_id)
     token_row.used = True
     db.session.commit()
     return jsonify({"message": "password reset successful"})
@@ -1,17 +1,32 @@
+import asyncio
+import os
+
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.config import is_truthy
+from app.database import read_only
 from app.extensions import db
-from app.models import LearningStyle, ChatHistory, Download, ChatFeedback
-from app.services.chatbot_service import generate_adaptive_response, get_quick_prompts
-from app.services.download_service import create_download_file
-from app.services.practice_task_service import generate_practice_tasks_from_topic
+from app.models import ChatHistory, Download, ChatFeedback
+from app.services import answer_index
+from app.services.cancellation import cancel_scope, check_cancelled, request_cancel
+from app.services.chatbot_service import agenerate_adaptive_response, aget_quick_prompts
+from app.services.deadlines import deadline
+from app.services.download_service import acreate_download_file, create_download_file
+from app.services.idempotency import idempotent
+from app.services.practice_task_service import agenerate_practice_tasks_from_topic
+from app.services.rate_limiter import priority
+from app.services.request_timing import timed
+from app.services.token_claims import current_learning_style
+from app.services.usage_ledger import usage_scope
+from app.services.write_queue import insert_rows
 
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api/chat")
 
 
 def _auto_generate_resources(user_id: int, style: str, topic: str, base_content: str) -> list[dict]:
+    """Write the resource files; rows are inserted later together with the chat turn."""
     resources = []
     # Keep this lightweight to avoid chatbot timeouts.
     content_types = ["pdf", "task_sheet", "solution"]
@@ -48,70 +63,106 @@ def _auto_generate_resources(user_id: int, style: str, topic: str, base_content:
                 f"{base_content[:2800]}"
             )
 
-        file_path = create_download_file(user_id, ctype, asset_text)
-        row = Download(user_id=user_id, content_type=ctype, file_path=file_path)
-        db.session.add(row)
-        db.session.flush()
-        resources.append(
-            {
-                "download_id": row.download_id,
-                "content_type": ctype,
-                "download_url": f"/api/downloads/file/{row.download_id}",
-            }
-        )
+        resources.append({"content_type": ctype, "file_path": create_download_file(user_id, ctype, asset_text)})
     return resources
 
 
 @chat_bp.post("/")
 @jwt_required()
-def ask_chatbot():
+@idempotent
+async def ask_chatbot():
     user_id = int(get_jwt_identity())
     payload = request.get_json() or {}
     question = payload.get("question", "").strip()
     if not question:
         return jsonify({"error": "question is required"}), 400
 
-    style_row = LearningStyle.query.get(user_id)
-    if not style_row:
+    # Usually answered from the token's claims, but stale claims fall back to the database.
+    learning_style = await asyncio.to_thread(current_learning_style, user_id)
+    if not learning_style:
         return jsonify({"error": "learning style not found"}), 400
 
     requested_style = str(payload.get("style_override", "")).strip().lower()
-    effective_style = requested_style if requested_style in {"visual", "auditory", "kinesthetic"} else style_row.learning_style
+    effective_style = requested_style if requested_style in {"visual", "auditory", "kinesthetic"} else learning_style
 
-    result = generate_adaptive_response(question, effective_style)
-    practice_tasks, practice_source = generate_practice_tasks_from_topic(question, count=3, allow_ai=True)
-    audio_download_id = None
-    try:
-        auto_resources = _auto_generate_resources(
+    with (
+        cancel_scope(user_id, request.headers.get("X-Request-ID")),
+        usage_scope(user_id) as usage,
+        deadline("chat", 45),
+    ):
+        reused = await asyncio.to_thread(answer_index.find, question, effective_style)
+        result, (practice_tasks, practice_source) = await asyncio.gather(
+            agenerate_adaptive_response(question, effective_style, reused["text"] if reused else None),
+            agenerate_practice_tasks_from_topic(question, count=3, allow_ai=True),
+        )
+        check_cancelled()
+        # Generate every file before touching the database so the write transaction stays short;
+        # the writes go to a thread so a slow disk never stalls the loop.
+        auto_resources = await asyncio.to_thread(
+            _auto_generate_resources,
             user_id=user_id,
             style=effective_style,
             topic=question,
             base_content=result["text"],
         )
-
+        audio_path = None
         if effective_style == "auditory":
             audio_text = result.get("assets", {}).get("audio_script") or result.get("text", "")
-            audio_path = create_download_file(user_id, "audio", audio_text)
-            audio_row = Download(user_id=user_id, content_type="audio", file_path=audio_path)
-            db.session.add(audio_row)
-            db.session.flush()
-            audio_download_id = audio_row.download_id
+            audio_path = await acreate_download_file(user_id, "audio", audio_text)
+        check_cancelled()
 
-        history = ChatHistory(
-            user_id=user_id,
-            question=question,
-            response=result["text"],
-            response_type=result["response_type"],
-            learning_style_used=effective_style,
+    rows = [
+        (Download, {"user_id": user_id, "content_type": r["content_type"], "file_path": r["file_path"]})
+        for r in auto_resources
+    ]
+    if audio_path:
+        rows.append((Download, {"user_id": user_id, "content_type": "audio", "file_path": audio_path}))
+    rows.append(
+        (
+            ChatHistory,
+            {
+                "user_id": user_id,
+                "question": question,
+                "response": result["text"],
+                "response_type": result["response_type"],
+                "learning_style_used": effective_style,
+            },
         )
-        db.session.add(history)
-        db.session.commit()
+    )
+    try:
+        with timed("db-commit"):
+            # Off the event loop: the write may wait on the SQLite writer or the pool.
+            *download_ids, chat_id = await asyncio.to_thread(insert_rows, rows)
     except SQLAlchemyError:
         db.session.rollback()
         return jsonify({"error": "temporary database issue. please retry"}), 503
 
+    if reused:
+        if is_truthy(os.getenv("ANSWER_REUSE_FLAG"), default=True):
+            # The reused chat may be another learner's, so its id stays private.
+            result["reused_answer"] = {"similarity": reused["similarity"]}
+    elif result["ai_used"]:
+        try:
+            await asyncio.to_thread(answer_index.remember, chat_id, effective_style, question)
+        except SQLAlchemyError:
+            # The chat is saved; only future reuse of this answer is lost.
+            db.session.rollback()
+
+    audio_download_id = download_ids.pop() if audio_path else None
+    auto_resources = [
+        {
+            "download_id": download_id,
+            "content_type": resource["content_type"],
+            "download_url": f"/api/downloads/file/{download_id}",
+        }
+        for resource, download_id in zip(auto_resources, download_ids)
+    ]
+
+    if usage.limited:
+        # Over a daily quota: the answer above is the offline fallback.
+        result["quota_exceeded"] = True
     result["auto_resources"] = auto_resources
-    result["chat_id"] = history.chat_id
+    result["chat_id"] = chat_id
     if audio_download_id:
         result["audio_download_id"] = audio_download_id
     if effective_style == "kinesthetic":
@@ -123,8 +174,19 @@ def ask_chatbot():
     return jsonify(result)
 
 
+@chat_bp.post("/cancel/<request_id>")
+@jwt_required()
+def cancel_request(request_id: str):
+    """Stop upstream work for one of the caller's in-flight requests (matched on its X-Request-ID)."""
+    user_id = int(get_jwt_identity())
+    if not request_cancel(user_id, request_id):
+        return jsonify({"error": "invalid request id"}), 400
+    return jsonify({"message": "cancellation requested", "request_id": request_id}), 202
+
+
 @chat_bp.get("/history")
 @jwt_required()
+@read_only
 def chat_history():
     user_id = int(get_jwt_identity())
     rows = (
@@ -159,13 +221,13 @@ def chat_history():
 
 @chat_bp.get("/suggestions")
 @jwt_required()
-def chat_suggestions():
+async def chat_suggestions():
     user_id = int(get_jwt_identity())
     topic = (request.args.get("topic") or "").strip()
     requested_style = (request.args.get("style_override") or "").strip().lower()
-    style_row = LearningStyle.query.get(user_id)
-    style = requested_style if requested_style in {"visual", "auditory", "kinesthetic"} else (style_row.learning_style if style_row else "visual")
-    prompts = get_quick_prompts(topic or "Java basics", style)
+    style = requested_style if requested_style in {"visual", "auditory", "kinesthetic"} else (await asyncio.to_thread(current_learning_style, user_id) or "visual")
+    with usage_scope(user_id), priority("suggestions"), deadline("suggestions", 12):
+        prompts = await aget_quick_prompts(topic or "Java basics", style)
     return jsonify({"topic": topic or "Java basics", "prompts": prompts})
 
 
@@ -177,6 +239,7 @@ def delete_chat_item(chat_id: int):
     if not row:
         return jsonify({"error": "chat not found"}), 404
     ChatFeedback.query.filter_by(chat_id=chat_id, user_id=user_id).delete()
+    answer_index.forget([chat_id])
     db.session.delete(row)
     db.session.commit()
     return jsonify({"message": "chat deleted", "chat_id": chat_id})
@@ -193,6 +256,7 @@ def clear_history():
                 ChatFeedback.user_id == user_id,
                 ChatFeedback.chat_id.in_(chat_ids),
             ).delete(synchronize_session=False)
+            answer_index.forget(chat_ids)
         ChatHistory.query.filter_by(user_id=user_id).delete()
         db.session.commit()
         return jsonify({"message": "chat history cleared"})
@@ -225,10 +289,15 @@ def chat_feedback():
 
     row = ChatFeedback.query.filter_by(chat_id=chat_id, user_id=user_id).first()
     if not row:
-        row = ChatFeedback(chat_id=chat_id, user_id=user_id, rating=rating, comment=comment or None)
-        db.session.add(row)
-    else:
+        db.session.add(ChatFeedback(chat_id=chat_id, user_id=user_id, rating=rating, comment=comment or None))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent first rating won the unique (chat_id, user_id) index; update it instead.
+            db.session.rollback()
+            row = ChatFeedback.query.filter_by(chat_id=chat_id, user_id=user_id).one()
+    if row is not None:
         row.rating = rating
         row.comment = comment or None
-    db.session.commit()
+        db.session.commit()
     return jsonify({"message": "feedback saved", "chat_id": chat_id, "rating": rating})
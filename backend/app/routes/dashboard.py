@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from flask import Blueprint, jsonify
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
+from app.database import read_only
 from app.models import ChatHistory, Download, PracticeActivity
 
 
@@ -30,6 +31,7 @@ def _build_daily_series(items, date_attr: str, days: int = 7):
 
 @dashboard_bp.get("/insights")
 @jwt_required()
+@read_only
 def insights():
     user_id = int(get_jwt_identity())
     chats = (
@@ -1,10 +1,20 @@
+import asyncio
 from pathlib import Path
 from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.database import read_only
 from app.extensions import db
-from app.models import Download, LearningStyle, ChatHistory
-from app.services.adaptive_content_service import generate_learning_asset, generate_openai_solution
-from app.services.download_service import create_download_file
+from app.models import Download, ChatHistory
+from app.services.adaptive_content_service import agenerate_learning_asset, agenerate_openai_solution
+from app.services.cancellation import cancel_scope, check_cancelled
+from app.services.deadlines import deadline
+from app.services.download_service import acreate_download_file
+from app.services.idempotency import idempotent
+from app.services.rate_limiter import priority
+from app.services.request_timing import timed
+from app.services.token_claims import current_learning_style
+from app.services.usage_ledger import usage_scope
+from app.services.write_queue import insert_rows
 
 
 download_bp = Blueprint("download", __name__, url_prefix="/api/downloads")
@@ -55,9 +65,19 @@ def _build_distinct_kinesthetic_asset(content_type: str, topic: str, generated:
     ])
 
 
+def _latest_topic(user_id: int) -> str:
+    latest_chat = (
+        ChatHistory.query.filter_by(user_id=user_id)
+        .order_by(ChatHistory.timestamp.desc())
+        .first()
+    )
+    return latest_chat.question if latest_chat else "learning concept"
+
+
 @download_bp.post("/")
 @jwt_required()
-def create_download():
+@idempotent
+async def create_download():
     user_id = int(get_jwt_identity())
     payload = request.get_json() or {}
     content_type = payload.get("content_type", "").strip()
@@ -65,8 +85,8 @@ def create_download():
     base_content = str(payload.get("base_content", "")).strip()
     topic = str(payload.get("topic", "")).strip()
 
-    style_row = LearningStyle.query.get(user_id)
-    if not style_row:
+    learning_style = await asyncio.to_thread(current_learning_style, user_id)
+    if not learning_style:
         return jsonify({"error": "learning style not set"}), 400
 
     common_types = {"task_sheet", "solution", "pdf", "audio"}
@@ -76,39 +96,44 @@ def create_download():
         "kinesthetic": {"task_sheet", "solution"} | common_types,
     }
 
-    if content_type not in allowed_by_style[style_row.learning_style]:
-        return jsonify({"error": f"{content_type} is not allowed for {style_row.learning_style}"}), 400
+    if content_type not in allowed_by_style[learning_style]:
+        return jsonify({"error": f"{content_type} is not allowed for {learning_style}"}), 400
 
     if not topic:
-        latest_chat = (
-            ChatHistory.query.filter_by(user_id=user_id)
-            .order_by(ChatHistory.timestamp.desc())
-            .first()
-        )
-        topic = latest_chat.question if latest_chat else "learning concept"
+        topic = await asyncio.to_thread(_latest_topic, user_id)
 
     base_payload = base_content or str(content or "").strip()
 
-    if content_type == "solution":
-        generated = generate_openai_solution(topic, base_payload)
-        content = _build_distinct_kinesthetic_asset("solution", topic, generated)
-    elif content_type == "task_sheet":
-        generated = generate_learning_asset(style_row.learning_style, "task_sheet", topic, base_payload)
-        content = _build_distinct_kinesthetic_asset("task_sheet", topic, generated)
-    elif not str(content).strip():
-        content = generate_learning_asset(style_row.learning_style, content_type, topic, base_payload)
-
-    file_path = create_download_file(user_id, content_type, content)
-    row = Download(user_id=user_id, content_type=content_type, file_path=file_path)
-    db.session.add(row)
-    db.session.commit()
+    with (
+        cancel_scope(user_id, request.headers.get("X-Request-ID")),
+        usage_scope(user_id) as usage,
+        priority("downloads"),
+        deadline("downloads", 60),
+    ):
+        if content_type == "solution":
+            generated = await agenerate_openai_solution(topic, base_payload)
+            content = _build_distinct_kinesthetic_asset("solution", topic, generated)
+        elif content_type == "task_sheet":
+            generated = await agenerate_learning_asset(learning_style, "task_sheet", topic, base_payload)
+            content = _build_distinct_kinesthetic_asset("task_sheet", topic, generated)
+        elif not str(content).strip():
+            content = await agenerate_learning_asset(learning_style, content_type, topic, base_payload)
+
+        check_cancelled()
+        file_path = await acreate_download_file(user_id, content_type, content)
+        check_cancelled()
+    with timed("db-commit"):
+        (download_id,) = await asyncio.to_thread(
+            insert_rows, [(Download, {"user_id": user_id, "content_type": content_type, "file_path": file_path})]
+        )
 
     return jsonify(
         {
             "message": "download generated",
             "file_path": file_path,
-            "download_id": row.download_id,
-            "download_url": f"/api/downloads/file/{row.download_id}",
+            "download_id": download_id,
+            "download_url": f"/api/downloads/file/{download_id}",
+            **({"quota_exceeded": True} if usage.limited else {}),
         }
     )
 
@@ -130,6 +155,7 @@ def fetch_download(download_id: int):
 
 @download_bp.get("/mine")
 @jwt_required()
+@read_only
 def my_downloads():
     user_id = int(get_jwt_identity())
     rows = Download.query.filter_by(user_id=user_id).order_by(Download.timestamp.desc()).limit(50).all()
@@ -149,6 +175,7 @@ def my_downloads():
 
 @download_bp.get("/mine/<int:download_id>")
 @jwt_required()
+@read_only
 def get_download(download_id: int):
     user_id = int(get_jwt_identity())
     row = Download.query.filter_by(download_id=download_id, user_id=user_id).first()
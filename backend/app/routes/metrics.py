@@ -0,0 +1,22 @@
+import hmac
+import os
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from app.services.metrics import render_prometheus
+
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/api")
+
+
+@metrics_bp.get("/metrics")
+def prometheus_metrics():
+    token = os.getenv("METRICS_TOKEN", "").strip()
+    if not token and current_app.config.get("APP_ENV") == "production":
+        # Fail closed: production metrics expose routes and traffic, so they need a token.
+        return jsonify({"error": "metrics are disabled until METRICS_TOKEN is set"}), 403
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, token):
+            return jsonify({"error": "metrics token required"}), 401
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
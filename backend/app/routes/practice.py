@@ -1,19 +1,21 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.extensions import db
-from app.models import PracticeActivity, LearningStyle, ChatHistory
+from app.models import PracticeActivity, ChatHistory
 from app.services.lab_runner import run_java_code
 from app.services.practice_task_service import generate_practice_tasks_from_topic, get_topic_catalog
+from app.services.token_claims import current_learning_style
+from app.services.write_queue import insert_rows
 
 
 practice_bp = Blueprint("practice", __name__, url_prefix="/api/practice")
 
 
 def _ensure_kinesthetic(user_id: int):
-    style_row = LearningStyle.query.get(user_id)
-    if not style_row:
+    learning_style = current_learning_style(user_id)
+    if not learning_style:
         return jsonify({"error": "learning style not set"}), 400
-    if style_row.learning_style != "kinesthetic":
+    if learning_style != "kinesthetic":
         return jsonify({"error": "practice lab is available only for kinesthetic users"}), 403
     return None
 
@@ -86,17 +88,22 @@ def submit_activity():
     if not task_name:
         return jsonify({"error": "task_name is required"}), 400
 
-    activity = PracticeActivity(
-        user_id=user_id,
-        task_name=task_name,
-        status=status,
-        code_submitted=code_submitted,
-        time_spent=time_spent,
+    (activity_id,) = insert_rows(
+        [
+            (
+                PracticeActivity,
+                {
+                    "user_id": user_id,
+                    "task_name": task_name,
+                    "status": status,
+                    "code_submitted": code_submitted,
+                    "time_spent": time_spent,
+                },
+            )
+        ]
     )
-    db.session.add(activity)
-    db.session.commit()
 
-    return jsonify({"message": "practice activity saved", "activity_id": activity.activity_id})
+    return jsonify({"message": "practice activity saved", "activity_id": activity_id})
 
 
 @practice_bp.get("/mine")
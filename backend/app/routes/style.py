@@ -2,7 +2,11 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.extensions import db
 from app.models import LearningStyle
-from app.services.style_engine import QUESTIONS, evaluate_style, generate_interest_based_questions
+from app.services.cancellation import cancel_scope, check_cancelled
+from app.services.deadlines import deadline
+from app.services.style_engine import QUESTIONS, agenerate_interest_based_questions, evaluate_style
+from app.services.token_claims import bump_claims_version
+from app.services.usage_ledger import usage_scope
 
 
 style_bp = Blueprint("style", __name__, url_prefix="/api/style")
@@ -16,11 +20,14 @@ def questions():
 
 @style_bp.post("/generate-questions")
 @jwt_required()
-def generate_questions():
+async def generate_questions():
+    user_id = int(get_jwt_identity())
     payload = request.get_json() or {}
     interests = str(payload.get("interests", "")).strip()
     question_count = int(payload.get("question_count", 20))
-    questions, source = generate_interest_based_questions(interests, question_count)
+    with cancel_scope(user_id, request.headers.get("X-Request-ID")), usage_scope(user_id), deadline("questions", 30):
+        questions, source = await agenerate_interest_based_questions(interests, question_count)
+        check_cancelled()
     return jsonify({"questions": questions, "source": source})
 
 
@@ -48,6 +55,7 @@ def select_style():
         record.auditory_score = score_map[style]["auditory_score"]
         record.kinesthetic_score = score_map[style]["kinesthetic_score"]
 
+    bump_claims_version(user_id)
     db.session.commit()
     return jsonify({"message": "learning style saved", "learning_style": style})
 
@@ -79,6 +87,7 @@ def submit_test():
         record.auditory_score = result["auditory_score"]
         record.kinesthetic_score = result["kinesthetic_score"]
 
+    bump_claims_version(user_id)
     db.session.commit()
     return jsonify(result)
 
@@ -109,5 +118,6 @@ def clear_style():
     if not record:
         return jsonify({"message": "learning style already empty"})
     db.session.delete(record)
+    bump_claims_version(user_id)
     db.session.commit()
     return jsonify({"message": "learning style removed"})
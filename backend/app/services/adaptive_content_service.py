@@ -1,10 +1,9 @@
-from app.services.openai_service import chatgpt_text
+from app.services.openai_service import achatgpt_text
+from app.services.provider_telemetry import record_fallback
+from app.services.request_timing import timed
 
 
-def generate_learning_asset(style: str, content_type: str, topic: str, base_content: str = "") -> str:
-    topic_clean = (topic or "general programming concept").strip()
-    base = (base_content or "").strip()
-
+def _asset_prompts(style: str, content_type: str, topic_clean: str, base: str) -> tuple[str, str]:
     style_instruction = {
         "visual": "Create visually structured notes with clear headings, bullets, and a flow sequence.",
         "auditory": "Create a spoken-style script with short sentences and natural narration pacing.",
@@ -29,10 +28,21 @@ def generate_learning_asset(style: str, content_type: str, topic: str, base_cont
         f"Instructions: {style_instruction} {type_instruction}\n"
         f"Optional context: {base[:2500]}"
     )
+    return system_prompt, user_prompt
+
+
+async def agenerate_learning_asset(style: str, content_type: str, topic: str, base_content: str = "") -> str:
+    topic_clean = (topic or "general programming concept").strip()
+    base = (base_content or "").strip()
+    with timed("learning-asset"):
+        ai_text = await achatgpt_text(*_asset_prompts(style, content_type, topic_clean, base), temperature=0.5)
+    return _learning_asset(ai_text, style, content_type, topic_clean, base)
+
 
-    ai_text = chatgpt_text(system_prompt, user_prompt, temperature=0.5)
+def _learning_asset(ai_text: str | None, style: str, content_type: str, topic_clean: str, base: str) -> str:
     if ai_text:
         return ai_text
+    record_fallback("learning_asset")
 
     fallback = [
         f"Topic: {topic_clean}",
@@ -46,10 +56,7 @@ def generate_learning_asset(style: str, content_type: str, topic: str, base_cont
     return "\n".join(fallback)
 
 
-def generate_openai_solution(topic: str, base_content: str = "") -> str:
-    topic_clean = (topic or "java practice problem").strip()
-    context = (base_content or "").strip()
-
+def _solution_prompts(topic_clean: str, context: str) -> tuple[str, str]:
     system_prompt = (
         "You are a senior Java tutor. Generate a worked solution in plain text only. "
         "No markdown tables and no code fences. Keep it practical and executable."
@@ -64,10 +71,21 @@ def generate_openai_solution(topic: str, base_content: str = "") -> str:
         "5) Quick Improvement Tips\n\n"
         f"Reference context from user/workspace: {context[:2800]}"
     )
+    return system_prompt, user_prompt
+
+
+async def agenerate_openai_solution(topic: str, base_content: str = "") -> str:
+    topic_clean = (topic or "java practice problem").strip()
+    context = (base_content or "").strip()
+    with timed("solution"):
+        ai_text = await achatgpt_text(*_solution_prompts(topic_clean, context), temperature=0.35)
+    return _solution(ai_text, topic_clean, context)
+
 
-    ai_text = chatgpt_text(system_prompt, user_prompt, temperature=0.35)
+def _solution(ai_text: str | None, topic_clean: str, context: str) -> str:
     if ai_text:
         return ai_text
+    record_fallback("solution")
 
     fallback = [
         f"Topic: {topic_clean}",
@@ -1,8 +1,25 @@
+import hashlib
 import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def _admin_allowlist(raw: str) -> frozenset[str]:
+    return frozenset(item.strip().lower() for item in raw.split(",") if item.strip())
+
+
+@lru_cache(maxsize=8)
+def _allowlist_fingerprint(raw: str) -> str:
+    joined = ",".join(sorted(_admin_allowlist(raw)))
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()[:12]
 
 
 def is_admin_email(email: str) -> bool:
     if not email:
         return False
-    allowlist = [item.strip().lower() for item in os.getenv("ADMIN_EMAILS", "").split(",") if item.strip()]
-    return email.strip().lower() in allowlist
+    return email.strip().lower() in _admin_allowlist(os.getenv("ADMIN_EMAILS", ""))
+
+
+def admin_allowlist_fingerprint() -> str:
+    """Short digest of ADMIN_EMAILS so tokens minted under another allowlist are re-checked."""
+    return _allowlist_fingerprint(os.getenv("ADMIN_EMAILS", ""))
@@ -0,0 +1,272 @@
+"""Reuse answers for paraphrased questions.
+
+"what is try catch in java" and "Explain try-catch, Java?" normalize to the same
+tokens. Questions are reduced to a set of token shingles (unigrams and
+bigrams after dropping filler words). Each set gets a MinHash signature of
+NUM_PERM values, which is split into LSH bands of ROWS values. Two questions
+whose shingle sets overlap enough almost certainly share a band, so a lookup
+only compares the signatures in the matching buckets.
+
+Signatures of AI-answered questions are stored in `question_signatures`, next
+to their ChatHistory row. Each worker mirrors that table in memory and pulls
+new rows at most every ANSWER_REUSE_REFRESH_SECONDS, so a lookup is a few
+dict probes plus one primary-key read of the stored answer. Rows are pulled by
+created_at, reaching back ANSWER_REUSE_REFRESH_OVERLAP_SECONDS before the
+previous refresh: ids are handed out before commit, so a row with a lower id
+can become visible after a higher one. Styles never mix: a visual answer is
+only reused for another visual question.
+
+A worker keeps at most ANSWER_REUSE_MAX_ENTRIES signatures, dropping the least
+recently used. Its first load starts at the newest that many rows and pulls
+one page of PAGE_ROWS per lookup, so no single request loads the whole table.
+
+Only English filler is dropped before hashing. Words such as "do", "for" and
+"with" are Java keywords ("do while loop", "for loop", "try with resources"),
+and dropping them made different questions look identical.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import is_truthy
+from app.extensions import db
+from app.models import ChatHistory, QuestionSignature
+from app.services import metrics
+from app.services.write_queue import insert_rows
+
+
+metrics.describe("answer_reuse_total", "counter", "Chat questions answered from an earlier equivalent question, by result.")
+metrics.describe("answer_reuse_lookup_seconds", "histogram", "Time to look up an equivalent earlier question in the MinHash index.")
+
+NUM_PERM = 64
+ROWS = 4
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+# Fixed coefficients: signatures are stored, so every worker must hash the same way.
+_PERMS = [((i * 0x9E3779B1 + 0x7F4A7C15) % _PRIME | 1, (i * 0x85EBCA77 + 0xC2B2AE3D) % _PRIME) for i in range(1, NUM_PERM + 1)]
+LOOKUP_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+PAGE_ROWS = 5000
+
+JAVA_KEYWORDS = {
+    "abstract", "assert", "boolean", "break", "byte", "case", "catch", "char", "class", "const", "continue",
+    "default", "do", "double", "else", "enum", "extends", "final", "finally", "float", "for", "goto", "if",
+    "implements", "import", "instanceof", "int", "interface", "long", "native", "new", "package", "private",
+    "protected", "public", "record", "return", "short", "static", "strictfp", "super", "switch", "synchronized",
+    "this", "throw", "throws", "transient", "try", "var", "void", "volatile", "while", "with", "yield",
+}
+_FILLER = {
+    "a", "an", "the", "is", "are", "was", "what", "whats", "explain", "describe", "tell", "me", "about",
+    "please", "can", "could", "would", "you", "i", "does", "in", "of", "to", "on", "and",
+    "how", "it", "my", "we", "some", "give", "show", "mean", "means",
+} - JAVA_KEYWORDS
+
+_indexes: dict[object, "_Index"] = {}
+_indexes_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return is_truthy(os.getenv("ANSWER_REUSE"), default=True)
+
+
+def _threshold() -> float:
+    return float(os.getenv("ANSWER_REUSE_THRESHOLD", "0.8"))
+
+
+def _max_entries() -> int:
+    return int(os.getenv("ANSWER_REUSE_MAX_ENTRIES", "50000"))
+
+
+def normalize(question: str) -> list[str]:
+    tokens = []
+    words = re.findall(r"[a-z0-9+#]+", question.lower())
+    for token, following in zip(words, words[1:] + [""]):
+        if token in _FILLER:
+            continue
+        # "how do I ...": before a pronoun "do" is the English auxiliary, not the loop keyword.
+        if token == "do" and following in {"i", "you", "we"}:
+            continue
+        # Cheap plural folding: "loops" and "loop" are the same question.
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def shingles(tokens: list[str]) -> set[str]:
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def signature(question: str) -> array | None:
+    hashed = [zlib.crc32(s.encode("utf-8")) for s in shingles(normalize(question))]
+    if not hashed:
+        return None
+    return array("I", (min(((a * x + b) % _PRIME) & _MASK for x in hashed) for a, b in _PERMS))
+
+
+def similarity(a: array, b: array) -> float:
+    """MinHash estimate of the Jaccard similarity of the two shingle sets."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _bands(sig: array) -> list[tuple[int, int]]:
+    return [(band, hash(tuple(sig[band * ROWS:(band + 1) * ROWS]))) for band in range(NUM_PERM // ROWS)]
+
+
+class _Index:
+    def __init__(self):
+        self.buckets: dict[tuple[str, int, int], list[int]] = {}
+        # Least recently used first.
+        self.signatures: OrderedDict[int, tuple[str, array]] = OrderedDict()
+        # Wall-clock start of the last completed refresh; rows added locally are picked up again (and skipped).
+        self.refreshed_at: datetime | None = None
+        # (started, last (signature_id, created_at) loaded) while a refresh is still paging.
+        self.paging: tuple[datetime, tuple | None] | None = None
+        self.next_refresh = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, chat_id: int, style: str, sig: array) -> None:
+        with self.lock:
+            if chat_id in self.signatures:
+                return
+            self.signatures[chat_id] = (style, sig)
+            for band, key in _bands(sig):
+                self.buckets.setdefault((style, band, key), []).append(chat_id)
+            while len(self.signatures) > _max_entries():
+                self._unlink(*self.signatures.popitem(last=False))
+
+    def _unlink(self, chat_id: int, entry: tuple[str, array]) -> None:
+        style, sig = entry
+        for band, key in _bands(sig):
+            bucket = self.buckets.get((style, band, key))
+            if bucket is None:
+                continue
+            if chat_id in bucket:
+                bucket.remove(chat_id)
+            if not bucket:
+                del self.buckets[(style, band, key)]
+
+    def drop(self, chat_id: int) -> None:
+        with self.lock:
+            entry = self.signatures.pop(chat_id, None)
+            if entry is not None:
+                self._unlink(chat_id, entry)
+
+    def best(self, style: str, sig: array) -> tuple[int, float] | None:
+        with self.lock:
+            candidates = {chat_id for band, key in _bands(sig) for chat_id in self.buckets.get((style, band, key), ())}
+            scored = [(similarity(sig, self.signatures[chat_id][1]), chat_id) for chat_id in candidates]
+            if not scored:
+                return None
+            score, chat_id = max(scored)
+            if score < _threshold():
+                return None
+            self.signatures.move_to_end(chat_id)
+        return chat_id, score
+
+    def refresh(self) -> None:
+        """Pull one page of rows created since the last refresh (minus the overlap)."""
+        if self.paging is None:
+            if time.monotonic() < self.next_refresh:
+                return
+            self.paging = (datetime.utcnow(), None)
+        started, last = self.paging
+        query = db.session.query(
+            QuestionSignature.signature_id,
+            QuestionSignature.created_at,
+            QuestionSignature.chat_id,
+            QuestionSignature.learning_style,
+            QuestionSignature.signature,
+        ).order_by(QuestionSignature.created_at, QuestionSignature.signature_id)
+        since = self._since()
+        if since is not None:
+            query = query.filter(QuestionSignature.created_at >= since)
+        if last is not None:
+            query = query.filter(
+                or_(
+                    QuestionSignature.created_at > last[1],
+                    and_(QuestionSignature.created_at == last[1], QuestionSignature.signature_id > last[0]),
+                )
+            )
+        rows = query.limit(PAGE_ROWS).all()
+        for _signature_id, _created_at, chat_id, style, raw in rows:
+            self.add(chat_id, style, array("I", raw))
+        if len(rows) == PAGE_ROWS:
+            # More to pull: the next lookup continues from here instead of waiting for the interval.
+            self.paging = (started, rows[-1][:2])
+            return
+        self.paging = None
+        self.refreshed_at = started
+        self.next_refresh = time.monotonic() + float(os.getenv("ANSWER_REUSE_REFRESH_SECONDS", "5"))
+
+    def _since(self) -> datetime | None:
+        if self.refreshed_at is not None:
+            overlap = timedelta(seconds=float(os.getenv("ANSWER_REUSE_REFRESH_OVERLAP_SECONDS", "60")))
+            return self.refreshed_at - overlap
+        # First load: only the rows that fit in the index.
+        return (
+            db.session.query(QuestionSignature.created_at)
+            .order_by(QuestionSignature.created_at.desc())
+            .offset(_max_entries() - 1)
+            .limit(1)
+            .scalar()
+        )
+
+
+def _index() -> _Index:
+    engine = db.engine
+    with _indexes_lock:
+        index = _indexes.get(engine)
+        if index is None:
+            index = _indexes[engine] = _Index()
+    return index
+
+
+def find(question: str, style: str) -> dict | None:
+    """The stored answer to an equivalent earlier `style` question, or None."""
+    if not enabled():
+        return None
+    started = time.perf_counter()
+    sig = signature(question)
+    if sig is None:
+        return None
+    index = _index()
+    try:
+        index.refresh()
+    except SQLAlchemyError:
+        db.session.rollback()
+    match = index.best(style, sig)
+    metrics.observe("answer_reuse_lookup_seconds", {}, time.perf_counter() - started, buckets=LOOKUP_BUCKETS)
+    if match is None:
+        metrics.inc_counter("answer_reuse_total", {"result": "miss"})
+        return None
+    chat_id, score = match
+    row = db.session.get(ChatHistory, chat_id)
+    if row is None or row.learning_style_used != style:
+        # Deleted since it was indexed.
+        index.drop(chat_id)
+        metrics.inc_counter("answer_reuse_total", {"result": "miss"})
+        return None
+    metrics.inc_counter("answer_reuse_total", {"result": "hit"})
+    return {"chat_id": chat_id, "similarity": round(score, 3), "text": row.response}
+
+
+def remember(chat_id: int, style: str, question: str) -> None:
+    """Index an AI-generated answer so later paraphrases can reuse it."""
+    sig = signature(question)
+    if sig is None or not enabled():
+        return
+    insert_rows([(QuestionSignature, {"chat_id": chat_id, "learning_style": style, "signature": sig.tobytes()})])
+    _index().add(chat_id, style, sig)
+
+
+def forget(chat_ids) -> None:
+    """Delete the signatures of chats that are about to be deleted (same transaction as the caller)."""
+    QuestionSignature.query.filter(QuestionSignature.chat_id.in_(list(chat_ids))).delete(synchronize_session=False)
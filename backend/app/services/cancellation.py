@@ -0,0 +1,168 @@
+"""Stop upstream work for responses nobody will read.
+
+Upstream-bound routes run inside `cancel_scope(user_id, request_id)`. The
+scope is cancelled in one of two ways:
+
+- the ASGI adapter cancels the view task when the client disconnects;
+- the client calls the cancel endpoint with the `X-Request-ID` it sent. That
+  drops a marker file, so the cancel works whichever worker serves it.
+
+On the event loop a watcher cancels the view task as soon as the marker
+shows up, which also cancels the in-flight httpx calls. Synchronous workers
+check at every provider call and before files and rows are written. Upstream
+calls made for a cancelled request are counted as wasted.
+"""
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from app.services import metrics
+
+
+metrics.describe("requests_cancelled_total", "counter", "Upstream-bound requests abandoned by the client, by reason.")
+metrics.describe("upstream_wasted_calls_total", "counter", "Upstream calls made for requests that were then cancelled.")
+
+POLL_SECONDS = 0.25
+MARKER_TTL_SECONDS = 600
+
+_current: ContextVar["CancelScope | None"] = ContextVar("cancel_scope", default=None)
+_wasted: deque = deque()
+_wasted_lock = threading.Lock()
+_next_prune = 0.0
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+def _cancel_dir() -> Path:
+    path = Path(os.getenv("UPSTREAM_CANCEL_DIR", Path(tempfile.gettempdir()) / "adaptive_cancelled"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _marker(user_id: int, request_id: str | None) -> Path | None:
+    request_id = re.sub(r"[^A-Za-z0-9_.-]", "", request_id or "")[:64]
+    return _cancel_dir() / f"u{user_id}-{request_id}" if request_id else None
+
+
+class CancelScope:
+    def __init__(self, marker: Path | None):
+        self.marker = marker
+        self.reason: str | None = None
+        self.upstream_calls = 0
+
+    def cancel(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+
+    def cancelled(self) -> bool:
+        if self.reason is None and self.marker is not None and self.marker.exists():
+            self.reason = "cancelled"
+        return self.reason is not None
+
+
+async def _watch(scope: CancelScope, task: asyncio.Task) -> None:
+    while not task.done():
+        await asyncio.sleep(POLL_SECONDS)
+        if scope.cancelled():
+            task.cancel()
+            return
+
+
+@contextmanager
+def cancel_scope(user_id: int, request_id: str | None):
+    scope = CancelScope(_marker(user_id, request_id))
+    token = _current.set(scope)
+    watcher = None
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None and scope.marker is not None:
+        watcher = asyncio.get_running_loop().create_task(_watch(scope, task))
+    try:
+        yield scope
+    except asyncio.CancelledError:
+        if scope.reason is None:
+            # Cancelled from outside (the ASGI adapter saw the client go away): let it propagate.
+            scope.cancel("disconnect")
+            raise
+        # Our own watcher cancelled the view: answer the still-connected client normally.
+        task.uncancel()
+        raise RequestCancelled(scope.reason) from None
+    finally:
+        _current.reset(token)
+        if watcher is not None:
+            watcher.cancel()
+        if scope.reason is not None:
+            _record_cancelled(scope)
+        if scope.marker is not None:
+            scope.marker.unlink(missing_ok=True)
+
+
+def request_cancel(user_id: int, request_id: str) -> bool:
+    """Ask the worker serving `request_id` for this user to stop; False for an unusable id."""
+    global _next_prune
+    marker = _marker(user_id, request_id)
+    if marker is None:
+        return False
+    marker.touch()
+    # Markers for requests that already finished (or never arrive) are cleared lazily.
+    now = time.time()
+    if now >= _next_prune:
+        _next_prune = now + MARKER_TTL_SECONDS
+        for stale in marker.parent.iterdir():
+            try:
+                if now - stale.stat().st_mtime > MARKER_TTL_SECONDS:
+                    stale.unlink()
+            except OSError:
+                pass
+    return True
+
+
+def check_cancelled() -> None:
+    """Raise RequestCancelled if the current request has been cancelled."""
+    scope = _current.get()
+    if scope is not None and scope.cancelled():
+        raise RequestCancelled(scope.reason)
+
+
+def count_upstream_call() -> None:
+    scope = _current.get()
+    if scope is not None:
+        scope.upstream_calls += 1
+
+
+def _record_cancelled(scope: CancelScope) -> None:
+    metrics.inc_counter("requests_cancelled_total", {"reason": scope.reason})
+    if scope.upstream_calls:
+        metrics.inc_counter("upstream_wasted_calls_total", {"reason": scope.reason}, scope.upstream_calls)
+    with _wasted_lock:
+        _wasted.append((time.time(), scope.reason, scope.upstream_calls))
+
+
+def wasted_report() -> dict:
+    """Cancelled requests and the upstream calls they wasted over the last hour on this worker."""
+    cutoff = time.time() - 3600
+    with _wasted_lock:
+        while _wasted and _wasted[0][0] < cutoff:
+            _wasted.popleft()
+        items = list(_wasted)
+    by_reason: dict[str, dict[str, int]] = {}
+    for _, reason, calls in items:
+        entry = by_reason.setdefault(reason, {"requests": 0, "upstream_calls": 0})
+        entry["requests"] += 1
+        entry["upstream_calls"] += calls
+    return {
+        "cancelled_requests_last_hour": len(items),
+        "wasted_upstream_calls_last_hour": sum(calls for _, _, calls in items),
+        "by_reason": by_reason,
+    }
@@ -1,11 +1,23 @@
+import asyncio
 import random
 import re
 from urllib.parse import quote_plus
 import os
 
-from app.services.openai_service import chatgpt_json, chatgpt_text, generate_image_data_url
+from app.services import deadlines
+from app.services.openai_service import (
+    achatgpt_json,
+    achatgpt_text,
+    agenerate_image_data_url,
+)
+from app.services.provider_telemetry import record_fallback
+from app.services.request_timing import timed
 from urllib.parse import quote
 
+# Optional visual work is skipped once less than this much of the request budget is left.
+BLUEPRINT_MIN_SECONDS = 3
+IMAGE_MIN_SECONDS = 8
+
 
 def _fallback_response(question: str, style: str) -> str:
     topic = question.strip().rstrip("?") or "Java concept"
@@ -45,7 +57,7 @@ def _fallback_response(question: str, style: str) -> str:
     )
 
 
-def _generate_chatgpt_explanation(question: str, style: str) -> str | None:
+def _explanation_prompts(question: str, style: str) -> tuple[str, str]:
     style_prompt = {
         "visual": "Use strong structure, visual wording, and flow-oriented sections.",
         "auditory": "Use conversational spoken style with clear transitions and natural pacing.",
@@ -68,7 +80,12 @@ def _generate_chatgpt_explanation(question: str, style: str) -> str | None:
         f"Instruction: {style_prompt.get(style, '')}\n"
         "Make each section clear and detailed but concise enough for quick study."
     )
-    return chatgpt_text(system_prompt, user_prompt, temperature=0.45)
+    return system_prompt, user_prompt
+
+
+async def _agenerate_chatgpt_explanation(question: str, style: str) -> str | None:
+    with timed("explanation"):
+        return await achatgpt_text(*_explanation_prompts(question, style), temperature=0.45)
 
 
 def _topic_keywords(topic: str) -> list[str]:
@@ -142,7 +159,7 @@ def _sanitize_scores(raw: list, max_items: int, minimum: int = 40, maximum: int
     return out[:max_items]
 
 
-def _generate_visual_blueprint(question: str, explanation: str) -> dict:
+def _blueprint_prompts(question: str, explanation: str) -> tuple[str, str]:
     system_prompt = (
         "You create visual learning blueprints. Return strict JSON only with keys: "
         "title, concept_nodes, flow_steps, radar_axes, radar_scores, bar_labels, bar_values. "
@@ -159,7 +176,21 @@ def _generate_visual_blueprint(question: str, explanation: str) -> dict:
         "- bar_labels: exactly 4 labels\n"
         "- bar_values: exactly 4 integers between 50 and 95"
     )
-    payload = chatgpt_json(system_prompt, user_prompt, temperature=0.4) or {}
+    return system_prompt, user_prompt
+
+
+async def _agenerate_visual_blueprint(question: str, explanation: str) -> dict:
+    payload = None
+    if deadlines.has_time(BLUEPRINT_MIN_SECONDS):
+        with timed("blueprint"):
+            payload = await achatgpt_json(*_blueprint_prompts(question, explanation), temperature=0.4)
+    return _visual_blueprint(question, explanation, payload)
+
+
+def _visual_blueprint(question: str, explanation: str, payload: dict | None) -> dict:
+    if payload is None:
+        record_fallback("visual_blueprint")
+        payload = {}
     fallback = _fallback_visual_blueprint(question)
     # If we have explanation text, derive better fallback step labels from it.
     if explanation:
@@ -195,9 +226,13 @@ def _youtube_search_url(topic: str) -> str:
     return f"https://www.youtube.com/results?search_query={quote_plus(query)}"
 
 
-def _generate_ai_visual_image(question: str, blueprint: dict) -> str | None:
+def _visual_image_prompt(question: str, blueprint: dict) -> str | None:
     enabled = os.getenv("OPENAI_VISUAL_IMAGE_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
     if not enabled:
+        record_fallback("visual_image", "disabled")
+        return None
+    if not deadlines.has_time(IMAGE_MIN_SECONDS):
+        record_fallback("visual_image")
         return None
     concept_line = ", ".join(blueprint.get("concept_nodes", [])[:4])
     flow_line = " -> ".join(blueprint.get("flow_steps", [])[:5])
@@ -211,13 +246,21 @@ def _generate_ai_visual_image(question: str, blueprint: dict) -> str | None:
         f"Learning flow: {flow_line}\n"
         "Visual layout: top title, middle concept map, bottom short takeaway strip."
     )
-    return generate_image_data_url(prompt, size="1024x1024")
+    return prompt
 
 
-def _generate_prompt_suggestions(topic: str, style: str) -> list[str]:
-    base_topic = topic.strip() or "Java exception handling"
-    style = (style or "visual").strip().lower()
+async def _agenerate_ai_visual_image(question: str, blueprint: dict) -> str | None:
+    prompt = _visual_image_prompt(question, blueprint)
+    if prompt is None:
+        return None
+    with timed("image"):
+        image_url = await agenerate_image_data_url(prompt, size="1024x1024")
+    if not image_url:
+        record_fallback("visual_image")
+    return image_url
 
+
+def _suggestion_prompts(base_topic: str, style: str) -> tuple[str, str]:
     style_instruction = {
         "visual": "Questions should ask for diagrams, flow maps, comparisons, and visual memory tricks.",
         "auditory": "Questions should ask for spoken explanations, recap scripts, and discussion-style understanding.",
@@ -234,7 +277,18 @@ def _generate_prompt_suggestions(topic: str, style: str) -> list[str]:
         f"Instruction: {style_instruction}\n"
         "Generate follow-up questions from beginner to advanced that clearly reflect the learning style."
     )
-    raw = chatgpt_text(system_prompt, user_prompt, temperature=0.75)
+    return system_prompt, user_prompt
+
+
+async def _agenerate_prompt_suggestions(topic: str, style: str) -> list[str]:
+    base_topic = topic.strip() or "Java exception handling"
+    style = (style or "visual").strip().lower()
+    with timed("suggestions"):
+        raw = await achatgpt_text(*_suggestion_prompts(base_topic, style), temperature=0.75)
+    return _prompt_suggestions(raw, base_topic, style)
+
+
+def _prompt_suggestions(raw: str | None, base_topic: str, style: str) -> list[str]:
     if raw:
         rows = [r.strip(" -\t\r") for r in raw.splitlines() if r.strip()]
         rows = [r for r in rows if len(r) > 10]
@@ -250,6 +304,9 @@ def _generate_prompt_suggestions(topic: str, style: str) -> list[str]:
                 break
         if len(deduped) >= 4:
             return deduped
+        record_fallback("suggestions", "unusable_output")
+    else:
+        record_fallback("suggestions")
 
     fallback_by_style = {
         "visual": [
@@ -396,15 +453,18 @@ def _visual_topic_image_url(blueprint: dict) -> str:
 
 
 
-def _generate_ai_visual_variants(question: str, blueprint: dict) -> dict[str, str | None]:
+_NO_VARIANTS = {
+    "topic_image_url": None,
+    "flowchart_image_url": None,
+    "graph_image_url": None,
+    "bar_graph_image_url": None,
+}
+
+
+def _visual_variant_prompts(question: str, blueprint: dict) -> dict[str, str] | None:
     enabled = os.getenv("OPENAI_VISUAL_MULTI_IMAGE_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
-    if not enabled:
-        return {
-            "topic_image_url": None,
-            "flowchart_image_url": None,
-            "graph_image_url": None,
-            "bar_graph_image_url": None,
-        }
+    if not enabled or not deadlines.has_time(IMAGE_MIN_SECONDS):
+        return None
 
     title = blueprint.get("title", question)
     concepts = ", ".join(blueprint.get("concept_nodes", [])[:4])
@@ -433,25 +493,56 @@ def _generate_ai_visual_variants(question: str, blueprint: dict) -> dict[str, st
     )
 
     return {
-        "topic_image_url": generate_image_data_url(topic_prompt, size="1024x1024"),
-        "flowchart_image_url": generate_image_data_url(flow_prompt, size="1024x1024"),
-        "graph_image_url": generate_image_data_url(graph_prompt, size="1024x1024"),
-        "bar_graph_image_url": generate_image_data_url(bar_prompt, size="1024x1024"),
+        "topic_image_url": topic_prompt,
+        "flowchart_image_url": flow_prompt,
+        "graph_image_url": graph_prompt,
+        "bar_graph_image_url": bar_prompt,
     }
-def get_quick_prompts(topic: str, style: str) -> list[str]:
-    return _generate_prompt_suggestions(topic, style)
 
 
-def generate_adaptive_response(question: str, style: str) -> dict:
-    topic = question.strip().rstrip("?")
-    ai_text = _generate_chatgpt_explanation(question, style)
-    text = ai_text or _fallback_response(question, style)
-    ai_used = bool(ai_text)
+async def _agenerate_ai_visual_variants(question: str, blueprint: dict) -> dict[str, str | None]:
+    prompts = _visual_variant_prompts(question, blueprint)
+    if prompts is None:
+        return dict(_NO_VARIANTS)
+    with timed("image-variants"):
+        urls = await asyncio.gather(*(agenerate_image_data_url(prompt, size="1024x1024") for prompt in prompts.values()))
+    variants = dict(zip(prompts, urls))
+    for url in variants.values():
+        if not url:
+            record_fallback("visual_variant")
+    return variants
+async def aget_quick_prompts(topic: str, style: str) -> list[str]:
+    return await _agenerate_prompt_suggestions(topic, style)
 
+
+def _explanation_text(question: str, style: str, ai_text: str | None) -> str:
+    if not ai_text:
+        record_fallback("explanation")
+    return ai_text or _fallback_response(question, style)
+
+
+async def agenerate_adaptive_response(question: str, style: str, known_answer: str | None = None) -> dict:
+    """`known_answer` (an earlier answer to the same question, see answer_index) skips the explanation call.
+
+    The independent image calls run concurrently.
+    """
+    ai_text = known_answer or await _agenerate_chatgpt_explanation(question, style)
+    text = _explanation_text(question, style, ai_text)
+    visuals = None
+    if style == "visual":
+        blueprint = await _agenerate_visual_blueprint(question, text)
+        image_url, variants = await asyncio.gather(
+            _agenerate_ai_visual_image(question, blueprint),
+            _agenerate_ai_visual_variants(question, blueprint),
+        )
+        visuals = (blueprint, image_url, variants)
+    return _adaptive_response(question, style, text, bool(ai_text), visuals)
+
+
+def _adaptive_response(question: str, style: str, text: str, ai_used: bool, visuals: tuple | None) -> dict:
+    topic = question.strip().rstrip("?")
     if style == "visual":
-        blueprint = _generate_visual_blueprint(question, text)
-        ai_visual_image_url = _generate_ai_visual_image(question, blueprint)
-        ai_variants = _generate_ai_visual_variants(question, blueprint)
+        blueprint, ai_visual_image_url, ai_variants = visuals
         topic_image_url = ai_variants.get("topic_image_url") or _visual_topic_image_url(blueprint)
         flowchart_image_url = ai_variants.get("flowchart_image_url") or _visual_mermaid_url(blueprint)
         graph_image_url = ai_variants.get("graph_image_url") or _visual_chart_url(blueprint)
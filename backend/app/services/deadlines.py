@@ -0,0 +1,85 @@
+"""Request-scoped time budgets.
+
+A route opens `with deadline("chat", 40):`. Every provider call under it gets
+`min(own timeout, remaining budget)`. Retries, hedges, rate-limit waits and
+coalescing waits stop at the deadline, and optional steps (images,
+blueprints, AI practice tasks, TTS) check `has_time()` before starting. The
+budget for each endpoint can be overridden with `DEADLINE_<NAME>_SECONDS`.
+
+The deadline lives in a ContextVar, like the rate-limit priority, so tasks
+started with asyncio.gather and threads started with copy_context() see
+the same budget.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.services.provider_telemetry import set_failure_reason
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, name: str, seconds: float):
+        self.name = name
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, own: float) -> float:
+        return min(own, self.remaining())
+
+
+_current: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+# Below this, starting an upstream call only burns the rest of the budget on a request we cannot finish.
+MIN_CALL_SECONDS = 0.5
+
+
+def budget_seconds(name: str, default: float) -> float:
+    return float(os.getenv(f"DEADLINE_{name.upper()}_SECONDS", str(default)))
+
+
+@contextmanager
+def deadline(name: str, default_seconds: float):
+    token = _current.set(Deadline(name, budget_seconds(name, default_seconds)))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def current() -> Deadline | None:
+    return _current.get()
+
+
+def remaining(default: float = float("inf")) -> float:
+    active = _current.get()
+    return active.remaining() if active else default
+
+
+def timeout_for(own: float) -> float:
+    """`own`, capped by the active deadline; raises DeadlineExceeded when too little is left to try."""
+    active = _current.get()
+    if active is None:
+        return own
+    left = active.remaining()
+    if left < MIN_CALL_SECONDS:
+        raise DeadlineExceeded(f"{active.name} deadline of {active.budget:g}s spent")
+    return min(own, left)
+
+
+def has_time(seconds: float) -> bool:
+    """Whether optional work needing about `seconds` fits; records deadline_exceeded as the fallback reason if not."""
+    if remaining() >= seconds:
+        return True
+    set_failure_reason("deadline_exceeded")
+    return False
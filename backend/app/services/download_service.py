@@ -1,9 +1,13 @@
 from pathlib import Path
 from datetime import datetime
+import asyncio
 import math
 import struct
 import wave
-from app.services.openai_service import generate_tts_mp3
+from app.services import deadlines
+from app.services.openai_service import agenerate_tts_mp3, generate_tts_mp3
+from app.services.provider_telemetry import record_fallback
+from app.services.request_timing import timed
 
 
 DOWNLOAD_DIR = Path(__file__).resolve().parents[2] / "downloads"
@@ -18,6 +22,9 @@ EXTENSIONS = {
     "solution": "txt",
 }
 
+# Typical TTS latency; with less budget left the WAV fallback is written straight away.
+TTS_MIN_SECONDS = 4
+
 
 def _write_fallback_wav(path: Path, duration_seconds: float = 1.2, sample_rate: int = 16000) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -36,22 +43,52 @@ def _write_fallback_wav(path: Path, duration_seconds: float = 1.2, sample_rate:
         wav_file.writeframes(bytes(frames))
 
 
-def create_download_file(user_id: int, content_type: str, payload: str) -> str:
+def _download_path(user_id: int, content_type: str) -> tuple[Path, str]:
     ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
     ext = EXTENSIONS.get(content_type, "txt")
-    file_path = DOWNLOAD_DIR / f"u{user_id}_{content_type}_{ts}.{ext}"
-    if content_type == "audio":
-        if not generate_tts_mp3(payload, str(file_path)):
-            # Fallback to a valid playable WAV file so UI audio player still works.
-            wav_path = DOWNLOAD_DIR / f"u{user_id}_{content_type}_{ts}.wav"
-            try:
-                _write_fallback_wav(wav_path)
-                return str(wav_path)
-            except Exception:
-                # Last fallback text payload when audio file generation is unavailable.
-                file_path = DOWNLOAD_DIR / f"u{user_id}_{content_type}_{ts}.txt"
-                file_path.write_text(payload, encoding="utf-8")
+    return DOWNLOAD_DIR / f"u{user_id}_{content_type}_{ts}.{ext}", ts
+
+
+def _audio_fallback(user_id: int, content_type: str, ts: str, payload: str) -> str:
+    record_fallback("tts")
+    # Fallback to a valid playable WAV file so UI audio player still works.
+    wav_path = DOWNLOAD_DIR / f"u{user_id}_{content_type}_{ts}.wav"
+    try:
+        with timed("file-write", "file"):
+            _write_fallback_wav(wav_path)
+        return str(wav_path)
+    except Exception:
+        # Last fallback text payload when audio file generation is unavailable.
+        file_path = DOWNLOAD_DIR / f"u{user_id}_{content_type}_{ts}.txt"
+        with timed("file-write", "file"):
+            file_path.write_text(payload, encoding="utf-8")
         return str(file_path)
 
-    file_path.write_text(payload, encoding="utf-8")
+
+def _write_text_file(file_path: Path, payload: str) -> str:
+    with timed("file-write", "file"):
+        file_path.write_text(payload, encoding="utf-8")
     return str(file_path)
+
+
+def create_download_file(user_id: int, content_type: str, payload: str) -> str:
+    file_path, ts = _download_path(user_id, content_type)
+    if content_type == "audio":
+        if not deadlines.has_time(TTS_MIN_SECONDS):
+            return _audio_fallback(user_id, content_type, ts, payload)
+        with timed("tts"):
+            tts_ok = generate_tts_mp3(payload, str(file_path))
+        return str(file_path) if tts_ok else _audio_fallback(user_id, content_type, ts, payload)
+    return _write_text_file(file_path, payload)
+
+
+async def acreate_download_file(user_id: int, content_type: str, payload: str) -> str:
+    # File writes go to a thread: this runs on the server's event loop.
+    file_path, ts = _download_path(user_id, content_type)
+    if content_type == "audio":
+        if not deadlines.has_time(TTS_MIN_SECONDS):
+            return await asyncio.to_thread(_audio_fallback, user_id, content_type, ts, payload)
+        with timed("tts"):
+            tts_ok = await agenerate_tts_mp3(payload, str(file_path))
+        return str(file_path) if tts_ok else await asyncio.to_thread(_audio_fallback, user_id, content_type, ts, payload)
+    return await asyncio.to_thread(_write_text_file, file_path, payload)
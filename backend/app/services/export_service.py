@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import String, and_, cast, literal, select
+
+from app.extensions import db
+from app.models import ChatFeedback, ChatHistory, Download, PracticeActivity
+
+
+EXPORT_DATASETS = {"chats", "practice", "downloads"}
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _chunk_size() -> int:
+    return max(50, int(os.getenv("EXPORT_CHUNK_SIZE", "500")))
+
+
+def _chats_query(filters: dict):
+    stmt = (
+        select(
+            ChatHistory.chat_id,
+            ChatHistory.user_id,
+            ChatHistory.question,
+            ChatHistory.response,
+            ChatHistory.response_type,
+            ChatHistory.learning_style_used,
+            ChatHistory.timestamp,
+            ChatFeedback.rating.label("feedback_rating"),
+            ChatFeedback.comment.label("feedback_comment"),
+        )
+        .outerjoin(
+            ChatFeedback,
+            and_(ChatFeedback.chat_id == ChatHistory.chat_id, ChatFeedback.user_id == ChatHistory.user_id),
+        )
+        .order_by(ChatHistory.chat_id)
+    )
+    if filters.get("user_id"):
+        stmt = stmt.where(ChatHistory.user_id == filters["user_id"])
+    if filters.get("since"):
+        stmt = stmt.where(ChatHistory.timestamp >= filters["since"])
+    if filters.get("until"):
+        stmt = stmt.where(ChatHistory.timestamp < filters["until"])
+    if filters.get("style"):
+        stmt = stmt.where(ChatHistory.learning_style_used == filters["style"])
+    return stmt
+
+
+def _practice_query(filters: dict):
+    stmt = select(
+        PracticeActivity.activity_id,
+        PracticeActivity.user_id,
+        PracticeActivity.task_name,
+        PracticeActivity.status,
+        PracticeActivity.code_submitted,
+        PracticeActivity.time_spent,
+        PracticeActivity.created_at,
+        PracticeActivity.updated_at,
+    ).order_by(PracticeActivity.activity_id)
+    if filters.get("user_id"):
+        stmt = stmt.where(PracticeActivity.user_id == filters["user_id"])
+    if filters.get("since"):
+        stmt = stmt.where(PracticeActivity.updated_at >= filters["since"])
+    if filters.get("until"):
+        stmt = stmt.where(PracticeActivity.updated_at < filters["until"])
+    if filters.get("status"):
+        stmt = stmt.where(PracticeActivity.status == filters["status"])
+    return stmt
+
+
+def _downloads_query(filters: dict):
+    # File contents stay on disk; only metadata is exported, with the owner-only
+    # download URL rather than the server-side path.
+    stmt = select(
+        Download.download_id,
+        Download.user_id,
+        Download.content_type,
+        (literal("/api/downloads/file/") + cast(Download.download_id, String)).label("download_url"),
+        Download.timestamp,
+    ).order_by(Download.download_id)
+    if filters.get("user_id"):
+        stmt = stmt.where(Download.user_id == filters["user_id"])
+    if filters.get("since"):
+        stmt = stmt.where(Download.timestamp >= filters["since"])
+    if filters.get("until"):
+        stmt = stmt.where(Download.timestamp < filters["until"])
+    if filters.get("content_type"):
+        stmt = stmt.where(Download.content_type == filters["content_type"])
+    return stmt
+
+
+QUERY_BUILDERS = {
+    "chats": _chats_query,
+    "practice": _practice_query,
+    "downloads": _downloads_query,
+}
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def parse_export_date(raw: str | None) -> datetime | None:
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    return datetime.fromisoformat(raw)
+
+
+def export_filename(dataset: str, fmt: str, user_id: int | None = None) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    owner = f"u{user_id}_" if user_id else ""
+    return f"export_{owner}{dataset}_{stamp}.{fmt}"
+
+
+def stream_export(dataset: str, fmt: str, filters: dict | None = None):
+    """Yield encoded export chunks without materializing the full result set.
+
+    Rows are fetched through a server-side cursor in `EXPORT_CHUNK_SIZE`
+    batches, and each batch is flushed as one chunk of output.
+    """
+    stmt = QUERY_BUILDERS[dataset](filters or {})
+    chunk_size = _chunk_size()
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    columns = list(result.keys())
+    try:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode("utf-8")
+            for partition in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([[_serialize(v) for v in row] for row in partition])
+                yield buffer.getvalue().encode("utf-8")
+        else:
+            for partition in result.partitions():
+                lines = [
+                    json.dumps({col: _serialize(v) for col, v in zip(columns, row)}, ensure_ascii=False)
+                    for row in partition
+                ]
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+    finally:
+        result.close()
@@ -0,0 +1,189 @@
+"""`Idempotency-Key` support for expensive POST endpoints.
+
+A retried request carrying the same key as an earlier one is not run again.
+
+- While the first request is still running, the retry waits for it and gets
+  its response.
+- Once the first request has succeeded, the retry gets the stored response,
+  marked with `Idempotent-Replayed: true`.
+- A failed first request (4xx/5xx, cancelled, crashed) leaves nothing behind,
+  so the retry simply runs again.
+
+Claims live in the `idempotency_keys` table, so every worker sees them.
+Pending claims expire after IDEMPOTENCY_PENDING_SECONDS in case the worker
+holding them dies. Stored responses are kept for IDEMPOTENCY_TTL_SECONDS.
+The wrapped views are async, so every read and write of the table runs in a
+worker thread instead of on the event loop.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.extensions import db
+from app.models import IdempotencyKey
+from app.services import deadlines, metrics
+
+
+metrics.describe("idempotent_replays_total", "counter", "Retried POSTs answered from an earlier request with the same Idempotency-Key.")
+
+POLL_SECONDS = 0.1
+MAX_KEY_LENGTH = 255
+
+_next_prune = 0.0
+
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")))
+
+
+def _pending_lease() -> timedelta:
+    return timedelta(seconds=float(os.getenv("IDEMPOTENCY_PENDING_SECONDS", "120")))
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _claim(key_hash: str, user_id: int, request_hash: str) -> IdempotencyKey | None:
+    """Insert a pending row and return None, or return the live row another request already holds."""
+    now = datetime.utcnow()
+    for _ in range(2):
+        db.session.add(
+            IdempotencyKey(
+                key_hash=key_hash,
+                user_id=user_id,
+                request_hash=request_hash,
+                status="pending",
+                expires_at=now + _pending_lease(),
+            )
+        )
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+        existing = db.session.get(IdempotencyKey, key_hash, populate_existing=True)
+        if existing is not None and existing.expires_at > now:
+            return existing
+        # Expired (or removed in the meantime): clear it and claim again.
+        IdempotencyKey.query.filter_by(key_hash=key_hash).filter(IdempotencyKey.expires_at <= now).delete()
+        db.session.commit()
+    return db.session.get(IdempotencyKey, key_hash, populate_existing=True)
+
+
+def _release(key_hash: str) -> None:
+    try:
+        IdempotencyKey.query.filter_by(key_hash=key_hash, status="pending").delete()
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+
+
+def _store(key_hash: str, response) -> None:
+    try:
+        IdempotencyKey.query.filter_by(key_hash=key_hash).update(
+            {
+                "status": "done",
+                "status_code": response.status_code,
+                "response_body": response.get_data(as_text=True),
+                "expires_at": datetime.utcnow() + _ttl(),
+            }
+        )
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        _release(key_hash)
+
+
+def _replay(row: IdempotencyKey):
+    metrics.inc_counter("idempotent_replays_total", {"endpoint": request.endpoint})
+    response = current_app.response_class(row.response_body, status=row.status_code, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _poll(key_hash: str) -> IdempotencyKey | None:
+    row = db.session.get(IdempotencyKey, key_hash, populate_existing=True)
+    if row is not None:
+        db.session.expunge(row)
+    # End the read so the next poll sees the other request's commit.
+    db.session.rollback()
+    return row
+
+
+async def _wait_for(key_hash: str) -> IdempotencyKey | None:
+    """Poll until the request holding the key finishes or we run out of time; None once the key is released."""
+    give_up = time.monotonic() + min(_pending_lease().total_seconds(), deadlines.remaining())
+    while True:
+        await asyncio.sleep(POLL_SECONDS)
+        row = await asyncio.to_thread(_poll, key_hash)
+        if row is None or row.status == "done" or time.monotonic() >= give_up:
+            return row
+
+
+def _prune() -> None:
+    global _next_prune
+    if time.monotonic() < _next_prune:
+        return
+    _next_prune = time.monotonic() + 300
+    try:
+        IdempotencyKey.query.filter(IdempotencyKey.expires_at <= datetime.utcnow()).delete()
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+
+
+def idempotent(view):
+    """Honour `Idempotency-Key` on an async, jwt_required POST view."""
+
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key", "").strip()
+        if not key:
+            return await view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        user_id = int(get_jwt_identity())
+        key_hash = _hash(user_id, request.endpoint, key)
+        request_hash = _hash(request.get_data(as_text=True))
+        await asyncio.to_thread(_prune)
+        try:
+            existing = await asyncio.to_thread(_claim, key_hash, user_id, request_hash)
+            while existing is not None:
+                if existing.request_hash != request_hash:
+                    return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+                if existing.status == "done":
+                    return _replay(existing)
+                existing = await _wait_for(key_hash)
+                if existing is None:
+                    # The first attempt failed and released the key; this retry runs for real.
+                    existing = await asyncio.to_thread(_claim, key_hash, user_id, request_hash)
+                elif existing.status != "done":
+                    return jsonify({"error": "a request with this Idempotency-Key is still in progress"}), 409
+        except SQLAlchemyError:
+            await asyncio.to_thread(db.session.rollback)
+            return jsonify({"error": "temporary database issue. please retry"}), 503
+
+        try:
+            response = make_response(await view(*args, **kwargs))
+        except BaseException:
+            # Shielded: a cancelled request still has to give its key back.
+            await asyncio.shield(asyncio.to_thread(_release, key_hash))
+            raise
+        # Only successes are kept; a failed first attempt must not pin its error on every retry.
+        if 200 <= response.status_code < 300:
+            await asyncio.to_thread(_store, key_hash, response)
+        else:
+            await asyncio.to_thread(_release, key_hash)
+        return response
+
+    return wrapper
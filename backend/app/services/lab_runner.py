@@ -3,7 +3,12 @@ import re
 import shutil
 import subprocess
 import tempfile
-import requests
+from typing import TYPE_CHECKING
+
+from app.services.request_timing import timed
+
+if TYPE_CHECKING:
+    import requests
 
 
 LANGUAGE_JAVA = 62
@@ -35,13 +40,14 @@ def _run_java_locally(source_code: str) -> dict | None:
             with open(file_path, "w", encoding="utf-8") as handle:
                 handle.write(source_code)
 
-            compile_proc = subprocess.run(
-                [javac_bin, file_path],
-                cwd=tmpdir,
-                capture_output=True,
-                text=True,
-                timeout=12,
-            )
+            with timed("javac", "subprocess"):
+                compile_proc = subprocess.run(
+                    [javac_bin, file_path],
+                    cwd=tmpdir,
+                    capture_output=True,
+                    text=True,
+                    timeout=12,
+                )
             if compile_proc.returncode != 0:
                 return {
                     "status": "error",
@@ -52,13 +58,14 @@ def _run_java_locally(source_code: str) -> dict | None:
                     "note": "Executed locally using javac/java.",
                 }
 
-            run_proc = subprocess.run(
-                [java_bin, class_name],
-                cwd=tmpdir,
-                capture_output=True,
-                text=True,
-                timeout=12,
-            )
+            with timed("java", "subprocess"):
+                run_proc = subprocess.run(
+                    [java_bin, class_name],
+                    cwd=tmpdir,
+                    capture_output=True,
+                    text=True,
+                    timeout=12,
+                )
 
             return {
                 "status": "success" if run_proc.returncode == 0 else "error",
@@ -134,7 +141,24 @@ def _valid_judge0_creds(base_url: str, api_key: str, api_host: str) -> bool:
     return api_key.strip().lower() not in placeholder_tokens
 
 
+def _submit_to_judge0(base_url: str, headers: dict, source_code: str) -> "requests.Response":
+    import requests
+
+    with timed("judge0", "upstream"):
+        return requests.post(
+            f"{base_url}/submissions?base64_encoded=false&wait=true",
+            headers=headers,
+            json={
+                "language_id": LANGUAGE_JAVA,
+                "source_code": source_code,
+            },
+            timeout=40,
+        )
+
+
 def run_java_code(source_code: str) -> dict:
+    import requests
+
     base_url = os.getenv("JUDGE0_BASE_URL", "").strip().rstrip("/")
     api_key = os.getenv("JUDGE0_API_KEY", "").strip()
     api_host = os.getenv("JUDGE0_API_HOST", "").strip()
@@ -155,15 +179,7 @@ def run_java_code(source_code: str) -> dict:
     }
 
     try:
-        submit_resp = requests.post(
-            f"{base_url}/submissions?base64_encoded=false&wait=true",
-            headers=headers,
-            json={
-                "language_id": LANGUAGE_JAVA,
-                "source_code": source_code,
-            },
-            timeout=40,
-        )
+        submit_resp = _submit_to_judge0(base_url, headers, source_code)
         submit_resp.raise_for_status()
         payload = submit_resp.json()
 
@@ -0,0 +1,295 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_descriptions: dict[str, tuple[str, str]] = {}
+_counters: dict[tuple, float] = {}
+_gauges: dict[tuple, float] = {}
+_histograms: dict[tuple, dict] = {}
+_last_flush = 0.0
+_flush_timer: tuple[int, threading.Timer] | None = None
+# Serializes snapshot-and-write so a slower thread never replaces a newer file.
+_write_lock = threading.Lock()
+# (pid, nonce) naming this process's files; a recycled PID gets a new nonce.
+_identity: tuple[int, str] | None = None
+RETIRED_FILE = "metrics_retired.json"
+
+
+def _key(name: str, labels: dict | None) -> tuple:
+    return (name, tuple(sorted((labels or {}).items())))
+
+
+def describe(name: str, metric_type: str, help_text: str) -> None:
+    _descriptions[name] = (metric_type, help_text)
+
+
+def inc_counter(name: str, labels: dict | None = None, value: float = 1.0) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def inc_gauge(name: str, labels: dict | None = None, value: float = 1.0) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0.0) + value
+    # Published with the counters on the flush interval (and at scrape time), not on every change.
+    flush()
+
+
+def observe(name: str, labels: dict | None, value: float, buckets: tuple = LATENCY_BUCKETS) -> None:
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            _histograms[key] = hist
+        for idx, upper in enumerate(hist["buckets"]):
+            if value <= upper:
+                hist["counts"][idx] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def _multiproc_dir() -> Path | None:
+    raw = os.getenv("METRICS_MULTIPROC_DIR", "").strip()
+    return Path(raw) if raw else None
+
+
+def _own_name(prefix: str) -> str:
+    global _identity
+    if _identity is None or _identity[0] != os.getpid():
+        _identity = (os.getpid(), uuid.uuid4().hex[:8])
+    return f"{prefix}_{_identity[0]}_{_identity[1]}.json"
+
+
+def _parse_name(path: Path) -> tuple[int, str]:
+    """(pid, nonce) from `metrics_<pid>[_<nonce>].json`; raises ValueError for other files."""
+    parts = path.stem.split("_")
+    return int(parts[1]), parts[2] if len(parts) > 2 else ""
+
+
+def _write_json(target: Path, payload: dict) -> None:
+    tmp = target.with_name(f".{target.name}.tmp")
+    tmp.write_text(json.dumps(payload), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+@contextmanager
+def _dir_lock(target_dir: Path):
+    with open(target_dir / ".lock", "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": [[k[0], list(k[1]), v] for k, v in _counters.items()],
+            "gauges": [[k[0], list(k[1]), v] for k, v in _gauges.items()],
+            "histograms": [[k[0], list(k[1]), dict(v, counts=list(v["counts"]))] for k, v in _histograms.items()],
+            "descriptions": dict(_descriptions),
+        }
+
+
+def flush(force: bool = False) -> None:
+    """Write this worker's metrics to the shared directory so any worker can serve a scrape.
+
+    Flushes are rate-limited to METRICS_FLUSH_SECONDS; a skipped flush schedules
+    one for the end of the interval, so an idle worker still publishes its last
+    requests.
+    """
+    global _last_flush, _flush_timer
+    target_dir = _multiproc_dir()
+    if target_dir is None:
+        return
+    now = time.monotonic()
+    interval = float(os.getenv("METRICS_FLUSH_SECONDS", "2"))
+    if not force and now - _last_flush < interval:
+        with _lock:
+            if _flush_timer is None or _flush_timer[0] != os.getpid():
+                timer = threading.Timer(interval - (now - _last_flush), _deferred_flush)
+                timer.daemon = True
+                _flush_timer = (os.getpid(), timer)
+                timer.start()
+        return
+    _last_flush = now
+    target_dir.mkdir(parents=True, exist_ok=True)
+    target = target_dir / _own_name("metrics")
+    if not target.exists():
+        # First flush under this identity: files left by an earlier process with our PID are dead.
+        with _dir_lock(target_dir):
+            _retire(target_dir, lambda pid, nonce: pid == _identity[0] and nonce != _identity[1])
+    with _write_lock:
+        _write_json(target, _snapshot())
+
+
+def _deferred_flush() -> None:
+    global _flush_timer
+    with _lock:
+        _flush_timer = None
+    flush(force=True)
+
+
+atexit.register(lambda: flush(force=True))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (ValueError, OSError):
+        return None
+
+
+def _retire(target_dir: Path, is_dead) -> None:
+    """Fold dead workers' counters and histograms into RETIRED_FILE and delete their files.
+
+    Totals stay monotonic across worker restarts while the directory stays one
+    file per live worker. A dead worker's gauges are dropped. Callers hold the
+    directory lock.
+    """
+    dead, retired = [], []
+    for path in target_dir.glob("metrics_*.json"):
+        if path.name == RETIRED_FILE:
+            continue
+        try:
+            pid, nonce = _parse_name(path)
+        except (ValueError, IndexError):
+            continue
+        if is_dead(pid, nonce):
+            dead.append(path)
+            retired.append(_read(path) or {})
+    if not dead:
+        return
+    counters, _gauges_, histograms, descriptions = _merge([_read(target_dir / RETIRED_FILE) or {}, *retired])
+    _write_json(
+        target_dir / RETIRED_FILE,
+        {
+            "counters": [[name, list(labels), v] for (name, labels), v in counters.items()],
+            "histograms": [[name, list(labels), h] for (name, labels), h in histograms.items()],
+            "descriptions": descriptions,
+        },
+    )
+    for path in dead:
+        path.unlink(missing_ok=True)
+
+
+def _collect_snapshots() -> list[dict]:
+    target_dir = _multiproc_dir()
+    if target_dir is None:
+        return [_snapshot()]
+
+    flush(force=True)
+    with _dir_lock(target_dir):
+        _retire(target_dir, lambda pid, _nonce: not _pid_alive(pid))
+        return [snap for path in sorted(target_dir.glob("*.json")) if (snap := _read(path)) is not None]
+
+
+def _merge(snapshots: list[dict]) -> tuple[dict, dict, dict, dict]:
+    counters: dict[tuple, float] = {}
+    gauges: dict[tuple, float] = {}
+    histograms: dict[tuple, dict] = {}
+    descriptions: dict[str, list] = {}
+
+    for snap in snapshots:
+        descriptions.update(snap.get("descriptions", {}))
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(tuple(p) for p in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, value in snap.get("gauges", []):
+            key = (name, tuple(tuple(p) for p in labels))
+            gauges[key] = gauges.get(key, 0.0) + value
+        for name, labels, hist in snap.get("histograms", []):
+            key = (name, tuple(tuple(p) for p in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = {
+                    "buckets": list(hist["buckets"]),
+                    "counts": list(hist["counts"]),
+                    "sum": hist["sum"],
+                    "count": hist["count"],
+                }
+                continue
+            merged["counts"] = [a + b for a, b in zip(merged["counts"], hist["counts"])]
+            merged["sum"] += hist["sum"]
+            merged["count"] += hist["count"]
+    return counters, gauges, histograms, descriptions
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: list | tuple, extra: tuple | None = None) -> str:
+    pairs = [tuple(p) for p in labels]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_prometheus() -> str:
+    """Aggregate all worker snapshots and render them in Prometheus text format."""
+    counters, gauges, histograms, descriptions = _merge(_collect_snapshots())
+
+    lines: list[str] = []
+    emitted: set[str] = set()
+
+    def header(name: str, default_type: str) -> None:
+        if name in emitted:
+            return
+        emitted.add(name)
+        metric_type, help_text = descriptions.get(name, (default_type, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for upper, count in zip(hist["buckets"], hist["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_number(upper)))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(hist['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+"""Latency-aware model choice and hedged requests.
+
+Candidates for an operation (the image model chain, or a comma-separated
+`OPENAI_MODEL`) are ranked per call. Models that are unavailable to our key,
+behind an open breaker or failing most calls go last. The rest are ordered
+by observed median latency. Models without enough samples keep their
+configured order behind the measured ones.
+
+When a call outlives its model's p95, a hedge goes to the next candidate.
+The first success wins and the other call is cancelled. Hedges draw from
+the same budget as retries, so they add a few percent of calls at most.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from app.config import is_truthy
+from app.services import metrics, provider_resilience
+from app.services.provider_telemetry import call_stats, last_failure_reason, percentile, set_failure_reason
+
+
+metrics.describe("provider_hedges_total", "counter", "Hedged upstream requests by which call won.")
+metrics.describe("provider_model_unavailable_total", "counter", "Models marked unavailable to our API key.")
+
+UNAVAILABLE_STATUSES = {403, 404}
+
+_unavailable: dict[tuple[str, str], float] = {}
+_unavailable_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+_executor_lock = threading.Lock()
+
+
+def _min_samples() -> int:
+    return int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "10"))
+
+
+def mark_unavailable(provider: str, model: str) -> None:
+    """Skip `model` for MODEL_UNAVAILABLE_TTL_SECONDS after the provider says our key cannot use it."""
+    ttl = float(os.getenv("MODEL_UNAVAILABLE_TTL_SECONDS", "21600"))
+    with _unavailable_lock:
+        _unavailable[(provider, model)] = time.monotonic() + ttl
+    metrics.inc_counter("provider_model_unavailable_total", {"provider": provider, "model": model})
+
+
+def is_unavailable(provider: str, model: str) -> bool:
+    with _unavailable_lock:
+        until = _unavailable.get((provider, model))
+        if until is not None and until <= time.monotonic():
+            del _unavailable[(provider, model)]
+            until = None
+    return until is not None
+
+
+def _healthy(provider: str, model: str, stats: dict) -> bool:
+    if provider_resilience.is_open(provider, model):
+        return False
+    return stats["calls"] < _min_samples() or stats["ok"] / stats["calls"] >= 0.5
+
+
+def rank(calls: list[dict]) -> list[dict]:
+    """Order call specs (dicts with provider/operation/model) fastest-healthy first; drop unavailable models."""
+    scored = []
+    for position, call in enumerate(calls):
+        provider, operation, model = call["provider"], call["operation"], call["model"]
+        if is_unavailable(provider, model):
+            continue
+        stats = call_stats(provider, operation, model)
+        measured = len(stats["durations"]) >= _min_samples()
+        median = percentile(stats["durations"], 0.5) if measured else float("inf")
+        scored.append(((not _healthy(provider, model, stats), median, position), call))
+    return [call for _, call in sorted(scored, key=lambda item: item[0])]
+
+
+def hedge_delay(call: dict) -> float | None:
+    """Seconds after which to hedge `call`, or None when there is no latency history yet."""
+    if not is_truthy(os.getenv("UPSTREAM_HEDGING"), default=True):
+        return None
+    durations = call_stats(call["provider"], call["operation"], call["model"])["durations"]
+    if len(durations) < _min_samples():
+        return None
+    return percentile(durations, 0.95)
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("UPSTREAM_HEDGE_THREADS", "16")), thread_name_prefix="hedge"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _count_hedge(call: dict, winner: str) -> None:
+    metrics.inc_counter("provider_hedges_total", {"provider": call["provider"], "operation": call["operation"], "winner": winner})
+
+
+def run(calls: list[dict], attempt):
+    """Return the first non-None `attempt(call)`, trying `calls` in order and hedging slow ones.
+
+    `attempt` must not raise. Without latency history this is a plain
+    sequential walk. Otherwise calls run on the hedge pool so a slow one can be
+    raced; a losing synchronous request cannot be interrupted, so its result is
+    discarded when it returns.
+    """
+    remaining = list(calls)
+    if not any(hedge_delay(call) for call in remaining[:-1]):
+        for call in remaining:
+            result = attempt(call)
+            if result is not None:
+                return result
+        return None
+
+    executor = _hedge_executor()
+    running: dict = {}
+    last_context = None
+
+    def start(role: str) -> None:
+        call = remaining.pop(0)
+        context = copy_context()
+        running[executor.submit(context.run, attempt, call)] = (call, role, context)
+
+    while remaining or running:
+        if not running:
+            start("primary")
+        delay = hedge_delay(next(reversed(running.values()))[0]) if remaining and len(running) == 1 else None
+        done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+        if not done:
+            if provider_resilience.retry_budget.try_spend():
+                start("hedge")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            call, role, last_context = running.pop(future)
+            result = future.result()
+            if result is not None:
+                for loser in running:
+                    loser.cancel()
+                if running or role == "hedge":
+                    _count_hedge(call, role)
+                return result
+    # The attempts ran in copied contexts; surface why the last one failed.
+    set_failure_reason(last_context.run(last_failure_reason))
+    return None
+
+
+async def arun(calls: list[dict], attempt):
+    """`run` for coroutines; the losing request is cancelled outright."""
+    remaining = list(calls)
+    if not any(hedge_delay(call) for call in remaining[:-1]):
+        for call in remaining:
+            result = await attempt(call)
+            if result is not None:
+                return result
+        return None
+
+    loop = asyncio.get_running_loop()
+    running: dict = {}
+    last_context = None
+
+    def start(role: str) -> None:
+        call = remaining.pop(0)
+        context = copy_context()
+        running[loop.create_task(attempt(call), context=context)] = (call, role, context)
+
+    try:
+        while remaining or running:
+            if not running:
+                start("primary")
+            delay = hedge_delay(next(reversed(running.values()))[0]) if remaining and len(running) == 1 else None
+            done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if provider_resilience.retry_budget.try_spend():
+                    start("hedge")
+                    continue
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                call, role, last_context = running.pop(task)
+                result = task.result()
+                if result is not None:
+                    if running or role == "hedge":
+                        _count_hedge(call, role)
+                    return result
+        set_failure_reason(last_context.run(last_failure_reason))
+        return None
+    finally:
+        for task in running:
+            task.cancel()
@@ -1,18 +1,43 @@
+import asyncio
 import json
 import os
 import re
-from typing import Any
+import time
+from typing import TYPE_CHECKING, Any
 from pathlib import Path
 
-import requests
+from app.services import cancellation, deadlines, model_router, provider_resilience, rate_limiter, single_flight, usage_ledger
+from app.services.provider_telemetry import (
+    record_coalesced,
+    record_image_model_selected,
+    record_provider_call,
+    set_failure_reason,
+    usage_tokens,
+)
+from app.services.request_timing import add_time, record_span
 
+if TYPE_CHECKING:
+    import httpx
+    import requests
 
-OPENAI_CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
-OPENAI_SPEECH_URL = "https://api.openai.com/v1/audio/speech"
-OPENAI_IMAGE_URL = "https://api.openai.com/v1/images/generations"
+OPENAI_API_BASE = "https://api.openai.com/v1"
+OPENAI_CHAT_COMPLETIONS_URL = f"{OPENAI_API_BASE}/chat/completions"
+OPENAI_SPEECH_URL = f"{OPENAI_API_BASE}/audio/speech"
+OPENAI_IMAGE_URL = f"{OPENAI_API_BASE}/images/generations"
 ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1/text-to-speech"
 
 
+def _openai_url(url: str) -> str:
+    """Send OpenAI calls to OPENAI_BASE_URL (a proxy or a local stub provider) when it is set."""
+    base = os.getenv("OPENAI_BASE_URL", "").strip().rstrip("/")
+    return url.replace(OPENAI_API_BASE, base, 1) if base else url
+
+
+def _estimated_tokens(kwargs: dict) -> int:
+    # Roughly four characters per token for the prompt, plus room for the answer.
+    return len(json.dumps(kwargs.get("json") or {})) // 4 + 256
+
+
 def _extract_text(payload: dict[str, Any]) -> str:
     if payload.get("output_text"):
         return str(payload["output_text"]).strip()
@@ -52,87 +77,386 @@ def _extract_json(text: str) -> dict[str, Any] | None:
         return None
 
 
-def chatgpt_json(system_prompt: str, user_prompt: str, temperature: float = 0.3) -> dict[str, Any] | None:
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini").strip()
-    if not api_key:
-        return None
+def _record_call(
+    provider: str, operation: str, model: str, started: float, outcome: str, response, payload, timeout=None
+) -> None:
+    elapsed = time.perf_counter() - started
+    add_time("upstream", elapsed)
+    record_span(f"{provider}-{operation}", elapsed)
+    if outcome != "ok":
+        set_failure_reason(outcome)
+    status = response.status_code if response is not None else None
+    cancellation.count_upstream_call()
+    provider_resilience.record_result(provider, model, outcome, status)
+    if status in model_router.UNAVAILABLE_STATUSES:
+        model_router.mark_unavailable(provider, model)
+    record_provider_call(
+        provider,
+        operation,
+        model,
+        # A timed-out call took at least its timeout, which is what adaptive_timeout needs to see.
+        max(elapsed, timeout) if outcome == "timeout" and isinstance(timeout, (int, float)) else elapsed,
+        outcome,
+        status=status,
+        tokens=usage_tokens(payload),
+        response_bytes=len(response.content) if response is not None else 0,
+    )
+
+
+class _SharedResponse:
+    """Body of a response another worker received for the same request."""
 
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+
+def _admit(provider: str, operation: str, model: str, kwargs: dict) -> None:
+    """Fail fast when the client gave up, the user is over quota, the breaker is open or the deadline is spent."""
+    # A reason left by an earlier call on this thread or context must not explain this call's fallback.
+    set_failure_reason(None)
     try:
-        response = requests.post(
-            OPENAI_CHAT_COMPLETIONS_URL,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": model,
-                "temperature": temperature,
-                "response_format": {"type": "json_object"},
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-            },
-            timeout=25,
-        )
+        cancellation.check_cancelled()
+    except cancellation.RequestCancelled:
+        set_failure_reason("cancelled")
+        raise
+    try:
+        usage_ledger.check_quota(operation, kwargs.get("json"), _estimated_tokens(kwargs))
+    except usage_ledger.QuotaExceeded:
+        set_failure_reason("quota_exceeded")
+        raise
+    try:
+        provider_resilience.check_circuit(provider, model)
+    except provider_resilience.CircuitOpenError:
+        set_failure_reason("circuit_open")
+        raise
+    kwargs["timeout"] = provider_resilience.adaptive_timeout(provider, operation, model, kwargs.get("timeout", 25))
+    _fit_deadline(kwargs)
+
+
+def _fit_deadline(kwargs: dict) -> None:
+    try:
+        kwargs["timeout"] = deadlines.timeout_for(kwargs.get("timeout", 25))
+    except deadlines.DeadlineExceeded:
+        set_failure_reason("deadline_exceeded")
+        raise
+
+
+def _coalescing(url: str, provider: str, operation: str, model: str, expect_json: bool, kwargs: dict) -> dict[str, Any]:
+    # Headers carry the API key and never change the answer, so they stay out of the key.
+    key = single_flight.fingerprint(url, operation, kwargs.get("json"), kwargs.get("data"))
+    started = time.perf_counter()
+
+    def on_shared(scope: str) -> None:
+        add_time("upstream", time.perf_counter() - started)
+        record_coalesced(provider, operation, model, scope)
+
+    def decode(body: bytes):
+        return _SharedResponse(body), json.loads(body) if expect_json else None
+
+    return {"key": key, "encode": lambda result: result[0].content, "decode": decode, "on_shared": on_shared}
+
+
+def _post(
+    url: str,
+    *,
+    provider: str,
+    operation: str,
+    model: str,
+    expect_json: bool = True,
+    **kwargs,
+) -> tuple["requests.Response", dict[str, Any] | None]:
+    """POST to an upstream provider, recording latency, status, usage and bytes.
+
+    Identical concurrent calls share one upstream request (see single_flight);
+    breakers, retries and timeouts come from provider_resilience. Raises on
+    open circuits, transport errors and non-2xx responses after recording
+    them, so callers keep their existing fallback handling.
+    """
+    _admit(provider, operation, model, kwargs)
+    return single_flight.run(
+        call=lambda: provider_resilience.call_with_retries(
+            lambda: _send(url, provider=provider, operation=operation, model=model, expect_json=expect_json, **kwargs),
+            provider,
+            operation,
+        ),
+        **_coalescing(url, provider, operation, model, expect_json, kwargs),
+    )
+
+
+def _send(
+    url: str,
+    *,
+    provider: str,
+    operation: str,
+    model: str,
+    expect_json: bool = True,
+    **kwargs,
+) -> tuple["requests.Response", dict[str, Any] | None]:
+    # Imported on first use: `requests` is the slowest import on the worker boot path.
+    import requests
+
+    estimated = _estimated_tokens(kwargs)
+    try:
+        rate_limiter.acquire(provider, model, estimated)
+    except rate_limiter.RateLimitedError:
+        set_failure_reason("rate_limited")
+        raise
+    # Retries and rate-limit waits eat into the budget, so re-cap the timeout per attempt.
+    _fit_deadline(kwargs)
+
+    started = time.perf_counter()
+    response = None
+    payload = None
+    outcome = "ok"
+    try:
+        response = requests.post(url, **kwargs)
         response.raise_for_status()
-        data = response.json()
-        content = ((data.get("choices") or [{}])[0].get("message") or {}).get("content", "")
-        return _extract_json(content)
-    except Exception:
-        return None
+        if expect_json:
+            payload = response.json()
+            rate_limiter.settle(provider, model, estimated, usage_tokens(payload)["total"])
+        usage_ledger.record(operation, kwargs.get("json"), usage_tokens(payload)["total"] or estimated)
+        return response, payload
+    except requests.Timeout:
+        outcome = "timeout"
+        raise
+    except requests.HTTPError:
+        outcome = "http_error"
+        raise
+    except requests.RequestException:
+        outcome = "connection_error"
+        raise
+    except ValueError:
+        outcome = "invalid_response"
+        raise
+    finally:
+        _record_call(provider, operation, model, started, outcome, response, payload, kwargs.get("timeout"))
 
 
-def chatgpt_text(system_prompt: str, user_prompt: str, temperature: float = 0.4) -> str | None:
+_async_client: "httpx.AsyncClient | None" = None
+_async_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+async def open_async_client() -> None:
+    """Share one pooled client across requests on the server loop; called from the ASGI lifespan."""
+    global _async_client, _async_client_loop
+    import httpx
+
+    if _async_client is None:
+        limits = httpx.Limits(max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "200")))
+        _async_client = httpx.AsyncClient(limits=limits)
+        _async_client_loop = asyncio.get_running_loop()
+
+
+async def close_async_client() -> None:
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = _async_client_loop = None
+
+
+async def _apost(
+    url: str,
+    *,
+    provider: str,
+    operation: str,
+    model: str,
+    expect_json: bool = True,
+    **kwargs,
+) -> tuple["httpx.Response", dict[str, Any] | None]:
+    """Async twin of `_post` on httpx; same telemetry, coalescing, breakers and raise-on-failure contract."""
+    await usage_ledger.aprefetch(operation, kwargs.get("json"))
+    _admit(provider, operation, model, kwargs)
+    return await single_flight.arun(
+        call=lambda: provider_resilience.acall_with_retries(
+            lambda: _asend(url, provider=provider, operation=operation, model=model, expect_json=expect_json, **kwargs),
+            provider,
+            operation,
+        ),
+        **_coalescing(url, provider, operation, model, expect_json, kwargs),
+    )
+
+
+async def _asend(
+    url: str,
+    *,
+    provider: str,
+    operation: str,
+    model: str,
+    expect_json: bool = True,
+    **kwargs,
+) -> tuple["httpx.Response", dict[str, Any] | None]:
+    import httpx
+
+    estimated = _estimated_tokens(kwargs)
+    try:
+        await rate_limiter.aacquire(provider, model, estimated)
+    except rate_limiter.RateLimitedError:
+        set_failure_reason("rate_limited")
+        raise
+    # Retries and rate-limit waits eat into the budget, so re-cap the timeout per attempt.
+    _fit_deadline(kwargs)
+
+    started = time.perf_counter()
+    response = None
+    payload = None
+    outcome = "ok"
+    try:
+        if _async_client is not None and asyncio.get_running_loop() is _async_client_loop:
+            response = await _async_client.post(url, **kwargs)
+        else:
+            # Async views served through WSGI run on a per-request event loop; no pool to share.
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, **kwargs)
+        response.raise_for_status()
+        if expect_json:
+            payload = response.json()
+            await rate_limiter.asettle(provider, model, estimated, usage_tokens(payload)["total"])
+        usage_ledger.record(operation, kwargs.get("json"), usage_tokens(payload)["total"] or estimated)
+        return response, payload
+    except httpx.TimeoutException:
+        outcome = "timeout"
+        raise
+    except httpx.HTTPStatusError:
+        outcome = "http_error"
+        raise
+    except httpx.HTTPError:
+        outcome = "connection_error"
+        raise
+    except ValueError:
+        outcome = "invalid_response"
+        raise
+    except asyncio.CancelledError:
+        # A hedge lost the race or the caller went away; not a provider failure.
+        outcome = "cancelled"
+        raise
+    finally:
+        _record_call(provider, operation, model, started, outcome, response, payload, kwargs.get("timeout"))
+
+
+def _chat_requests(system_prompt: str, user_prompt: str, temperature: float, json_mode: bool) -> list[dict[str, Any]]:
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini").strip()
     if not api_key:
-        return None
+        set_failure_reason("no_api_key")
+        return []
 
-    try:
-        response = requests.post(
-            OPENAI_CHAT_COMPLETIONS_URL,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
+    calls = []
+    # OPENAI_MODEL may list alternates ("gpt-4o-mini,gpt-4.1-mini") for routing and hedging.
+    for model in [m.strip() for m in os.getenv("OPENAI_MODEL", "gpt-4o-mini").split(",") if m.strip()]:
+        body: dict[str, Any] = {
+            "model": model,
+            "temperature": temperature,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+        }
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+
+        calls.append(
+            {
+                "url": _openai_url(OPENAI_CHAT_COMPLETIONS_URL),
+                "provider": "openai",
+                "operation": "chat_json" if json_mode else "chat_text",
                 "model": model,
-                "temperature": temperature,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-            },
-            timeout=25,
+                "headers": {
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json",
+                },
+                "json": body,
+                "timeout": 25,
+            }
         )
-        response.raise_for_status()
-        data = response.json()
-        text = ((data.get("choices") or [{}])[0].get("message") or {}).get("content", "")
-        return text or None
+    return calls
+
+
+def _routed(calls: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    ranked = model_router.rank(calls)
+    if calls and not ranked:
+        set_failure_reason("model_unavailable")
+    return ranked
+
+
+def _attempt(call: dict[str, Any]):
+    call = dict(call)
+    try:
+        return _post(call.pop("url"), **call)
     except Exception:
         return None
 
 
-def generate_tts_mp3(text: str, output_path: str) -> bool:
-    if not text.strip():
-        return False
+async def _aattempt(call: dict[str, Any]):
+    call = dict(call)
+    try:
+        return await _apost(call.pop("url"), **call)
+    except Exception:
+        return None
 
+
+def _chat_content(data: dict[str, Any] | None) -> str | None:
+    content = (((data or {}).get("choices") or [{}])[0].get("message") or {}).get("content", "")
+    if not content:
+        set_failure_reason("empty_response")
+        return None
+    return content
+
+
+def _chat_json(content: str | None) -> dict[str, Any] | None:
+    if content is None:
+        return None
+    parsed = _extract_json(content)
+    if parsed is None:
+        set_failure_reason("invalid_json")
+    return parsed
+
+
+def _chat_completion_content(system_prompt: str, user_prompt: str, temperature: float, json_mode: bool) -> str | None:
+    result = model_router.run(_routed(_chat_requests(system_prompt, user_prompt, temperature, json_mode)), _attempt)
+    return _chat_content(result[1]) if result else None
+
+
+async def _achat_completion_content(system_prompt: str, user_prompt: str, temperature: float, json_mode: bool) -> str | None:
+    result = await model_router.arun(_routed(_chat_requests(system_prompt, user_prompt, temperature, json_mode)), _aattempt)
+    return _chat_content(result[1]) if result else None
+
+
+def chatgpt_json(system_prompt: str, user_prompt: str, temperature: float = 0.3) -> dict[str, Any] | None:
+    return _chat_json(_chat_completion_content(system_prompt, user_prompt, temperature, json_mode=True))
+
+
+def chatgpt_text(system_prompt: str, user_prompt: str, temperature: float = 0.4) -> str | None:
+    return _chat_completion_content(system_prompt, user_prompt, temperature, json_mode=False)
+
+
+async def achatgpt_json(system_prompt: str, user_prompt: str, temperature: float = 0.3) -> dict[str, Any] | None:
+    return _chat_json(await _achat_completion_content(system_prompt, user_prompt, temperature, json_mode=True))
+
+
+async def achatgpt_text(system_prompt: str, user_prompt: str, temperature: float = 0.4) -> str | None:
+    return await _achat_completion_content(system_prompt, user_prompt, temperature, json_mode=False)
+
+
+def _tts_requests(text: str) -> list[dict[str, Any]]:
+    calls = []
     # Prefer ElevenLabs when key is available.
     eleven_api_key = os.getenv("ELEVENLABS_API_KEY", "").strip()
     eleven_voice_id = os.getenv("ELEVENLABS_VOICE_ID", "EXAVITQu4vr4xnSDxMaL").strip()
     eleven_model_id = os.getenv("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2").strip()
     if eleven_api_key and eleven_voice_id:
-        try:
-            response = requests.post(
-                f"{ELEVENLABS_BASE_URL}/{eleven_voice_id}",
-                headers={
+        calls.append(
+            {
+                "url": f"{ELEVENLABS_BASE_URL}/{eleven_voice_id}",
+                "provider": "elevenlabs",
+                "operation": "tts",
+                "model": eleven_model_id,
+                "headers": {
                     "xi-api-key": eleven_api_key,
                     "Content-Type": "application/json",
                     "Accept": "audio/mpeg",
                 },
-                json={
+                "json": {
                     "text": text[:3500],
                     "model_id": eleven_model_id,
                     "voice_settings": {
@@ -140,52 +464,84 @@ def generate_tts_mp3(text: str, output_path: str) -> bool:
                         "similarity_boost": 0.75,
                     },
                 },
-                timeout=25,
-            )
-            response.raise_for_status()
-            out = Path(output_path)
-            out.parent.mkdir(parents=True, exist_ok=True)
-            out.write_bytes(response.content)
-            return True
-        except Exception:
-            # fall back to OpenAI TTS
-            pass
+                "timeout": 25,
+            }
+        )
 
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    if not api_key:
+    if api_key:
+        tts_model = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts").strip()
+        voice = os.getenv("OPENAI_TTS_VOICE", "alloy").strip()
+        calls.append(
+            {
+                "url": _openai_url(OPENAI_SPEECH_URL),
+                "provider": "openai",
+                "operation": "tts",
+                "model": tts_model,
+                "headers": {
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json",
+                },
+                "json": {
+                    "model": tts_model,
+                    "voice": voice,
+                    "input": text[:4000],
+                    "format": "mp3",
+                },
+                "timeout": 20,
+            }
+        )
+    return calls
+
+
+def _write_audio(output_path: str, content: bytes) -> None:
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(content)
+
+
+def _tts_failed() -> bool:
+    if not os.getenv("OPENAI_API_KEY", "").strip():
+        set_failure_reason("no_api_key")
+    return False
+
+
+def generate_tts_mp3(text: str, output_path: str) -> bool:
+    if not text.strip():
+        set_failure_reason("empty_input")
         return False
 
-    tts_model = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts").strip()
-    voice = os.getenv("OPENAI_TTS_VOICE", "alloy").strip()
+    # ElevenLabs first, then OpenAI TTS.
+    for call in _tts_requests(text):
+        try:
+            response, _ = _post(call.pop("url"), expect_json=False, **call)
+            _write_audio(output_path, response.content)
+            return True
+        except Exception:
+            continue
+    return _tts_failed()
 
-    try:
-        response = requests.post(
-            OPENAI_SPEECH_URL,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": tts_model,
-                "voice": voice,
-                "input": text[:4000],
-                "format": "mp3",
-            },
-            timeout=20,
-        )
-        response.raise_for_status()
-        out = Path(output_path)
-        out.parent.mkdir(parents=True, exist_ok=True)
-        out.write_bytes(response.content)
-        return True
-    except Exception:
+
+async def agenerate_tts_mp3(text: str, output_path: str) -> bool:
+    if not text.strip():
+        set_failure_reason("empty_input")
         return False
 
+    for call in _tts_requests(text):
+        try:
+            response, _ = await _apost(call.pop("url"), expect_json=False, **call)
+            await asyncio.to_thread(_write_audio, output_path, response.content)
+            return True
+        except Exception:
+            continue
+    return _tts_failed()
 
-def generate_image_data_url(prompt: str, size: str = "1024x1024") -> str | None:
+
+def _image_requests(prompt: str, size: str) -> list[dict[str, Any]]:
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
     if not api_key or not prompt.strip():
-        return None
+        set_failure_reason("no_api_key" if not api_key else "empty_input")
+        return []
 
     configured = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1").strip()
     candidates = [m.strip() for m in configured.split(",") if m.strip()]
@@ -197,28 +553,51 @@ def generate_image_data_url(prompt: str, size: str = "1024x1024") -> str | None:
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
+    return [
+        {
+            "url": _openai_url(OPENAI_IMAGE_URL),
+            "provider": "openai",
+            "operation": "image",
+            "model": image_model,
+            "headers": headers,
+            "json": {
+                "model": image_model,
+                "prompt": prompt[:3200],
+                "size": size,
+            },
+            "timeout": 35,
+        }
+        for image_model in candidates
+    ]
 
-    for image_model in candidates:
-        try:
-            response = requests.post(
-                OPENAI_IMAGE_URL,
-                headers=headers,
-                json={
-                    "model": image_model,
-                    "prompt": prompt[:3200],
-                    "size": size,
-                },
-                timeout=35,
-            )
-            response.raise_for_status()
-            payload = response.json()
-            data = (payload.get("data") or [{}])[0]
-            b64 = data.get("b64_json")
-            if b64:
-                return f"data:image/png;base64,{b64}"
-            url = data.get("url")
-            if url:
-                return str(url)
-        except Exception:
-            continue
+
+def _image_url(payload: dict[str, Any] | None, image_model: str) -> str | None:
+    data = ((payload or {}).get("data") or [{}])[0]
+    b64 = data.get("b64_json")
+    if b64:
+        record_image_model_selected(image_model)
+        return f"data:image/png;base64,{b64}"
+    url = data.get("url")
+    if url:
+        record_image_model_selected(image_model)
+        return str(url)
+    set_failure_reason("empty_response")
     return None
+
+
+def _image_attempt(call: dict[str, Any]) -> str | None:
+    result = _attempt(call)
+    return _image_url(result[1], call["model"]) if result else None
+
+
+async def _aimage_attempt(call: dict[str, Any]) -> str | None:
+    result = await _aattempt(call)
+    return _image_url(result[1], call["model"]) if result else None
+
+
+def generate_image_data_url(prompt: str, size: str = "1024x1024") -> str | None:
+    return model_router.run(_routed(_image_requests(prompt, size)), _image_attempt)
+
+
+async def agenerate_image_data_url(prompt: str, size: str = "1024x1024") -> str | None:
+    return await model_router.arun(_routed(_image_requests(prompt, size)), _aimage_attempt)
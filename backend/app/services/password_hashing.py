@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.services.request_timing import timed
+
+
+class HashingBusyError(RuntimeError):
+    """Raised when the hashing queue is full; routes answer 503 with Retry-After."""
+
+
+_executor: ProcessPoolExecutor | None = None
+_executor_pid: int | None = None
+_executor_lock = threading.Lock()
+_slots: threading.BoundedSemaphore | None = None
+
+
+def _worker_count() -> int:
+    return max(0, int(os.getenv("PASSWORD_HASH_WORKERS", "2")))
+
+
+def password_hash_method() -> str:
+    """Werkzeug method string, e.g. `scrypt:32768:8:1` or `pbkdf2:sha256:600000`."""
+    return os.getenv("PASSWORD_HASH_METHOD", "scrypt").strip() or "scrypt"
+
+
+@lru_cache(maxsize=8)
+def _canonical_method(method: str) -> str:
+    # Let werkzeug fill in its default cost parameters so stored prefixes compare exactly.
+    return generate_password_hash("probe", method=method).split("$", 1)[0]
+
+
+def _get_executor() -> tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        # Pools do not survive fork; each gunicorn worker builds its own.
+        if _executor is None or _executor_pid != os.getpid():
+            workers = _worker_count()
+            queue_limit = max(0, int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "16")))
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(workers + queue_limit)
+        return _executor, _slots
+
+
+def shutdown_executor() -> None:
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_pid = None
+
+
+def _run(fn, *args):
+    with timed("password-hash"):
+        return _dispatch(fn, *args)
+
+
+def _dispatch(fn, *args):
+    if _worker_count() == 0:
+        return fn(*args)
+
+    executor, slots = _get_executor()
+    wait_seconds = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "2"))
+    if not slots.acquire(timeout=wait_seconds):
+        raise HashingBusyError("password hashing queue is full")
+    try:
+        return executor.submit(fn, *args).result()
+    except BrokenProcessPool:
+        shutdown_executor()
+        return fn(*args)
+    finally:
+        slots.release()
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, password_hash_method())
+
+
+def verify_password(stored_hash: str, password: str) -> bool:
+    return _run(check_password_hash, stored_hash, password)
+
+
+def hash_passwords(passwords: list[str], method: str | None = None) -> list[str]:
+    """Hash a batch (roster imports) on a short-lived pool sized to the machine's cores."""
+    method = method or password_hash_method()
+    workers = min(len(passwords), int(os.getenv("PASSWORD_HASH_BULK_WORKERS", "0")) or os.cpu_count() or 1)
+    with timed("password-hash"):
+        if workers < 2:
+            return [generate_password_hash(p, method=method) for p in passwords]
+        chunksize = max(1, len(passwords) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(generate_password_hash, passwords, [method] * len(passwords), chunksize=chunksize))
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    return stored_hash.split("$", 1)[0] != _canonical_method(password_hash_method())
+
+
+def verify_and_upgrade(user, password: str) -> bool:
+    """Check a login password and re-hash it when the configured algorithm or cost changed.
+
+    The caller commits; the new hash rides along with the login's session.
+    """
+    if not verify_password(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
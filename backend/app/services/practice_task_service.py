@@ -1,6 +1,11 @@
-from app.services.openai_service import chatgpt_json
+from app.services import deadlines
+from app.services.openai_service import achatgpt_json, chatgpt_json
+from app.services.provider_telemetry import record_fallback
+from app.services.request_timing import timed
 
 
+PRACTICE_AI_MIN_SECONDS = 3
+
 DEFAULT_TASKS = [
     {
         "task_name": "Try-catch for divide by zero",
@@ -327,17 +332,19 @@ def _merge_with_defaults(tasks: list[dict], count: int) -> list[dict]:
     return merged
 
 
-def generate_practice_tasks_from_topic(topic: str, count: int = 3, allow_ai: bool = True) -> tuple[list[dict], str]:
-    clean_topic = (topic or "").strip()
-    safe_count = max(1, min(5, int(count)))
+def _tasks_without_ai(clean_topic: str, safe_count: int, allow_ai: bool) -> tuple[list[dict], str] | None:
     bank_tasks = _topic_tasks_from_bank(clean_topic, safe_count)
     if bank_tasks:
         return bank_tasks, "catalog"
     if not clean_topic or _is_low_signal_topic(clean_topic):
         return DEFAULT_TASKS[:safe_count], "default"
-    if not allow_ai:
+    # AI tasks are optional; with the request budget nearly spent the defaults are served.
+    if not allow_ai or not deadlines.has_time(PRACTICE_AI_MIN_SECONDS):
         return DEFAULT_TASKS[:safe_count], "default"
+    return None
+
 
+def _practice_prompts(clean_topic: str, safe_count: int) -> tuple[str, str]:
     system_prompt = (
         "You are a Java tutor creating practical exception-handling practice tasks. "
         "Return strict JSON only."
@@ -356,13 +363,39 @@ def generate_practice_tasks_from_topic(topic: str, count: int = 3, allow_ai: boo
         "}\n"
         "Rules: starter_code must be valid Java with class Main and main method."
     )
+    return system_prompt, user_prompt
+
+
+def generate_practice_tasks_from_topic(topic: str, count: int = 3, allow_ai: bool = True) -> tuple[list[dict], str]:
+    clean_topic = (topic or "").strip()
+    safe_count = max(1, min(5, int(count)))
+    preset = _tasks_without_ai(clean_topic, safe_count, allow_ai)
+    if preset:
+        return preset
+    with timed("practice-tasks"):
+        payload = chatgpt_json(*_practice_prompts(clean_topic, safe_count), temperature=0.4)
+    return _practice_tasks(payload, safe_count)
+
+
+async def agenerate_practice_tasks_from_topic(topic: str, count: int = 3, allow_ai: bool = True) -> tuple[list[dict], str]:
+    clean_topic = (topic or "").strip()
+    safe_count = max(1, min(5, int(count)))
+    preset = _tasks_without_ai(clean_topic, safe_count, allow_ai)
+    if preset:
+        return preset
+    with timed("practice-tasks"):
+        payload = await achatgpt_json(*_practice_prompts(clean_topic, safe_count), temperature=0.4)
+    return _practice_tasks(payload, safe_count)
+
 
-    payload = chatgpt_json(system_prompt, user_prompt, temperature=0.4)
+def _practice_tasks(payload: dict | None, safe_count: int) -> tuple[list[dict], str]:
     if not payload or not isinstance(payload.get("tasks"), list):
+        record_fallback("practice_tasks", None if payload is None else "invalid_output")
         return DEFAULT_TASKS[:safe_count], "default"
 
     tasks = _validate_tasks(payload["tasks"])
     if len(tasks) < 1:
+        record_fallback("practice_tasks", "invalid_output")
         return DEFAULT_TASKS[:safe_count], "default"
 
     return _merge_with_defaults(tasks, safe_count), "ai"
@@ -0,0 +1,209 @@
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from flask import g, request
+
+
+SETTINGS_FILE = "settings.json"
+_FILE_NAME = re.compile(r"^[A-Za-z0-9_.-]+\.(prof|tracemalloc|txt)$")
+
+# Hot-path state: a request pays one float comparison while no session is active.
+_active_until = 0.0
+_settings: dict = {}
+_next_poll = 0.0
+_profile_lock = threading.Lock()
+# .prof files in the directory, counted when settings are (re)loaded and bumped per capture.
+_profile_count = 0
+
+
+def profile_dir() -> Path:
+    # Read on use: this module is imported before create_app() loads .env.
+    return Path(os.getenv("PROFILE_DIR") or Path(__file__).resolve().parents[2] / "profiles")
+
+
+def _default_settings() -> dict:
+    return {
+        "active": False,
+        "sample_rate": 0.0,
+        "routes": [],
+        "tracemalloc": False,
+        "max_profiles": 50,
+        "expires_at": 0.0,
+    }
+
+
+def _settings_path() -> Path:
+    return profile_dir() / SETTINGS_FILE
+
+
+def load_settings() -> dict:
+    try:
+        data = json.loads(_settings_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return _default_settings()
+    settings = _default_settings()
+    settings.update(data)
+    return settings
+
+
+def _count_profiles() -> int:
+    try:
+        return sum(1 for path in profile_dir().iterdir() if path.suffix == ".prof")
+    except OSError:
+        return 0
+
+
+def _apply(settings: dict) -> None:
+    global _active_until, _settings, _profile_count
+    _settings = settings
+    _active_until = settings["expires_at"] if settings["active"] else 0.0
+    if settings["active"]:
+        _profile_count = _count_profiles()
+    if settings["active"] and settings["tracemalloc"] and not tracemalloc.is_tracing():
+        tracemalloc.start(int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10")))
+    elif not (settings["active"] and settings["tracemalloc"]) and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def save_settings(settings: dict) -> dict:
+    profile_dir().mkdir(parents=True, exist_ok=True)
+    tmp = _settings_path().with_suffix(".tmp")
+    tmp.write_text(json.dumps(settings), encoding="utf-8")
+    os.replace(tmp, _settings_path())
+    _apply(settings)
+    return settings
+
+
+def configure(sample_rate: float, routes: list[str], duration_seconds: int, use_tracemalloc: bool, max_profiles: int) -> dict:
+    return save_settings(
+        {
+            "active": True,
+            "sample_rate": max(0.0, min(1.0, sample_rate)),
+            "routes": routes,
+            "tracemalloc": use_tracemalloc,
+            "max_profiles": max(1, max_profiles),
+            "expires_at": time.time() + max(10, duration_seconds),
+        }
+    )
+
+
+def disable() -> dict:
+    return save_settings(_default_settings())
+
+
+def refresh_settings() -> None:
+    """Pick up sessions started from another worker; polled at most every few seconds."""
+    global _next_poll
+    now = time.monotonic()
+    if now < _next_poll:
+        return
+    _next_poll = now + float(os.getenv("PROFILE_SETTINGS_POLL_SECONDS", "5"))
+    _apply(load_settings())
+
+
+def should_profile(route: str) -> bool:
+    if _active_until < time.time():
+        return False
+    routes = _settings.get("routes") or []
+    if routes and route not in routes:
+        return False
+    if random.random() >= _settings.get("sample_rate", 0.0):
+        return False
+    return _profile_count < _settings.get("max_profiles", 50)
+
+
+def start_profile() -> cProfile.Profile | None:
+    # cProfile hooks are process-wide on newer interpreters, so profile one request at a time.
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profile
+
+
+def finish_profile(profile: cProfile.Profile, route: str, method: str, elapsed: float) -> str:
+    global _profile_count
+    try:
+        profile.disable()
+    finally:
+        _profile_lock.release()
+    profile_dir().mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    name = f"{stamp}_{os.getpid()}_{method}_{slug}_{int(elapsed * 1000)}ms.prof"
+    profile.dump_stats(str(profile_dir() / name))
+    _profile_count += 1
+    return name
+
+
+def capture_tracemalloc_snapshot(limit: int = 25) -> dict:
+    if not tracemalloc.is_tracing():
+        return {"error": "tracemalloc is not active on this worker"}
+    profile_dir().mkdir(parents=True, exist_ok=True)
+    snapshot = tracemalloc.take_snapshot()
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    base = f"{stamp}_{os.getpid()}_snapshot"
+    snapshot.dump(str(profile_dir() / f"{base}.tracemalloc"))
+    top = snapshot.statistics("lineno")[:limit]
+    lines = [str(stat) for stat in top]
+    (profile_dir() / f"{base}.txt").write_text("\n".join(lines), encoding="utf-8")
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "files": [f"{base}.tracemalloc", f"{base}.txt"],
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "top": lines,
+    }
+
+
+def list_results() -> list[dict]:
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    rows = []
+    for path in sorted(directory.iterdir(), reverse=True):
+        if path.name == SETTINGS_FILE or not _FILE_NAME.match(path.name):
+            continue
+        rows.append({"name": path.name, "bytes": path.stat().st_size})
+    return rows
+
+
+def result_path(name: str) -> Path | None:
+    if not _FILE_NAME.match(name or ""):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
+
+
+def profiling_available() -> bool:
+    return os.getenv("PROFILING_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def register_profiler(app) -> None:
+    @app.before_request
+    def _maybe_start_profile():
+        refresh_settings()
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        if should_profile(route):
+            g.profile = start_profile()
+            g.profile_started_at = time.perf_counter()
+
+    @app.teardown_request
+    def _maybe_finish_profile(_exc):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        finish_profile(profile, route, request.method, time.perf_counter() - g.profile_started_at)
@@ -0,0 +1,263 @@
+"""Circuit breakers, retry budget and adaptive timeouts for upstream AI providers.
+
+Each provider and each provider/model pair has a breaker. After
+`PROVIDER_BREAKER_FAILURES` consecutive timeouts, connection errors, 429s or
+5xx it opens and calls fail immediately with `CircuitOpenError`, so callers
+serve their fallbacks without waiting. After `PROVIDER_BREAKER_RESET_SECONDS`
+one probe call is let through (half-open): success closes the breaker, failure
+re-opens it.
+
+Only 429/5xx responses are retried, with full jitter, and only while the
+worker-wide retry budget has room. Timeouts shrink towards a multiple of the
+observed p95 latency once enough successful calls have been seen. State is
+per worker, like the rest of the provider telemetry.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from app.services import deadlines, metrics
+from app.services.provider_telemetry import latency_samples, percentile
+
+
+metrics.describe("provider_circuit_transitions_total", "counter", "Circuit breaker state changes per provider/model.")
+metrics.describe("provider_circuit_rejections_total", "counter", "Calls failed fast by an open circuit breaker.")
+metrics.describe("provider_retries_total", "counter", "Retryable upstream failures by whether they were retried.")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, breaker: str):
+        super().__init__(f"circuit open for {breaker}")
+        self.breaker = breaker
+
+
+def _int_env(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _float_env(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        metrics.inc_counter("provider_circuit_transitions_total", {"breaker": self.name, "state": state})
+
+    def allow(self) -> bool:
+        reset_seconds = _float_env("PROVIDER_BREAKER_RESET_SECONDS", 30)
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self.opened_at >= reset_seconds:
+                self._transition(HALF_OPEN)
+                self.probe_started = now
+                return True
+            # A probe that never reported back (e.g. rejected by another breaker) must not wedge us.
+            if self.state == HALF_OPEN and now - self.probe_started >= reset_seconds:
+                self.probe_started = now
+                return True
+            return False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= _int_env("PROVIDER_BREAKER_FAILURES", 5)
+            ):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def _breaker_names(provider: str, model: str) -> list[str]:
+    return [f"{provider}:{model}", provider]
+
+
+def check_circuit(provider: str, model: str) -> None:
+    """Raise CircuitOpenError unless both the model and the provider breaker admit a call."""
+    for name in _breaker_names(provider, model):
+        if not _breaker(name).allow():
+            metrics.inc_counter("provider_circuit_rejections_total", {"breaker": name})
+            raise CircuitOpenError(name)
+
+
+def is_open(provider: str, model: str) -> bool:
+    """True while either breaker would reject a call (ignores a due half-open probe)."""
+    reset_seconds = _float_env("PROVIDER_BREAKER_RESET_SECONDS", 30)
+    with _breakers_lock:
+        breakers = [_breakers.get(name) for name in _breaker_names(provider, model)]
+    return any(b is not None and b.state == OPEN and time.monotonic() - b.opened_at < reset_seconds for b in breakers)
+
+
+def is_breaker_failure(outcome: str, status: int | None) -> bool:
+    # 4xx other than 429 says something about our request, not provider health.
+    return outcome in {"timeout", "connection_error"} or status in RETRYABLE_STATUSES or (status or 0) >= 500
+
+
+def record_result(provider: str, model: str, outcome: str, status: int | None) -> None:
+    if outcome == "ok":
+        success = True
+    elif is_breaker_failure(outcome, status):
+        success = False
+    else:
+        return
+    for name in _breaker_names(provider, model):
+        _breaker(name).record(success)
+
+
+def breaker_states() -> dict[str, dict]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in sorted(breakers, key=lambda b: b.name)}
+
+
+class RetryBudget:
+    """Retries allowed per window: a floor plus a fraction of first attempts."""
+
+    def __init__(self, window_seconds: float = 10.0):
+        self.window = window_seconds
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        for items in (self._requests, self._retries):
+            while items and now - items[0] > self.window:
+                items.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        ratio = _float_env("UPSTREAM_RETRY_BUDGET_RATIO", 0.1)
+        floor = _float_env("UPSTREAM_RETRY_MIN_PER_SECOND", 0.5) * self.window
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= floor + ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+retry_budget = RetryBudget()
+
+
+def _status(exc: Exception) -> int | None:
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying, or None if this failure is not retried."""
+    if _status(exc) not in RETRYABLE_STATUSES or attempt >= _int_env("UPSTREAM_MAX_RETRIES", 2):
+        return None
+    cap = _float_env("UPSTREAM_RETRY_MAX_DELAY_SECONDS", 4)
+    if not retry_budget.try_spend():
+        return None
+    retry_after = getattr(exc.response, "headers", {}).get("Retry-After", "")
+    if retry_after.isdigit() and int(retry_after) <= cap:
+        delay = float(retry_after)
+    else:
+        delay = random.uniform(0, min(cap, _float_env("UPSTREAM_RETRY_BASE_SECONDS", 0.25) * 2**attempt))
+    # No point sleeping into a request deadline the retry could not finish within.
+    return delay if delay + deadlines.MIN_CALL_SECONDS < deadlines.remaining() else None
+
+
+def _count_retry(provider: str, operation: str, delay: float | None, exc: Exception) -> None:
+    if _status(exc) in RETRYABLE_STATUSES:
+        result = "retried" if delay is not None else "not_retried"
+        metrics.inc_counter("provider_retries_total", {"provider": provider, "operation": operation, "result": result})
+
+
+def call_with_retries(send, provider: str, operation: str):
+    retry_budget.record_request()
+    attempt = 0
+    while True:
+        try:
+            return send()
+        except Exception as exc:
+            delay = _retry_delay(exc, attempt)
+            _count_retry(provider, operation, delay, exc)
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
+
+
+async def acall_with_retries(send, provider: str, operation: str):
+    retry_budget.record_request()
+    attempt = 0
+    while True:
+        try:
+            return await send()
+        except Exception as exc:
+            delay = _retry_delay(exc, attempt)
+            _count_retry(provider, operation, delay, exc)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _probing(provider: str, model: str) -> bool:
+    with _breakers_lock:
+        breakers = [_breakers.get(name) for name in _breaker_names(provider, model)]
+    return any(b is not None and b.state == HALF_OPEN for b in breakers)
+
+
+def adaptive_timeout(provider: str, operation: str, model: str, configured: float) -> float:
+    """`configured`, tightened to a multiple of the observed p95 once there are enough samples.
+
+    Timed-out calls are samples at the timeout they were given, so a run of
+    timeouts pushes the p95 (and the next timeout) back up towards `configured`.
+    A half-open probe always gets `configured`: it decides whether the breaker
+    closes, and failing it on a timeout learned while the provider was healthy
+    would keep the breaker open.
+    """
+    if _probing(provider, model):
+        return configured
+    samples = latency_samples(provider, operation, model)
+    if len(samples) < _int_env("UPSTREAM_TIMEOUT_MIN_SAMPLES", 20):
+        return configured
+    p95 = percentile(samples, 0.95)
+    floor = _float_env("UPSTREAM_TIMEOUT_FLOOR_SECONDS", 3)
+    return round(min(configured, max(floor, p95 * _float_env("UPSTREAM_TIMEOUT_P95_MULTIPLIER", 2.5))), 2)
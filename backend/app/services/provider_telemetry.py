@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from app.services import metrics
+
+
+metrics.describe("provider_requests_total", "counter", "Upstream AI provider calls by outcome and HTTP status.")
+metrics.describe("provider_request_duration_seconds", "histogram", "Upstream AI provider call latency.")
+metrics.describe("provider_tokens_total", "counter", "Tokens reported in provider usage fields.")
+metrics.describe("provider_response_bytes_total", "counter", "Response bytes received from providers.")
+metrics.describe("provider_image_model_selected_total", "counter", "Image model that produced the served image.")
+metrics.describe("provider_fallbacks_total", "counter", "Fallback content served instead of provider output.")
+metrics.describe("provider_coalesced_total", "counter", "Callers served by an identical in-flight provider call.")
+
+_lock = threading.Lock()
+_calls: deque = deque(maxlen=max(50, int(os.getenv("PROVIDER_REPORT_WINDOW", "500"))))
+_fallbacks: deque = deque(maxlen=max(50, int(os.getenv("PROVIDER_REPORT_WINDOW", "500"))))
+_coalesced: deque = deque(maxlen=max(50, int(os.getenv("PROVIDER_REPORT_WINDOW", "500"))))
+_last_failure: ContextVar[str | None] = ContextVar("provider_last_failure", default=None)
+
+
+def set_failure_reason(reason: str | None) -> None:
+    _last_failure.set(reason)
+
+
+def last_failure_reason() -> str:
+    return _last_failure.get() or "unknown"
+
+
+def usage_tokens(payload: dict | None) -> dict[str, int]:
+    usage = (payload or {}).get("usage") or {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+    completion = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+    total = usage.get("total_tokens") or (prompt + completion)
+    return {"prompt": int(prompt), "completion": int(completion), "total": int(total)}
+
+
+def record_provider_call(
+    provider: str,
+    operation: str,
+    model: str,
+    duration: float,
+    outcome: str,
+    status: int | None = None,
+    tokens: dict[str, int] | None = None,
+    response_bytes: int = 0,
+) -> None:
+    tokens = tokens or {"prompt": 0, "completion": 0, "total": 0}
+    labels = {"provider": provider, "operation": operation, "model": model}
+    metrics.observe("provider_request_duration_seconds", labels, duration)
+    metrics.inc_counter("provider_requests_total", dict(labels, outcome=outcome, status=str(status or "none")))
+    if tokens["prompt"]:
+        metrics.inc_counter("provider_tokens_total", {"provider": provider, "model": model, "kind": "prompt"}, tokens["prompt"])
+    if tokens["completion"]:
+        metrics.inc_counter("provider_tokens_total", {"provider": provider, "model": model, "kind": "completion"}, tokens["completion"])
+    if response_bytes:
+        metrics.inc_counter("provider_response_bytes_total", {"provider": provider, "operation": operation}, response_bytes)
+    with _lock:
+        _calls.append(
+            {
+                "at": time.time(),
+                "provider": provider,
+                "operation": operation,
+                "model": model,
+                "duration": duration,
+                "outcome": outcome,
+                "status": status,
+                "tokens": tokens["total"],
+                "bytes": response_bytes,
+            }
+        )
+
+
+def call_stats(provider: str, operation: str, model: str) -> dict:
+    """Calls, successes, successful-call durations and timed-out-call durations for one model in the rolling window."""
+    with _lock:
+        items = [c for c in _calls if c["model"] == model and c["operation"] == operation and c["provider"] == provider]
+    durations = [c["duration"] for c in items if c["outcome"] == "ok"]
+    timed_out = [c["duration"] for c in items if c["outcome"] == "timeout"]
+    return {"calls": len(items), "ok": len(durations), "durations": durations, "timed_out": timed_out}
+
+
+def latency_samples(provider: str, operation: str, model: str) -> list[float]:
+    """Durations of successful and timed-out calls in the rolling window.
+
+    A timeout counts at the time it was cut off (the timeout it was given): the
+    real latency was at least that, and leaving it out would let a tightened
+    timeout hide the very calls that say it is too tight.
+    """
+    stats = call_stats(provider, operation, model)
+    return stats["durations"] + stats["timed_out"]
+
+
+def record_image_model_selected(model: str) -> None:
+    metrics.inc_counter("provider_image_model_selected_total", {"model": model})
+
+
+def record_fallback(kind: str, reason: str | None = None) -> None:
+    reason = reason or last_failure_reason()
+    metrics.inc_counter("provider_fallbacks_total", {"kind": kind, "reason": reason})
+    with _lock:
+        _fallbacks.append({"at": time.time(), "kind": kind, "reason": reason})
+
+
+def record_coalesced(provider: str, operation: str, model: str, scope: str) -> None:
+    """Count a caller that shared another caller's call; scope is "process" or "worker"."""
+    metrics.inc_counter("provider_coalesced_total", {"provider": provider, "operation": operation, "scope": scope})
+    with _lock:
+        _coalesced.append({"at": time.time(), "provider": provider, "operation": operation, "model": model, "scope": scope})
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def provider_report() -> dict:
+    """Summarize the rolling window of provider calls and fallbacks seen by this worker."""
+    with _lock:
+        calls = list(_calls)
+        fallbacks = list(_fallbacks)
+        coalesced = list(_coalesced)
+
+    groups: dict[tuple, list[dict]] = {}
+    for call in calls:
+        groups.setdefault((call["provider"], call["operation"], call["model"]), []).append(call)
+
+    rows = []
+    for (provider, operation, model), items in sorted(groups.items()):
+        durations = [c["duration"] for c in items]
+        outcomes: dict[str, int] = {}
+        statuses: dict[str, int] = {}
+        for c in items:
+            outcomes[c["outcome"]] = outcomes.get(c["outcome"], 0) + 1
+            statuses[str(c["status"] or "none")] = statuses.get(str(c["status"] or "none"), 0) + 1
+        rows.append(
+            {
+                "provider": provider,
+                "operation": operation,
+                "model": model,
+                "calls": len(items),
+                "success_rate": round(outcomes.get("ok", 0) / len(items), 3),
+                "timeouts": outcomes.get("timeout", 0),
+                "outcomes": outcomes,
+                "statuses": statuses,
+                "latency_ms": {
+                    "avg": round(sum(durations) / len(durations) * 1000, 1),
+                    "p50": round(percentile(durations, 0.5) * 1000, 1),
+                    "p95": round(percentile(durations, 0.95) * 1000, 1),
+                },
+                "tokens": sum(c["tokens"] for c in items),
+                "response_bytes": sum(c["bytes"] for c in items),
+            }
+        )
+
+    fallback_counts: dict[str, dict[str, int]] = {}
+    for item in fallbacks:
+        per_kind = fallback_counts.setdefault(item["kind"], {})
+        per_kind[item["reason"]] = per_kind.get(item["reason"], 0) + 1
+
+    coalescing: dict[str, dict] = {}
+    for item in coalesced:
+        entry = coalescing.setdefault(item["operation"], {"waiters": 0, "process": 0, "worker": 0})
+        entry["waiters"] += 1
+        entry[item["scope"]] += 1
+    for operation, entry in coalescing.items():
+        upstream = sum(1 for c in calls if c["operation"] == operation)
+        entry["upstream_calls"] = upstream
+        entry["dedup_ratio"] = round(entry["waiters"] / (entry["waiters"] + upstream), 3)
+
+    return {
+        "worker_pid": os.getpid(),
+        "window": {"calls": len(calls), "fallbacks": len(fallbacks), "coalesced": len(coalesced)},
+        "providers": rows,
+        "fallbacks": fallback_counts,
+        "coalescing": coalescing,
+    }
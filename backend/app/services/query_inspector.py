@@ -0,0 +1,125 @@
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.services.request_timing import add_time
+
+
+query_logger = logging.getLogger("app.queries")
+
+_installed = False
+# A ContextVar rather than a thread-local: asyncio.to_thread copies the context, so
+# statements an async view runs on a worker thread still land in the caller's capture.
+_captures: ContextVar[tuple[list[str], ...]] = ContextVar("query_captures", default=())
+
+
+def diagnostics_enabled() -> bool:
+    default = "0" if os.getenv("APP_ENV", "development").strip().lower() == "production" else "1"
+    return os.getenv("QUERY_DIAGNOSTICS", default).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _explain(conn, statement: str, parameters) -> list[str]:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # Use a raw DB-API cursor so the EXPLAIN itself is not counted or re-inspected.
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters or ())
+        return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc}"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+    add_time("db", elapsed)
+
+    for capture in _captures.get():
+        capture.append(statement)
+
+    if has_request_context():
+        statements = g.get("query_statements")
+        if statements is None:
+            statements = g.query_statements = Counter()
+        statements[statement] += 1
+
+    slow_ms = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    if elapsed * 1000 >= slow_ms and diagnostics_enabled():
+        plan = _explain(conn, statement, parameters) if statement.lstrip().upper().startswith("SELECT") and not executemany else []
+        query_logger.warning(
+            "slow query %.1fms route=%s sql=%s plan=%s",
+            elapsed * 1000,
+            request.url_rule.rule if has_request_context() and request.url_rule is not None else None,
+            " ".join(statement.split()),
+            " | ".join(plan),
+        )
+
+
+def install_query_listeners() -> None:
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+
+def request_query_count() -> int:
+    if not has_request_context():
+        return 0
+    return sum((g.get("query_statements") or Counter()).values())
+
+
+def repeated_statements(threshold: int | None = None) -> list[tuple[str, int]]:
+    """Statements issued at least `threshold` times in this request with only parameters changing."""
+    if not has_request_context():
+        return []
+    threshold = threshold or int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+    statements = g.get("query_statements") or Counter()
+    return [(stmt, count) for stmt, count in statements.most_common() if count >= threshold]
+
+
+def report_request_queries(route: str) -> None:
+    if not diagnostics_enabled():
+        return
+    for statement, count in repeated_statements():
+        query_logger.warning(
+            "possible N+1 route=%s repeats=%d sql=%s",
+            route,
+            count,
+            " ".join(statement.split()),
+        )
+
+
+@contextmanager
+def capture_queries():
+    """Collect every statement executed by this context (and threads it hands work to) inside the block."""
+    statements: list[str] = []
+    token = _captures.set(_captures.get() + (statements,))
+    try:
+        yield statements
+    finally:
+        _captures.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail when the block runs more than `limit` SQL statements (query budget for tests)."""
+    with capture_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        listing = "\n".join(f"  {idx + 1}. {' '.join(s.split())}" for idx, s in enumerate(statements))
+        raise AssertionError(f"expected at most {limit} queries, got {len(statements)}:\n{listing}")
@@ -0,0 +1,290 @@
+"""Token-bucket rate limits for upstream providers, shared by all workers.
+
+Limits come from `UPSTREAM_RATE_LIMITS`, e.g.
+
+    openai=3000rpm/1000000tpm,openai:gpt-4o-mini=500rpm/200000tpm,elevenlabs=120rpm
+
+A call takes one request and its estimated tokens from every bucket that
+matches (provider and provider:model); the estimate is corrected with the
+reported usage afterwards. Bucket state lives in small flock-guarded files so
+gunicorn workers draw from the same budget.
+
+Priority classes hold back part of each bucket for the classes above them:
+background work only draws while the bucket is at least half full, so
+interactive answers keep flowing under load. Within a worker, callers for the
+same buckets wait in one queue ordered by class, then arrival; only the head
+of the queue draws from the buckets. Interactive and suggestion calls give up
+(and serve fallback content) past their max wait; downloads and background
+work stay queued until the request deadline, if there is one.
+
+The bucket files are flock'd from the calling thread, so async callers do
+their bucket reads and writes in a worker thread rather than on the event loop.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from app.services import deadlines, metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
+
+
+metrics.describe("provider_rate_limit_wait_seconds", "histogram", "Time upstream calls waited for rate-limit tokens.")
+metrics.describe("provider_rate_limited_total", "counter", "Upstream calls given up after waiting too long for tokens.")
+
+# class -> (share of each bucket held back for higher classes, max seconds to wait or None for the deadline),
+# highest class first.
+PRIORITIES = {
+    "interactive": (0.0, 5.0),
+    "suggestions": (0.1, 15.0),
+    "downloads": (0.25, None),
+    "background": (0.5, None),
+}
+
+_priority: ContextVar[str] = ContextVar("upstream_priority", default="interactive")
+_parsed: tuple[str, dict] = ("", {})
+_local_state: dict[str, dict] = {}
+_local_lock = threading.Lock()
+# bucket keys -> heap of (class rank, arrival, wake callback) for this worker's waiting callers
+_queues: dict[tuple[str, ...], list] = {}
+_queues_lock = threading.Lock()
+_arrivals = itertools.count()
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+@contextmanager
+def priority(name: str):
+    """Run the enclosed upstream calls in priority class `name`."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def _limits() -> dict[str, dict[str, float]]:
+    global _parsed
+    raw = os.getenv("UPSTREAM_RATE_LIMITS", "").strip()
+    if raw != _parsed[0]:
+        limits: dict[str, dict[str, float]] = {}
+        for entry in filter(None, (part.strip() for part in raw.split(","))):
+            key, _, spec = entry.partition("=")
+            for amount, unit in re.findall(r"(\d+(?:\.\d+)?)\s*(rpm|tpm)", spec):
+                limits.setdefault(key.strip(), {})["requests" if unit == "rpm" else "tokens"] = float(amount)
+        _parsed = (raw, limits)
+    return _parsed[1]
+
+
+def _buckets(provider: str, model: str) -> list[tuple[str, dict[str, float]]]:
+    limits = _limits()
+    return [(key, limits[key]) for key in (f"{provider}:{model}", provider) if key in limits]
+
+
+def _state_dir() -> Path:
+    path = Path(os.getenv("UPSTREAM_RATE_DIR", Path(tempfile.gettempdir()) / "adaptive_rate_limits"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+@contextmanager
+def _locked_states(keys: list[str]):
+    """Yield {key: state} with every bucket locked; state changes are written back on exit."""
+    if fcntl is None:
+        with _local_lock:
+            yield {key: _local_state.setdefault(key, {}) for key in keys}
+        return
+
+    with ExitStack() as stack:
+        handles, states = {}, {}
+        # Fixed order (model bucket, then provider bucket) so two workers never deadlock.
+        for key in keys:
+            handle = stack.enter_context(open(_state_dir() / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.json", "a+"))
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            stack.callback(fcntl.flock, handle, fcntl.LOCK_UN)
+            handle.seek(0)
+            try:
+                states[key] = json.loads(handle.read() or "{}")
+            except ValueError:
+                states[key] = {}
+            handles[key] = handle
+        yield states
+        for key, handle in handles.items():
+            handle.seek(0)
+            handle.truncate()
+            handle.write(json.dumps(states[key]))
+            handle.flush()
+
+
+def _capacity(per_minute: float) -> float:
+    return per_minute / 60 * float(os.getenv("UPSTREAM_RATE_BURST_SECONDS", "60"))
+
+
+def _refill(state: dict, limit: dict[str, float], now: float) -> None:
+    elapsed = max(0.0, now - state.get("at", now))
+    for dim, per_minute in limit.items():
+        state[dim] = min(_capacity(per_minute), state.get(dim, _capacity(per_minute)) + elapsed * per_minute / 60)
+    state["at"] = now
+
+
+def _try_take(buckets, tokens: int, reserve: float) -> float:
+    """Take from every bucket or from none; return 0, or the seconds until this class could take."""
+    cost = {"requests": 1.0, "tokens": float(tokens)}
+    with _locked_states([key for key, _ in buckets]) as states:
+        now = time.time()
+        wait = 0.0
+        for key, limit in buckets:
+            _refill(states[key], limit, now)
+            for dim, per_minute in limit.items():
+                capacity = _capacity(per_minute)
+                need = min(capacity, cost[dim] + reserve * capacity)
+                if states[key][dim] < need:
+                    wait = max(wait, (need - states[key][dim]) * 60 / per_minute)
+        if wait:
+            return wait
+        for key, limit in buckets:
+            for dim in limit:
+                states[key][dim] -= cost[dim]
+        return 0.0
+
+
+def _class() -> tuple[str, int, float, float]:
+    name = _priority.get()
+    if name not in PRIORITIES:
+        name = "interactive"
+    reserve, max_wait = PRIORITIES[name]
+    return name, list(PRIORITIES).index(name), reserve, float("inf") if max_wait is None else max_wait
+
+
+def _enqueue(keys: tuple[str, ...], rank: int, wake) -> tuple:
+    entry = (rank, next(_arrivals), wake)
+    with _queues_lock:
+        queue = _queues.setdefault(keys, [])
+        heapq.heappush(queue, entry)
+        head = queue[0]
+    head[2]()
+    return entry
+
+
+def _is_head(keys: tuple[str, ...], entry: tuple) -> bool:
+    with _queues_lock:
+        return _queues[keys][0] is entry
+
+
+def _leave(keys: tuple[str, ...], entry: tuple) -> None:
+    with _queues_lock:
+        queue = _queues[keys]
+        queue.remove(entry)
+        heapq.heapify(queue)
+        head = queue[0] if queue else None
+        if not queue:
+            del _queues[keys]
+    if head is not None:
+        head[2]()
+
+
+def _pause(buckets, started: float, wait: float | None) -> float:
+    """0 once the tokens are taken, else how long to wait before looking again.
+
+    `wait` is _try_take's answer for the head of the queue and None for the callers behind it.
+    """
+    name, _rank, _reserve, max_wait = _class()
+    waited = time.monotonic() - started
+    if wait == 0:
+        metrics.observe("provider_rate_limit_wait_seconds", {"priority": name}, waited)
+        return 0.0
+    left = min(max_wait - waited, deadlines.remaining())
+    if left <= 0 or (wait or 0) > left:
+        metrics.inc_counter("provider_rate_limited_total", {"bucket": buckets[0][0], "priority": name})
+        raise RateLimitedError(f"{buckets[0][0]} is over its rate limit for {name} calls")
+    # Re-check at least every second: other workers settle and refund in the meantime.
+    return min(wait or left, 1.0)
+
+
+def acquire(provider: str, model: str, tokens: int) -> None:
+    """Block until the call fits the provider/model buckets; raise RateLimitedError past the class's max wait."""
+    buckets = _buckets(provider, model)
+    if not buckets:
+        return
+    started = time.monotonic()
+    keys = tuple(key for key, _ in buckets)
+    woken = threading.Event()
+    entry = _enqueue(keys, _class()[1], woken.set)
+    try:
+        while True:
+            wait = _try_take(buckets, tokens, _class()[2]) if _is_head(keys, entry) else None
+            pause = _pause(buckets, started, wait)
+            if not pause:
+                return
+            woken.wait(pause)
+            woken.clear()
+    finally:
+        _leave(keys, entry)
+
+
+async def aacquire(provider: str, model: str, tokens: int) -> None:
+    buckets = _buckets(provider, model)
+    if not buckets:
+        return
+    started = time.monotonic()
+    keys = tuple(key for key, _ in buckets)
+    loop = asyncio.get_running_loop()
+    woken = asyncio.Event()
+
+    def wake():
+        try:
+            loop.call_soon_threadsafe(woken.set)
+        except RuntimeError:
+            pass  # the loop has closed
+
+    entry = _enqueue(keys, _class()[1], wake)
+    try:
+        while True:
+            wait = None
+            if _is_head(keys, entry):
+                wait = await asyncio.to_thread(_try_take, buckets, tokens, _class()[2])
+            pause = _pause(buckets, started, wait)
+            if not pause:
+                return
+            try:
+                await asyncio.wait_for(woken.wait(), pause)
+            except asyncio.TimeoutError:
+                pass
+            woken.clear()
+    finally:
+        _leave(keys, entry)
+
+
+def settle(provider: str, model: str, estimated: int, actual: int) -> None:
+    """Correct the token buckets once the provider reports real usage."""
+    buckets = [(key, limit) for key, limit in _buckets(provider, model) if "tokens" in limit]
+    if not buckets or not actual or actual == estimated:
+        return
+    with _locked_states([key for key, _ in buckets]) as states:
+        now = time.time()
+        for key, limit in buckets:
+            _refill(states[key], limit, now)
+            states[key]["tokens"] -= actual - estimated
+
+
+async def asettle(provider: str, model: str, estimated: int, actual: int) -> None:
+    if _buckets(provider, model):
+        await asyncio.to_thread(settle, provider, model, estimated, actual)
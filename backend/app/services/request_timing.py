@@ -0,0 +1,76 @@
+import re
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+
+_TOKEN_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def start_request_timing() -> None:
+    g.request_times = {}
+    g.request_spans = {}
+
+
+def add_time(category: str, seconds: float) -> None:
+    """Attribute time spent in `category` (db, upstream, file, subprocess) to the current request."""
+    if not has_request_context():
+        return
+    times = g.get("request_times")
+    if times is None:
+        times = g.request_times = {}
+    entry = times.setdefault(category, [0.0, 0])
+    entry[0] += seconds
+    entry[1] += 1
+
+
+def record_span(name: str, seconds: float) -> None:
+    if not has_request_context():
+        return
+    spans = g.get("request_spans")
+    if spans is None:
+        spans = g.request_spans = {}
+    entry = spans.setdefault(name, [0.0, 0])
+    entry[0] += seconds
+    entry[1] += 1
+
+
+@contextmanager
+def timed(name: str, category: str | None = None):
+    """Time a named pipeline step and optionally roll it into a category total."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record_span(name, elapsed)
+        if category:
+            add_time(category, elapsed)
+
+
+def request_times() -> dict[str, float]:
+    if not has_request_context():
+        return {}
+    return {category: entry[0] for category, entry in (g.get("request_times") or {}).items()}
+
+
+def request_timing_breakdown(total_seconds: float) -> list[dict]:
+    rows = [{"name": "total", "ms": round(total_seconds * 1000, 2), "count": 1}]
+    if not has_request_context():
+        return rows
+    for source in (g.get("request_times") or {}, g.get("request_spans") or {}):
+        for name, (seconds, count) in source.items():
+            rows.append({"name": name, "ms": round(seconds * 1000, 2), "count": count})
+    return rows
+
+
+def server_timing_header(breakdown: list[dict]) -> str:
+    entries = []
+    for row in breakdown:
+        token = _TOKEN_UNSAFE.sub("-", row["name"]).strip("-") or "step"
+        entry = f"{token};dur={row['ms']}"
+        if row["count"] > 1:
+            entry += f';desc="{row["count"]}x"'
+        entries.append(entry)
+    return ", ".join(entries)
@@ -0,0 +1,277 @@
+"""Admin bulk roster imports.
+
+Imports run as background jobs: the request validates the payload, records a
+`roster_import_jobs` row and returns. A thread then creates accounts in
+batches and finally re-hashes any passwords stored with the cheaper
+ROSTER_IMPORT_HASH_METHOD, so weak hashes do not outlive the job (students
+who log in first are upgraded at login). A worker restart cuts a job short;
+its row stops advancing and the admin can re-run the import, which skips the
+accounts already created.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import LearningStyle, RosterImportJob, User
+from app.services.password_hashing import hash_passwords, needs_rehash
+
+
+logger = logging.getLogger("app.roster_import")
+
+
+VALID_STYLES = {"visual", "auditory", "kinesthetic"}
+STYLE_SCORES = {
+    "visual": {"visual_score": 20, "auditory_score": 0, "kinesthetic_score": 0},
+    "auditory": {"visual_score": 0, "auditory_score": 20, "kinesthetic_score": 0},
+    "kinesthetic": {"visual_score": 0, "auditory_score": 0, "kinesthetic_score": 20},
+}
+
+
+class RosterError(ValueError):
+    pass
+
+
+def max_roster_rows() -> int:
+    return int(os.getenv("ROSTER_IMPORT_MAX_ROWS", "20000"))
+
+
+def parse_roster(raw: str, fmt: str) -> list[dict]:
+    """Accepts CSV with a header row (name,email,password[,learning_style]) or a JSON list."""
+    if fmt == "json":
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise RosterError("roster is not valid JSON") from exc
+        if isinstance(data, dict):
+            data = data.get("students")
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise RosterError("JSON roster must be a list of student objects")
+        rows = data
+    else:
+        reader = csv.DictReader(io.StringIO(raw))
+        headers = {(name or "").strip().lower() for name in reader.fieldnames or []}
+        if not {"name", "email", "password"} <= headers:
+            raise RosterError("CSV roster needs name, email and password columns")
+        rows = [{(k or "").strip().lower(): v for k, v in row.items()} for row in reader]
+
+    if len(rows) > max_roster_rows():
+        raise RosterError(f"roster exceeds {max_roster_rows()} rows")
+    return rows
+
+
+def _validate(row: dict) -> tuple[dict | None, str | None]:
+    name = str(row.get("name") or "").strip()
+    email = str(row.get("email") or "").strip().lower()
+    password = str(row.get("password") or "")
+    style = str(row.get("learning_style") or "").strip().lower() or None
+    if not name or not email or not password:
+        return None, "name, email, and password are required"
+    if len(password) < 6:
+        return None, "password must be at least 6 characters"
+    if style and style not in VALID_STYLES:
+        return None, "invalid learning style"
+    return {"name": name, "email": email, "password": password, "learning_style": style}, None
+
+
+def _batch_rows() -> int:
+    return max(1, int(os.getenv("ROSTER_IMPORT_BATCH_ROWS", "500")))
+
+
+def _summary(report: list[dict]) -> dict:
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    for entry in report:
+        if "status" in entry:
+            counts[entry["status"]] += 1
+    return dict(counts, total=len(report))
+
+
+def import_roster(rows: list[dict], on_progress=None) -> tuple[dict, list[tuple[int, str, str]]]:
+    """Create the roster's new accounts in batches of ROSTER_IMPORT_BATCH_ROWS.
+
+    Returns the per-row result and (user_id, password, stored_hash) for each
+    created account, so hashes made with ROSTER_IMPORT_HASH_METHOD can be
+    upgraded afterwards (`upgrade_hashes`). `on_progress(processed, summary)`
+    runs after every committed batch.
+    """
+    report = [{"row": idx + 1, "email": str(row.get("email") or "").strip().lower()} for idx, row in enumerate(rows)]
+    pending: list[tuple[int, dict]] = []
+    seen: set[str] = set()
+    for idx, row in enumerate(rows):
+        cleaned, error = _validate(row)
+        if error:
+            report[idx].update(status="invalid", error=error)
+        elif cleaned["email"] in seen:
+            report[idx].update(status="duplicate", error="email repeated in roster")
+        else:
+            seen.add(cleaned["email"])
+            pending.append((idx, cleaned))
+
+    bulk_method = os.getenv("ROSTER_IMPORT_HASH_METHOD", "").strip() or None
+    created: list[tuple[int, str, str]] = []
+    processed = len(rows) - len(pending)
+    for start in range(0, len(pending), _batch_rows()):
+        batch = pending[start:start + _batch_rows()]
+        # One round trip for every existing account in the batch.
+        emails = [cleaned["email"] for _idx, cleaned in batch]
+        existing = {email for (email,) in db.session.query(User.email).filter(User.email.in_(emails))}
+        new_rows = []
+        for idx, cleaned in batch:
+            if cleaned["email"] in existing:
+                report[idx].update(status="duplicate", error="email already exists")
+            else:
+                new_rows.append((idx, cleaned))
+
+        if new_rows:
+            hashes = hash_passwords([cleaned["password"] for _idx, cleaned in new_rows], method=bulk_method)
+            try:
+                user_ids = _insert_users(new_rows, hashes, datetime.utcnow())
+            except IntegrityError:
+                db.session.rollback()
+                # Someone registered one of these emails meanwhile; place the batch row by row.
+                user_ids = {}
+                for row, pw_hash in zip(new_rows, hashes):
+                    try:
+                        user_ids.update(_insert_users([row], [pw_hash], datetime.utcnow()))
+                    except IntegrityError:
+                        db.session.rollback()
+                        report[row[0]].update(status="duplicate", error="email already exists")
+
+            for (idx, cleaned), pw_hash in zip(new_rows, hashes):
+                if cleaned["email"] in user_ids:
+                    user_id = user_ids[cleaned["email"]]
+                    report[idx].update(status="created", user_id=user_id, learning_style=cleaned["learning_style"])
+                    created.append((user_id, cleaned["password"], pw_hash))
+
+        processed += len(batch)
+        if on_progress is not None:
+            on_progress(processed, _summary(report))
+
+    return {"summary": _summary(report), "rows": report}, created
+
+
+def upgrade_hashes(created: list[tuple[int, str, str]], on_progress=None) -> int:
+    """Re-hash bulk-method passwords with the regular method; returns how many rows changed.
+
+    Rows whose hash changed meanwhile (first login, password reset) are left alone.
+    """
+    stale = [entry for entry in created if needs_rehash(entry[2])]
+    upgraded = 0
+    for start in range(0, len(stale), _batch_rows()):
+        batch = stale[start:start + _batch_rows()]
+        hashes = hash_passwords([password for _user_id, password, _old in batch])
+        now = datetime.utcnow()
+        for (user_id, _password, old_hash), new_hash in zip(batch, hashes):
+            upgraded += (
+                db.session.query(User)
+                .filter(User.user_id == user_id, User.password_hash == old_hash)
+                .update({User.password_hash: new_hash, User.updated_at: now}, synchronize_session=False)
+            )
+        db.session.commit()
+        if on_progress is not None:
+            on_progress(min(start + len(batch), len(stale)), len(stale))
+    return upgraded
+
+
+def _job_dict(job: RosterImportJob, with_rows: bool = True) -> dict:
+    data = {
+        "job_id": job.job_id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "summary": json.loads(job.summary) if job.summary else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+        "status_url": f"/api/admin/users/import/{job.job_id}",
+    }
+    if with_rows and job.report:
+        data["rows"] = json.loads(job.report)
+    return data
+
+
+def start_import_job(rows: list[dict], created_by: int) -> dict:
+    """Queue a roster import on a background thread of this worker; progress lives in roster_import_jobs."""
+    now = datetime.utcnow()
+    job = RosterImportJob(
+        job_id=uuid.uuid4().hex, created_by=created_by, status="queued", total=len(rows), processed=0,
+        created_at=now, updated_at=now,
+    )
+    db.session.add(job)
+    db.session.commit()
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_job, args=(app, job.job_id, rows), name=f"roster-import-{job.job_id[:8]}", daemon=True).start()
+    return _job_dict(job)
+
+
+def job_status(job_id: str) -> dict | None:
+    job = db.session.get(RosterImportJob, job_id)
+    return _job_dict(job) if job else None
+
+
+def _update_job(job_id: str, **values) -> None:
+    values["updated_at"] = datetime.utcnow()
+    db.session.query(RosterImportJob).filter(RosterImportJob.job_id == job_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def _run_job(app, job_id: str, rows: list[dict]) -> None:
+    with app.app_context():
+        try:
+            _update_job(job_id, status="importing")
+            result, created = import_roster(
+                rows, lambda processed, summary: _update_job(job_id, processed=processed, summary=json.dumps(summary))
+            )
+            # Accounts are usable now; the report is final even if the upgrade below is cut short.
+            _update_job(
+                job_id,
+                status="upgrading_hashes",
+                processed=len(rows),
+                summary=json.dumps(result["summary"]),
+                report=json.dumps(result["rows"]),
+            )
+            upgrade_hashes(created)
+            _update_job(job_id, status="done")
+        except Exception as exc:  # the job row is the only place an admin will see this
+            logger.exception("roster import %s failed", job_id)
+            db.session.rollback()
+            _update_job(job_id, status="failed", error=f"{exc.__class__.__name__}: {exc}"[:255])
+        finally:
+            db.session.remove()
+
+
+def _insert_users(new_rows: list[tuple[int, dict]], hashes: list[str], now: datetime) -> dict[str, int]:
+    # insertmanyvalues batches these into multi-row INSERT ... RETURNING statements.
+    inserted = db.session.execute(
+        insert(User).returning(User.user_id, User.email),
+        [
+            {"name": cleaned["name"], "email": cleaned["email"], "password_hash": pw_hash, "created_at": now, "updated_at": now}
+            for (_idx, cleaned), pw_hash in zip(new_rows, hashes)
+        ],
+    ).all()
+    user_ids = {email: user_id for user_id, email in inserted}
+
+    styles = [
+        {
+            "user_id": user_ids[cleaned["email"]],
+            "learning_style": cleaned["learning_style"],
+            "created_at": now,
+            "updated_at": now,
+            **STYLE_SCORES[cleaned["learning_style"]],
+        }
+        for _idx, cleaned in new_rows
+        if cleaned["learning_style"]
+    ]
+    if styles:
+        db.session.execute(insert(LearningStyle), styles)
+    db.session.commit()
+    return user_ids
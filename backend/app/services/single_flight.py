@@ -0,0 +1,264 @@
+"""Single-flight deduplication for identical upstream calls.
+
+Concurrent callers with the same fingerprint share one call: inside a process
+they wait on the leader's future; across gunicorn workers the leader holds a
+per-fingerprint flock and leaves the response body in a result file that
+waiting workers read when the lock frees. Only successful results cross
+processes; if the leader fails, waiting workers make their own call.
+
+The leader deletes its lock file before releasing it. Waiters already holding
+the file keep working on the unlinked inode, and the next caller starts a new
+file, so the directory holds one lock per call in flight. Lock files left by
+crashed workers are pruned along with old results.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError as FutureCancelled, Future, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
+
+from app.config import is_truthy
+from app.services import deadlines
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
+
+
+T = TypeVar("T")
+
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_next_prune = 0.0
+
+RESULT_TTL_SECONDS = 60
+POLL_SECONDS = 0.05
+
+
+def enabled() -> bool:
+    return is_truthy(os.getenv("UPSTREAM_COALESCE"), default=True)
+
+
+def _across_workers() -> bool:
+    return fcntl is not None and is_truthy(os.getenv("UPSTREAM_COALESCE_ACROSS_WORKERS"), default=True)
+
+
+def _wait_seconds() -> float:
+    return min(float(os.getenv("UPSTREAM_COALESCE_WAIT_SECONDS", "25")), deadlines.remaining())
+
+
+def _coalesce_dir() -> Path:
+    path = Path(os.getenv("UPSTREAM_COALESCE_DIR", Path(tempfile.gettempdir()) / "adaptive_upstream_coalesce"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def fingerprint(*parts) -> str:
+    """Stable key for a request; pass everything that changes the answer (url, body), never secrets."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _join(key: str) -> tuple[Future, bool]:
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future, False
+        future = _inflight[key] = Future()
+        return future, True
+
+
+def _finish(key: str, future: Future, result=None, error: BaseException | None = None) -> None:
+    with _inflight_lock:
+        _inflight.pop(key, None)
+    if isinstance(error, asyncio.CancelledError):
+        # The leader's caller gave up; waiters make their own call instead of inheriting that.
+        future.cancel()
+    elif error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _try_lock(handle) -> bool:
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _shared_result(key: str, since: float) -> bytes | None:
+    path = _coalesce_dir() / f"{key}.result"
+    try:
+        if path.stat().st_mtime < since:
+            return None
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def _publish(key: str, body: bytes) -> None:
+    directory = _coalesce_dir()
+    tmp = directory / f"{key}.{os.getpid()}.tmp"
+    tmp.write_bytes(body)
+    os.replace(tmp, directory / f"{key}.result")
+    _prune(directory)
+
+
+def _prune(directory: Path) -> None:
+    global _next_prune
+    now = time.time()
+    if now < _next_prune:
+        return
+    _next_prune = now + RESULT_TTL_SECONDS
+    for stale in directory.glob("*.result"):
+        try:
+            if now - stale.stat().st_mtime > RESULT_TTL_SECONDS:
+                stale.unlink()
+        except OSError:
+            pass
+    for stale in directory.glob("*.lock"):
+        try:
+            if now - stale.stat().st_mtime <= RESULT_TTL_SECONDS:
+                continue
+            with open(stale, "a+") as handle:
+                # Only a lock nobody holds is abandoned.
+                if _try_lock(handle):
+                    _release(handle, stale)
+        except OSError:
+            pass
+
+
+def _release(handle, path: Path) -> None:
+    """Unlock a leader's lock file, deleting it first so finished keys leave nothing behind."""
+    try:
+        path.unlink()
+    except OSError:
+        pass
+    fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def run(
+    key: str,
+    call: Callable[[], T],
+    *,
+    encode: Callable[[T], bytes],
+    decode: Callable[[bytes], T],
+    on_shared: Callable[[str], None],
+) -> T:
+    """Return `call()`, or the result of an identical call already in flight.
+
+    `on_shared(scope)` fires for each caller served by someone else's call
+    (scope "process" or "worker").
+    """
+    if not enabled():
+        return call()
+
+    future, leader = _join(key)
+    if not leader:
+        try:
+            result = future.result(timeout=_wait_seconds())
+        except (FutureTimeout, FutureCancelled):
+            return call()
+        on_shared("process")
+        return result
+
+    try:
+        result = _run_leader(key, call, encode, decode, on_shared)
+    except BaseException as exc:
+        _finish(key, future, error=exc)
+        raise
+    _finish(key, future, result)
+    return result
+
+
+def _run_leader(key, call, encode, decode, on_shared):
+    if not _across_workers():
+        return call()
+    lock_path = _coalesce_dir() / f"{key}.lock"
+    with open(lock_path, "a+") as handle:
+        waiting_since = time.time()
+        if not _try_lock(handle):
+            deadline = time.monotonic() + _wait_seconds()
+            while time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+                if _try_lock(handle):
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                    shared = _shared_result(key, waiting_since)
+                    if shared is not None:
+                        on_shared("worker")
+                        return decode(shared)
+                    break
+            return call()
+        try:
+            result = call()
+            _publish(key, encode(result))
+            return result
+        finally:
+            _release(handle, lock_path)
+
+
+async def arun(
+    key: str,
+    call: Callable[[], Awaitable[T]],
+    *,
+    encode: Callable[[T], bytes],
+    decode: Callable[[bytes], T],
+    on_shared: Callable[[str], None],
+) -> T:
+    """`run` for coroutines; shares the same in-flight table, so sync and async callers coalesce too."""
+    if not enabled():
+        return await call()
+
+    future, leader = _join(key)
+    if not leader:
+        try:
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), _wait_seconds())
+        except asyncio.TimeoutError:
+            return await call()
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return await call()
+        on_shared("process")
+        return result
+
+    try:
+        result = await _arun_leader(key, call, encode, decode, on_shared)
+    except BaseException as exc:
+        _finish(key, future, error=exc)
+        raise
+    _finish(key, future, result)
+    return result
+
+
+async def _arun_leader(key, call, encode, decode, on_shared):
+    if not _across_workers():
+        return await call()
+    lock_path = _coalesce_dir() / f"{key}.lock"
+    with open(lock_path, "a+") as handle:
+        waiting_since = time.time()
+        if not _try_lock(handle):
+            deadline = time.monotonic() + _wait_seconds()
+            while time.monotonic() < deadline:
+                await asyncio.sleep(POLL_SECONDS)
+                if _try_lock(handle):
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                    shared = _shared_result(key, waiting_since)
+                    if shared is not None:
+                        on_shared("worker")
+                        return decode(shared)
+                    break
+            return await call()
+        try:
+            result = await call()
+            _publish(key, encode(result))
+            return result
+        finally:
+            _release(handle, lock_path)
@@ -1,5 +1,7 @@
 from collections import Counter
-from app.services.openai_service import chatgpt_json
+from app.services.openai_service import achatgpt_json
+from app.services.provider_telemetry import record_fallback
+from app.services.request_timing import timed
 
 
 QUESTIONS = [
@@ -246,8 +248,7 @@ def _validate_generated_questions(items: list[dict]) -> list[dict]:
     return validated
 
 
-def generate_interest_based_questions(interests: str, total_questions: int = 20) -> tuple[list[dict], str]:
-    clean_count = max(10, min(30, int(total_questions)))
+def _question_prompts(interests: str, clean_count: int) -> tuple[str, str]:
     interest_text = interests.strip()
     context = interest_text if interest_text else "general student profile"
 
@@ -270,16 +271,28 @@ def generate_interest_based_questions(interests: str, total_questions: int = 20)
         "}}\n"
         "Rules: Use distinct options, one option per style for each question."
     ).format(count=clean_count, context=context)
+    return system_prompt, user_prompt
+
+
+async def agenerate_interest_based_questions(interests: str, total_questions: int = 20) -> tuple[list[dict], str]:
+    clean_count = max(10, min(30, int(total_questions)))
+    with timed("style-questions"):
+        payload = await achatgpt_json(*_question_prompts(interests, clean_count), temperature=0.5)
+    return _generated_questions(payload, clean_count)
+
 
-    payload = chatgpt_json(system_prompt, user_prompt, temperature=0.5)
+def _generated_questions(payload: dict | None, clean_count: int) -> tuple[list[dict], str]:
     if not payload:
+        record_fallback("style_questions")
         return QUESTIONS[:clean_count], "default"
 
     generated = payload.get("questions", [])
     if not isinstance(generated, list):
+        record_fallback("style_questions", "invalid_output")
         return QUESTIONS[:clean_count], "default"
 
     validated = _validate_generated_questions(generated)
     if len(validated) != clean_count:
+        record_fallback("style_questions", "invalid_output")
         return QUESTIONS[:clean_count], "default"
     return validated, "ai"
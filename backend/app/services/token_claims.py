@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+from flask_jwt_extended import create_access_token, get_jwt
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models import ClaimsVersion, LearningStyle, User
+from app.services.admin_auth import admin_allowlist_fingerprint, is_admin_email
+
+
+# Per-worker view of claims_versions. Tokens carrying an older `cv` than this
+# fall back to a DB lookup and get a refreshed token in `X-Access-Token`.
+_versions: dict[int, int] = {}
+# Wall-clock start of the last successful refresh on this worker.
+_last_refresh: datetime | None = None
+_next_refresh = 0.0
+_refresh_lock = threading.Lock()
+
+
+def _refresh_overlap() -> timedelta:
+    # `updated_at` is stamped before the bumping transaction commits, so a row can
+    # become visible later than its timestamp. Each refresh re-reads this much of
+    # the window before the previous one; it must exceed the slowest commit.
+    return timedelta(seconds=float(os.getenv("CLAIMS_REFRESH_OVERLAP_SECONDS", "60")))
+
+
+def _refresh_versions() -> None:
+    global _last_refresh, _next_refresh
+    if time.monotonic() < _next_refresh or not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        _next_refresh = time.monotonic() + float(os.getenv("CLAIMS_REFRESH_SECONDS", "2"))
+        started = datetime.utcnow()
+        # Bumps older than the token lifetime cannot affect any live token.
+        since = _last_refresh or started - timedelta(seconds=current_app.config["JWT_ACCESS_TOKEN_EXPIRES"])
+        # Always the primary: a lagging replica would hide recent bumps past the overlap.
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                select(ClaimsVersion.user_id, ClaimsVersion.version).where(
+                    ClaimsVersion.updated_at >= since - _refresh_overlap()
+                )
+            ).all()
+        for user_id, version in rows:
+            if version > _versions.get(user_id, 0):
+                _versions[user_id] = version
+        _last_refresh = started
+    finally:
+        _refresh_lock.release()
+
+
+def issue_access_token(user: User, learning_style: str | None = None) -> str:
+    _refresh_versions()
+    claims = {
+        "is_admin": is_admin_email(user.email),
+        "learning_style": learning_style,
+        "cv": _versions.get(user.user_id, 0),
+        "adm": admin_allowlist_fingerprint(),
+        # Millisecond issue time so revocation watermarks can split a single second.
+        "iat_ms": int(time.time() * 1000),
+    }
+    return create_access_token(identity=str(user.user_id), additional_claims=claims)
+
+
+def issue_access_token_for(user: User) -> str:
+    style_row = db.session.get(LearningStyle, user.user_id)
+    return issue_access_token(user, style_row.learning_style if style_row else None)
+
+
+def bump_claims_version(user_id: int) -> None:
+    """Invalidate claims in existing tokens; commit happens with the caller's transaction."""
+    now = datetime.utcnow()
+    updated = (
+        db.session.query(ClaimsVersion)
+        .filter(ClaimsVersion.user_id == user_id)
+        .update({ClaimsVersion.version: ClaimsVersion.version + 1, ClaimsVersion.updated_at: now}, synchronize_session=False)
+    )
+    if not updated:
+        db.session.add(ClaimsVersion(user_id=user_id, version=1, updated_at=now))
+        db.session.flush()
+    _versions[user_id] = db.session.query(ClaimsVersion.version).filter(ClaimsVersion.user_id == user_id).scalar() or 0
+    g.claims_refresh_user = user_id
+
+
+def _current_claims(user_id: int) -> dict | None:
+    try:
+        claims = get_jwt()
+    except RuntimeError:
+        return None
+    if "cv" not in claims:
+        return None
+    _refresh_versions()
+    if claims["cv"] < _versions.get(user_id, 0) or claims.get("adm") != admin_allowlist_fingerprint():
+        return None
+    return claims
+
+
+def current_learning_style(user_id: int) -> str | None:
+    claims = _current_claims(user_id)
+    if claims is not None:
+        return claims.get("learning_style")
+    g.claims_refresh_user = user_id
+    style_row = db.session.get(LearningStyle, user_id)
+    return style_row.learning_style if style_row else None
+
+
+def current_is_admin(user_id: int) -> bool | None:
+    """Admin flag for the requester; None when the account no longer exists."""
+    claims = _current_claims(user_id)
+    if claims is not None:
+        return bool(claims.get("is_admin"))
+    g.claims_refresh_user = user_id
+    user = db.session.get(User, user_id)
+    if not user:
+        return None
+    return is_admin_email(user.email)
+
+
+def register_token_refresh(app) -> None:
+    global _last_refresh, _next_refresh
+    # The cache describes one database; start clean whenever an app is built.
+    _versions.clear()
+    _last_refresh = None
+    _next_refresh = 0.0
+
+    @app.after_request
+    def _attach_refreshed_token(response):
+        user_id = g.pop("claims_refresh_user", None)
+        if user_id is None or response.status_code >= 500:
+            return response
+        user = db.session.get(User, user_id)
+        if user:
+            response.headers["X-Access-Token"] = issue_access_token_for(user)
+        return response
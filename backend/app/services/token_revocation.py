@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db, jwt
+from app.models import RevokedToken, TokenWatermark
+
+
+logger = logging.getLogger("app.token_revocation")
+
+
+# Per-worker mirror of revoked_tokens / token_watermarks. The blocklist check is
+# a monotonic-clock comparison plus a set and a dict lookup; the DB is only read
+# by the incremental refresh, at most once per REVOCATION_REFRESH_SECONDS. The
+# refresh runs as a before_request hook, which the ASGI adapter sends to a
+# thread, so the JWT check inside async views never queries on the event loop.
+_revoked: dict[str, float] = {}  # jti -> exp (epoch seconds)
+_watermarks: dict[str, int] = {}  # JWT `sub` -> not_before_ms
+# Wall-clock start of the last successful refresh on this worker.
+_last_refresh: datetime | None = None
+_next_refresh = 0.0
+_next_prune = 0.0
+_refresh_lock = threading.Lock()
+
+
+def _refresh_overlap() -> timedelta:
+    # `revoked_at`/`updated_at` are stamped before the revoking transaction commits
+    # (which may wait out a 30s busy timeout), so a row can become visible later
+    # than its timestamp. Each refresh re-reads this much before the previous one.
+    return timedelta(seconds=float(os.getenv("REVOCATION_REFRESH_OVERLAP_SECONDS", "60")))
+
+
+def _refresh() -> None:
+    global _last_refresh, _next_refresh
+    if time.monotonic() < _next_refresh or not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        _next_refresh = time.monotonic() + float(os.getenv("REVOCATION_REFRESH_SECONDS", "2"))
+        started = datetime.utcnow()
+        since = _last_refresh or started - timedelta(seconds=current_app.config["JWT_ACCESS_TOKEN_EXPIRES"])
+        since -= _refresh_overlap()
+        # Always the primary: a lagging replica would hide recent revocations past the overlap.
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                select(RevokedToken.jti, RevokedToken.expires_at).where(
+                    RevokedToken.revoked_at >= since, RevokedToken.expires_at > started
+                )
+            ).all()
+            marks = conn.execute(
+                select(TokenWatermark.user_id, TokenWatermark.not_before_ms).where(TokenWatermark.updated_at >= since)
+            ).all()
+        for jti, expires_at in rows:
+            _revoked[jti] = _epoch(expires_at)
+        for user_id, not_before_ms in marks:
+            key = str(user_id)
+            _watermarks[key] = max(_watermarks.get(key, 0), not_before_ms)
+        _last_refresh = started
+        _prune_expired()
+    finally:
+        _refresh_lock.release()
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+def _prune_expired() -> None:
+    global _next_prune
+    if time.monotonic() < _next_prune:
+        return
+    _next_prune = time.monotonic() + 300
+    now = time.time()
+    for jti in [jti for jti, exp in _revoked.items() if exp <= now]:
+        _revoked.pop(jti, None)
+    # Watermarks older than the token lifetime cannot reject anything still valid.
+    cutoff_ms = int((now - current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]) * 1000)
+    for key in [key for key, mark in _watermarks.items() if mark <= cutoff_ms]:
+        _watermarks.pop(key, None)
+
+
+def is_token_revoked(payload: dict) -> bool:
+    if payload.get("jti") in _revoked:
+        return True
+    not_before_ms = _watermarks.get(payload.get("sub"))
+    if not_before_ms is None:
+        return False
+    # `iat` has one-second resolution; tokens we mint also carry `iat_ms`.
+    return payload.get("iat_ms", payload.get("iat", 0) * 1000) < not_before_ms
+
+
+def revoke_token(payload: dict) -> None:
+    """Revoke a single access token (logout). Commits with the caller's transaction."""
+    now = datetime.utcnow()
+    expires_at = _EPOCH + timedelta(seconds=payload["exp"])
+    db.session.merge(RevokedToken(jti=payload["jti"], user_id=int(payload["sub"]), expires_at=expires_at, revoked_at=now))
+    db.session.query(RevokedToken).filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+    _revoked[payload["jti"]] = float(payload["exp"])
+
+
+def revoke_all_for_user(user_id: int) -> None:
+    """Reject every token issued to `user_id` up to now (password reset, deletion, compromise)."""
+    now = datetime.utcnow()
+    not_before_ms = int(time.time() * 1000)
+    row = db.session.get(TokenWatermark, user_id)
+    if row is None:
+        db.session.add(TokenWatermark(user_id=user_id, not_before_ms=not_before_ms, updated_at=now))
+    else:
+        row.not_before_ms = max(row.not_before_ms, not_before_ms)
+        row.updated_at = now
+    _watermarks[str(user_id)] = max(_watermarks.get(str(user_id), 0), not_before_ms)
+
+
+def register_token_revocation(app) -> None:
+    global _last_refresh, _next_refresh
+    _revoked.clear()
+    _watermarks.clear()
+    _last_refresh = None
+    _next_refresh = 0.0
+
+    @app.before_request
+    def _refresh_blocklist():
+        global _next_refresh
+        # Only requests that carry a token are checked against the blocklist.
+        if not request.headers.get("Authorization"):
+            return
+        try:
+            _refresh()
+        except SQLAlchemyError:
+            # Not every Bearer header is a JWT (/api/metrics), so don't fail the request here; retry next time.
+            _next_refresh = 0.0
+            logger.warning("revocation refresh failed", exc_info=True)
+
+    @jwt.token_in_blocklist_loader
+    def _check_blocklist(_jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
+
+    @jwt.revoked_token_loader
+    def _revoked_response(_jwt_header, _jwt_payload):
+        return jsonify({"error": "token has been revoked"}), 401
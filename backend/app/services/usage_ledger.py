@@ -0,0 +1,304 @@
+"""Per-user upstream usage: tokens, images and TTS characters per day, with quotas.
+
+Upstream-bound routes run inside `usage_scope(user_id)`. Provider calls made
+in that scope:
+
+- are checked against the user's daily quota before they are sent
+  (`check_quota`). Over quota, the call raises QuotaExceeded and the caller
+  serves its usual fallback content.
+- add what they actually used to the ledger (`record`).
+
+Increments are summed in memory and written to `usage_ledger` every
+USAGE_FLUSH_SECONDS by a background thread, one UPDATE per user-day, so
+provider calls never wait on the database. Quota checks use each user's row,
+cached for USAGE_CACHE_SECONDS, plus this worker's unflushed usage. Several
+workers can therefore overshoot a quota by a few calls, never by a day's worth.
+Async callers load that row in a worker thread first (`aprefetch`), so the
+quota check on the event loop is a cache hit. Cached rows from earlier days, or
+past their expiry, are swept out every USAGE_CACHE_SECONDS.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.extensions import db
+from app.models import UsageLedger, User
+from app.services import metrics
+
+
+logger = logging.getLogger("app.usage_ledger")
+
+metrics.describe("usage_quota_rejections_total", "counter", "Upstream calls refused because the user was over a daily quota.")
+metrics.describe("usage_units_total", "counter", "Upstream usage charged to users, by kind (tokens, images, tts_chars).")
+
+KINDS = ("tokens", "images", "tts_chars")
+_QUOTA_ENV = {
+    "tokens": "USAGE_QUOTA_TOKENS_PER_DAY",
+    "images": "USAGE_QUOTA_IMAGES_PER_DAY",
+    "tts_chars": "USAGE_QUOTA_TTS_CHARS_PER_DAY",
+}
+
+_scope: ContextVar["UsageScope | None"] = ContextVar("usage_scope", default=None)
+_pending: dict[tuple[object, int, date], Counter] = {}
+_cached: dict[tuple[object, int, date], tuple[float, Counter]] = {}
+_lock = threading.Lock()
+_next_sweep = 0.0
+_flusher: tuple[int, threading.Thread] | None = None
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class UsageScope:
+    def __init__(self, user_id: int, engine):
+        self.user_id = user_id
+        # Captured here: flushes and hedged calls run outside the request's app context.
+        self.engine = engine
+        self.limited = False
+
+
+@contextmanager
+def usage_scope(user_id: int):
+    """Charge the enclosed upstream calls to `user_id` and hold them to that user's quotas."""
+    scope = UsageScope(user_id, db.engine)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def units(operation: str, request_json: dict | None, tokens: int) -> tuple[str, int] | None:
+    """(kind, amount) a provider call charges to the user's ledger."""
+    if operation == "image":
+        return "images", 1
+    if operation == "tts":
+        body = request_json or {}
+        return "tts_chars", len(body.get("input") or body.get("text") or "")
+    if operation.startswith("chat"):
+        return "tokens", tokens
+    return None
+
+
+def _quota(kind: str) -> int:
+    return int(os.getenv(_QUOTA_ENV[kind], "0") or 0)
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def _cache_seconds() -> float:
+    return float(os.getenv("USAGE_CACHE_SECONDS", "30"))
+
+
+def _cached_row(key: tuple) -> Counter | None:
+    with _lock:
+        hit = _cached.get(key)
+    return hit[1] if hit and hit[0] > time.monotonic() else None
+
+
+def _sweep(now: float, today: date) -> None:
+    """Drop cached rows that have expired or belong to an earlier day (caller holds _lock)."""
+    global _next_sweep
+    if now < _next_sweep:
+        return
+    _next_sweep = now + _cache_seconds()
+    for key in [key for key, (expires, _row) in _cached.items() if expires <= now or key[2] < today]:
+        del _cached[key]
+
+
+def _stored(engine, user_id: int, day: date) -> Counter:
+    key = (engine, user_id, day)
+    hit = _cached_row(key)
+    if hit is not None:
+        return hit
+    row = None
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(UsageLedger.tokens, UsageLedger.images, UsageLedger.tts_chars).where(
+                    UsageLedger.user_id == user_id, UsageLedger.day == day
+                )
+            ).first()
+    except SQLAlchemyError:
+        logger.warning("usage ledger read failed", exc_info=True)
+    stored = Counter(dict(zip(KINDS, row))) if row else Counter()
+    now = time.monotonic()
+    with _lock:
+        _sweep(now, day)
+        _cached[key] = (now + _cache_seconds(), stored)
+    return stored
+
+
+def used_today(engine, user_id: int) -> Counter:
+    day = _today()
+    used = Counter(_stored(engine, user_id, day))
+    with _lock:
+        used.update(_pending.get((engine, user_id, day), Counter()))
+    return used
+
+
+def _quota_scope(operation: str, request_json: dict | None, tokens: int):
+    """(scope, kind, amount, quota) when this call is held to a quota, else None."""
+    scope = _scope.get()
+    charge = units(operation, request_json, tokens)
+    if scope is None or charge is None:
+        return None
+    quota = _quota(charge[0])
+    return (scope, *charge, quota) if quota else None
+
+
+async def aprefetch(operation: str, request_json: dict | None) -> None:
+    """Load the user's stored row off the event loop so the following `check_quota` needs no query."""
+    checked = _quota_scope(operation, request_json, 0)
+    if checked is None:
+        return
+    scope = checked[0]
+    key = (scope.engine, scope.user_id, _today())
+    if _cached_row(key) is None:
+        await asyncio.to_thread(_stored, *key)
+
+
+def check_quota(operation: str, request_json: dict | None, estimated_tokens: int) -> None:
+    """Raise QuotaExceeded if this call would take the current user past a daily quota."""
+    checked = _quota_scope(operation, request_json, estimated_tokens)
+    if checked is None:
+        return
+    scope, kind, amount, quota = checked
+    # Token estimates are rough, so only refuse once the quota is actually spent.
+    needed = 0 if kind == "tokens" else amount
+    if used_today(scope.engine, scope.user_id)[kind] + needed > quota:
+        scope.limited = True
+        metrics.inc_counter("usage_quota_rejections_total", {"kind": kind})
+        raise QuotaExceeded(f"user {scope.user_id} is over the daily {kind} quota of {quota}")
+
+
+def record(operation: str, request_json: dict | None, tokens: int) -> None:
+    scope = _scope.get()
+    charge = units(operation, request_json, tokens)
+    if scope is None or charge is None:
+        return
+    kind, amount = charge
+    metrics.inc_counter("usage_units_total", {"kind": kind}, amount)
+    with _lock:
+        entry = _pending.setdefault((scope.engine, scope.user_id, _today()), Counter())
+        entry[kind] += amount
+        entry["calls"] += 1
+    _ensure_flusher()
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    if _flusher is not None and _flusher[0] == os.getpid():
+        return
+    with _lock:
+        if _flusher is not None and _flusher[0] == os.getpid():
+            return
+        thread = threading.Thread(target=_flush_forever, name="usage-ledger", daemon=True)
+        _flusher = (os.getpid(), thread)
+    thread.start()
+
+
+def _flush_forever() -> None:
+    while True:
+        time.sleep(float(os.getenv("USAGE_FLUSH_SECONDS", "5")))
+        try:
+            flush()
+        except Exception:  # keep the flusher alive whatever happens
+            logger.exception("usage ledger flush failed")
+
+
+def flush() -> int:
+    """Write this worker's pending increments; returns the number of user-days written."""
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    by_engine: dict[object, list] = {}
+    for (engine, user_id, day), amounts in batch.items():
+        by_engine.setdefault(engine, []).append((user_id, day, amounts))
+    written = 0
+    for engine, entries in by_engine.items():
+        try:
+            with engine.begin() as conn:
+                for user_id, day, amounts in entries:
+                    _add(conn, user_id, day, amounts)
+        except SQLAlchemyError:
+            # Put the increments back so the next flush retries them.
+            with _lock:
+                for user_id, day, amounts in entries:
+                    _pending.setdefault((engine, user_id, day), Counter()).update(amounts)
+            logger.warning("usage ledger flush failed", exc_info=True)
+            continue
+        written += len(entries)
+        with _lock:
+            for user_id, day, _amounts in entries:
+                _cached.pop((engine, user_id, day), None)
+    return written
+
+
+def _add(conn, user_id: int, day: date, amounts: Counter) -> None:
+    values = {kind: getattr(UsageLedger, kind) + amounts[kind] for kind in (*KINDS, "calls") if amounts[kind]}
+    values["updated_at"] = datetime.utcnow()
+    row = update(UsageLedger).where(UsageLedger.user_id == user_id, UsageLedger.day == day)
+    if conn.execute(row.values(values)).rowcount:
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(
+                UsageLedger.__table__.insert().values(
+                    user_id=user_id,
+                    day=day,
+                    updated_at=values["updated_at"],
+                    **{kind: amounts[kind] for kind in (*KINDS, "calls")},
+                )
+            )
+    except IntegrityError:
+        # Another worker created the row between our UPDATE and INSERT.
+        conn.execute(row.values(values))
+
+
+atexit.register(lambda: _pending and flush())
+
+
+def top_consumers(days: int = 7, limit: int = 20) -> dict:
+    """Heaviest users over the last `days` UTC days, by tokens then images then TTS characters."""
+    flush()
+    since = _today() - timedelta(days=max(1, days) - 1)
+    totals = [func.sum(getattr(UsageLedger, kind)) for kind in (*KINDS, "calls")]
+    rows = (
+        db.session.query(UsageLedger.user_id, User.name, User.email, *totals)
+        .outerjoin(User, User.user_id == UsageLedger.user_id)
+        .filter(UsageLedger.day >= since)
+        .group_by(UsageLedger.user_id, User.name, User.email)
+        .order_by(totals[0].desc(), totals[1].desc(), totals[2].desc())
+        .limit(limit)
+        .all()
+    )
+    return {
+        "since": since.isoformat(),
+        "quotas_per_day": {kind: _quota(kind) or None for kind in KINDS},
+        "users": [
+            {
+                "user_id": user_id,
+                "name": name,
+                "email": email,
+                "tokens": int(tokens or 0),
+                "images": int(images or 0),
+                "tts_chars": int(tts_chars or 0),
+                "calls": int(calls or 0),
+            }
+            for user_id, name, email, tokens, images, tts_chars, calls in rows
+        ],
+    }
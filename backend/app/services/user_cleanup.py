@@ -1,7 +1,22 @@
 from pathlib import Path
 
+from sqlalchemy import select
+
 from app.extensions import db
-from app.models import ChatFeedback, ChatHistory, Download, LearningStyle, PasswordResetToken, PracticeActivity, User
+from app.models import (
+    ChatFeedback,
+    ChatHistory,
+    Download,
+    IdempotencyKey,
+    LearningStyle,
+    PasswordResetToken,
+    PracticeActivity,
+    QuestionSignature,
+    UsageLedger,
+    User,
+)
+from app.services.token_claims import bump_claims_version
+from app.services.token_revocation import revoke_all_for_user
 
 
 def delete_user_with_related_data(user_id: int) -> bool:
@@ -18,12 +33,19 @@ def delete_user_with_related_data(user_id: int) -> bool:
             except OSError:
                 pass
 
+    chat_ids = select(ChatHistory.chat_id).where(ChatHistory.user_id == user_id)
+    QuestionSignature.query.filter(QuestionSignature.chat_id.in_(chat_ids)).delete(synchronize_session=False)
     ChatHistory.query.filter_by(user_id=user_id).delete()
     ChatFeedback.query.filter_by(user_id=user_id).delete()
     PracticeActivity.query.filter_by(user_id=user_id).delete()
     Download.query.filter_by(user_id=user_id).delete()
     LearningStyle.query.filter_by(user_id=user_id).delete()
     PasswordResetToken.query.filter_by(user_id=user_id).delete()
+    # Stored responses carry the user's answers and download paths.
+    IdempotencyKey.query.filter_by(user_id=user_id).delete()
+    UsageLedger.query.filter_by(user_id=user_id).delete()
+    bump_claims_version(user_id)
+    revoke_all_for_user(user_id)
     db.session.delete(user)
     db.session.commit()
     return True
@@ -0,0 +1,185 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import is_truthy
+from app.extensions import db
+from app.services import metrics
+from app.services.request_timing import timed
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
+
+
+logger = logging.getLogger("app.write_queue")
+T = TypeVar("T")
+
+metrics.describe("db_write_batch_size", "histogram", "Write jobs committed together by the SQLite writer thread.")
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class WriteQueueTimeout(SQLAlchemyError):
+    """The writer did not finish the job in time; routes treat it like any other DB error."""
+
+
+def write_queue_enabled(app=None) -> bool:
+    app = app or current_app
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    return uri.startswith("sqlite") and is_truthy(os.getenv("SQLITE_WRITE_QUEUE"))
+
+
+def _lock_file_path(app) -> Path:
+    configured = os.getenv("SQLITE_WRITE_LOCK_FILE", "").strip()
+    if configured:
+        return Path(configured)
+    database = db.engine.url.database or "adaptive_learning.db"
+    if database == ":memory:":
+        return Path(app.instance_path) / "sqlite-write.lock"
+    return Path(f"{database}.writelock")
+
+
+class _Writer:
+    """One thread per process that owns every write transaction and commits them in groups."""
+
+    def __init__(self, app):
+        self.app = app
+        self.pid = os.getpid()
+        self.jobs: queue.Queue = queue.Queue()
+        self.max_batch = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "32"))
+        self.max_wait = float(os.getenv("WRITE_QUEUE_MAX_WAIT_MS", "5")) / 1000
+        with app.app_context():
+            self.lock_path = _lock_file_path(app)
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, work: Callable) -> Future:
+        future: Future = Future()
+        self.jobs.put((future, work))
+        return future
+
+    def _next_batch(self) -> list:
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @contextmanager
+    def _process_lock(self):
+        # Writers in other gunicorn workers queue on the lock file instead of spinning on SQLITE_BUSY.
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _run(self) -> None:
+        with self.app.app_context():
+            while True:
+                batch = [(f, w) for f, w in self._next_batch() if f.set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                metrics.observe("db_write_batch_size", {}, len(batch), buckets=BATCH_BUCKETS)
+                try:
+                    with self._process_lock():
+                        self._commit_group(batch)
+                except Exception as exc:  # keep the writer alive whatever happens
+                    logger.exception("write batch failed")
+                    for future, _work in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                finally:
+                    db.session.remove()
+
+    def _commit_group(self, batch: list) -> None:
+        session = db.session
+        try:
+            results = [work(session) for _future, work in batch]
+            session.commit()
+        except Exception:
+            session.rollback()
+            if len(batch) == 1:
+                raise
+            # One job failed: fall back to committing each job on its own so only it fails.
+            for future, work in batch:
+                try:
+                    result = work(session)
+                    session.commit()
+                    future.set_result(result)
+                except Exception as exc:
+                    session.rollback()
+                    future.set_exception(exc)
+            return
+        for (future, _work), result in zip(batch, results):
+            future.set_result(result)
+
+
+_writers: dict[int, _Writer] = {}
+_writers_lock = threading.Lock()
+
+
+def _writer_for(app) -> _Writer:
+    with _writers_lock:
+        writer = _writers.get(id(app))
+        # Threads do not survive fork; a gunicorn worker starts its own writer.
+        if writer is None or writer.pid != os.getpid():
+            writer = _writers[id(app)] = _Writer(app)
+        return writer
+
+
+def run_write(work: Callable[..., T]) -> T:
+    """Run `work(session)` in a committed write transaction and return its result.
+
+    With SQLITE_WRITE_QUEUE on, the job runs on the process's writer thread in a
+    separate session, so `work` must return plain values (ids), not ORM objects.
+    """
+    app = current_app._get_current_object()
+    if not write_queue_enabled(app):
+        result = work(db.session)
+        db.session.commit()
+        return result
+
+    timeout = float(os.getenv("WRITE_QUEUE_TIMEOUT_SECONDS", "30"))
+    with timed("db-write-queue", "db"):
+        future = _writer_for(app).submit(work)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError as exc:
+            future.cancel()
+            raise WriteQueueTimeout(f"write queue did not commit within {timeout:.0f}s") from exc
+
+
+def insert_rows(rows: list[tuple[type, dict]]) -> list[int]:
+    """Insert `(Model, values)` rows in one write transaction; returns their primary keys in order.
+
+    Rows are built inside the job so a retried job never reuses half-flushed objects.
+    """
+
+    def work(session):
+        objects = [model(**values) for model, values in rows]
+        session.add_all(objects)
+        session.flush()
+        return [db.inspect(obj).identity[0] for obj in objects]
+
+    return run_write(work)
@@ -0,0 +1,109 @@
+"""Concurrent upstream-bound requests: ASGI event loop vs. a 12-thread pool.
+
+Starts a stub chat-completions upstream that answers after --delay seconds,
+points openai_service at it, and serves the app in-process with uvicorn. The
+same burst of /api/chat/suggestions requests runs twice: once awaited on the
+event loop ("asgi"), once forced through the thread pool the way a
+`gthread --threads 12` worker would serve it ("threads").
+
+    cd backend
+    python benchmarks/async_serving.py --requests 200 --delay 1.0
+
+On one shared core (app, stub and client in one process) 200 requests took
+6.6s (p50 3.1s) on the loop vs 21.3s (p50 11.5s) on 12 threads.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import create_app  # noqa: E402
+from app.asgi import AsgiAdapter  # noqa: E402
+from app.services import openai_service  # noqa: E402
+
+SUGGESTIONS = "\n".join(f"How would I practise this with worked example number {i}?" for i in range(6))
+
+
+def _stub_upstream(delay: float):
+    body = json.dumps({"choices": [{"message": {"content": SUGGESTIONS}}], "usage": {"total_tokens": 50}}).encode()
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await asyncio.sleep(delay)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _token(flask_app) -> str:
+    client = flask_app.test_client()
+    client.post("/api/auth/register", json={"name": "B", "email": "bench@example.com", "password": "secret123"})
+    return client.post("/api/auth/login", json={"email": "bench@example.com", "password": "secret123"}).get_json()["access_token"]
+
+
+async def _burst(port: int, token: str, count: int) -> tuple[float, list[float], int]:
+    limits = httpx.Limits(max_connections=count, max_keepalive_connections=count)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=300) as client:
+        async def one():
+            started = time.perf_counter()
+            res = await client.get("/api/chat/suggestions?topic=loops", headers={"Authorization": f"Bearer {token}"})
+            return time.perf_counter() - started, res.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(count)))
+        return time.perf_counter() - started, sorted(r[0] for r in results), sum(1 for r in results if r[1] != 200)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=1.0, help="stub upstream latency in seconds")
+    parser.add_argument("--threads", type=int, default=12)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}")
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    os.environ.setdefault("SLOW_REQUEST_THRESHOLD_MS", "600000")
+    os.environ["OPENAI_API_KEY"] = "bench-key"
+
+    _serve(_stub_upstream(args.delay), 5301)
+    openai_service.OPENAI_CHAT_COMPLETIONS_URL = "http://127.0.0.1:5301/v1/chat/completions"
+
+    flask_app = create_app()
+    token = _token(flask_app)
+    for port, mode in ((5302, "asgi"), (5303, "threads")):
+        adapter = AsgiAdapter(flask_app, threads=args.threads)
+        if mode == "threads":
+            adapter.async_endpoints = set()
+        _serve(adapter, port)
+        elapsed, latencies, errors = asyncio.run(_burst(port, token, args.requests))
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(
+            f"{mode:8s} {args.requests} requests in {elapsed:6.2f}s  "
+            f"p50 {statistics.median(latencies):6.2f}s  p99 {p99:6.2f}s  errors {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Concurrent login latency benchmark.
+
+Fires a burst of logins at an in-process threaded server while a background
+client keeps polling /api/health, then reports p50/p99 for both. Run it once
+with PASSWORD_HASH_WORKERS=0 (inline hashing) and once with the pool enabled to
+compare how much the login burst stalls other traffic.
+
+    cd backend
+    PASSWORD_HASH_WORKERS=0 python benchmarks/login_latency.py --users 40 --concurrency 12
+    PASSWORD_HASH_WORKERS=2 python benchmarks/login_latency.py --users 40 --concurrency 12
+
+Pass --url to benchmark a running deployment instead (users must not exist yet).
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _start_local_server() -> tuple[str, object]:
+    from werkzeug.serving import make_server
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}")
+    from app import create_app
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def _timed_post(url: str, payload: dict) -> tuple[float, int]:
+    started = time.perf_counter()
+    res = requests.post(url, json=payload, timeout=60)
+    return time.perf_counter() - started, res.status_code
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running server; defaults to an in-process server.")
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=12)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url.rstrip("/") if args.url else None
+    if base_url is None:
+        base_url, server = _start_local_server()
+
+    stamp = int(time.time())
+    accounts = [
+        {"name": f"Bench {i}", "email": f"bench-{stamp}-{i}@example.com", "password": "bench-secret"}
+        for i in range(args.users)
+    ]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda acct: _timed_post(f"{base_url}/api/auth/register", acct), accounts))
+
+    health_samples: list[float] = []
+    stop = threading.Event()
+
+    def poll_health():
+        while not stop.is_set():
+            started = time.perf_counter()
+            requests.get(f"{base_url}/api/health", timeout=60)
+            health_samples.append(time.perf_counter() - started)
+
+    poller = threading.Thread(target=poll_health, daemon=True)
+    poller.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(
+            pool.map(
+                lambda acct: _timed_post(f"{base_url}/api/auth/login", {"email": acct["email"], "password": acct["password"]}),
+                accounts,
+            )
+        )
+    wall = time.perf_counter() - started
+    stop.set()
+    poller.join()
+    if server is not None:
+        server.shutdown()
+
+    login_samples = [elapsed for elapsed, status in results if status == 200]
+    rejected = sum(1 for _elapsed, status in results if status == 503)
+    print(f"hash workers={os.getenv('PASSWORD_HASH_WORKERS', '2')} method={os.getenv('PASSWORD_HASH_METHOD', 'scrypt')}")
+    print(f"logins: {len(login_samples)} ok, {rejected} rejected (503), wall {wall:.2f}s")
+    print(
+        f"login   p50={statistics.median(login_samples) * 1000 if login_samples else 0:.1f}ms "
+        f"p99={_percentile(login_samples, 99) * 1000:.1f}ms"
+    )
+    print(
+        f"health  p50={statistics.median(health_samples) * 1000 if health_samples else 0:.1f}ms "
+        f"p99={_percentile(health_samples, 99) * 1000:.1f}ms ({len(health_samples)} samples during burst)"
+    )
+
+
+if __name__ == "__main__":
+    main()
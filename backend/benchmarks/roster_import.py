@@ -0,0 +1,47 @@
+"""Bulk roster import timing.
+
+Imports a synthetic roster into a throwaway SQLite database and prints how
+long parsing, hashing and the batched inserts took.
+
+    cd backend
+    python benchmarks/roster_import.py --rows 10000
+    ROSTER_IMPORT_HASH_METHOD=pbkdf2:sha256:20000 python benchmarks/roster_import.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'roster.db'}"
+    from app import create_app
+    from app.services.query_inspector import capture_queries
+    from app.services.roster_import import import_roster, parse_roster
+
+    styles = ["visual", "auditory", "kinesthetic", ""]
+    lines = ["name,email,password,learning_style"]
+    lines += [f"Student {i},student{i}@example.com,initial-{i:06d},{styles[i % 4]}" for i in range(args.rows)]
+    raw = "\n".join(lines)
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        with capture_queries() as statements:
+            report = import_roster(parse_roster(raw, "csv"))
+        elapsed = time.perf_counter() - started
+
+    print(f"hash method={os.getenv('ROSTER_IMPORT_HASH_METHOD') or os.getenv('PASSWORD_HASH_METHOD', 'scrypt')} cores={os.cpu_count()}")
+    print(f"{report['summary']} in {elapsed:.2f}s using {len(statements)} SQL statements")
+
+
+if __name__ == "__main__":
+    main()
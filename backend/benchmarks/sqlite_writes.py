@@ -0,0 +1,66 @@
+"""SQLite write throughput with and without the per-connection pragmas.
+
+Runs concurrent writer threads that each insert a chat-history-sized row and
+commit, once against an engine with SQLite defaults (rollback journal,
+synchronous=FULL) and once with app.database.configure_engine applied.
+
+    cd backend
+    python benchmarks/sqlite_writes.py --threads 8 --writes 200
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.database import configure_engine, engine_options  # noqa: E402
+
+
+def _run(configured: bool, threads: int, writes: int) -> float:
+    path = Path(tempfile.mkdtemp()) / ("tuned.db" if configured else "default.db")
+    engine = create_engine(f"sqlite:///{path}", pool_size=threads, **engine_options("sqlite://"))
+    if configured:
+        configure_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chat (id INTEGER PRIMARY KEY, user_id INTEGER, question TEXT, response TEXT)"))
+
+    payload = "x" * 2000
+
+    def writer(worker: int):
+        for i in range(writes):
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO chat (user_id, question, response) VALUES (:u, :q, :r)"),
+                    {"u": worker, "q": f"question {i}", "r": payload},
+                )
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return threads * writes / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    default_rate = _run(False, args.threads, args.writes)
+    tuned_rate = _run(True, args.threads, args.writes)
+    print(f"defaults : {default_rate:8.0f} commits/s")
+    print(f"pragmas  : {tuned_rate:8.0f} commits/s ({tuned_rate / default_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
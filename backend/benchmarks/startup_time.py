@@ -0,0 +1,96 @@
+"""Worker boot cost: per-module import time and create_app() time.
+
+Each run is a fresh interpreter under `python -X importtime`, the same work a
+gunicorn worker does without --preload. "development" migrates on boot;
+"production" skips schema work (the gunicorn master migrates once instead).
+
+    cd backend
+    python benchmarks/startup_time.py --runs 5 --top 20
+    python benchmarks/startup_time.py --mode production --filter app.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+BOOT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+built = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "create_app_s": built - imported, "requests_loaded": "requests" in sys.modules}))
+"""
+
+
+def _env(mode: str, database_url: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONDONTWRITEBYTECODE="1")
+    if mode == "production":
+        env.update(APP_ENV="production", SECRET_KEY="bench-secret-key", JWT_SECRET_KEY="bench-jwt-secret-key")
+    else:
+        env["APP_ENV"] = "development"
+    return env
+
+
+def _boot(mode: str, database_url: str) -> tuple[dict, dict[str, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT],
+        cwd=BACKEND,
+        env=_env(mode, database_url),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), cumulative
+
+
+def run(mode: str, runs: int, top: int, prefix: str) -> None:
+    database_url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'startup.db'}"
+    _boot("development", database_url)  # schema in place, bytecode warm: measure steady-state boots
+
+    timings, modules = [], {}
+    for _ in range(runs):
+        result, cumulative = _boot(mode, database_url)
+        timings.append(result)
+        for name, micros in cumulative.items():
+            modules.setdefault(name, []).append(micros)
+
+    print(f"\n{mode}: {runs} boots")
+    print(f"  import app    median {statistics.median(t['import_s'] for t in timings) * 1000:7.1f} ms")
+    print(f"  create_app()  median {statistics.median(t['create_app_s'] for t in timings) * 1000:7.1f} ms")
+    print(f"  requests imported at boot: {any(t['requests_loaded'] for t in timings)}")
+    ranked = sorted(
+        ((statistics.median(values), name) for name, values in modules.items() if name.startswith(prefix)),
+        reverse=True,
+    )
+    print(f"  slowest modules (median cumulative import time{f', {prefix}*' if prefix else ''}):")
+    for micros, name in ranked[:top]:
+        print(f"    {micros / 1000:8.1f} ms  {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("development", "production", "both"), default="both")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--filter", default="", help="only list modules with this prefix, e.g. app.")
+    args = parser.parse_args()
+    for mode in ("development", "production") if args.mode == "both" else (args.mode,):
+        run(mode, args.runs, args.top, args.filter)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Gunicorn hooks shared by the Dockerfile and render.yaml start commands.
+
+Gunicorn picks this file up from the working directory, so worker counts and
+binds stay on the command line. Set GUNICORN_PRELOAD=1 to build the app once in
+the master and fork workers from it. The hooks work for both `wsgi:app` (sync
+workers) and `asgi:app` (uvicorn workers, what the deploys use).
+"""
+import os
+
+from app.config import is_truthy
+
+preload_app = is_truthy(os.getenv("GUNICORN_PRELOAD"))
+
+
+def on_starting(server):
+    # Migrate once per deploy here instead of in every worker boot and max_requests recycle.
+    if is_truthy(os.getenv("GUNICORN_MIGRATE"), default=True):
+        from app.migrations import migrate_from_env
+
+        applied = migrate_from_env()
+        server.log.info("schema migrations applied: %s", applied or "none pending")
+    if server.cfg.preload_app:
+        # Lazily imported by the provider clients; load it once so forked workers share it.
+        import requests  # noqa: F401
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app.database import dispose_engines
+
+        app = server.app.wsgi()
+        # asgi:app wraps the Flask app in an AsgiAdapter.
+        dispose_engines(getattr(app, "flask_app", app))
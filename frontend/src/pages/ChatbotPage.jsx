@@ -1,7 +1,7 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import NavBar from "../components/NavBar";
-import api from "../services/api";
+import api, { postIdempotent } from "../services/api";
 
 const QUICK_PROMPTS = [
   "Explain Java basics for beginners",
@@ -175,7 +175,7 @@ export default function ChatbotPage() {
     setDownloadSuccess("");
     try {
       const mode = activeMode || style || "visual";
-      const res = await api.post("/chat/", { question: asked, style_override: mode });
+      const res = await postIdempotent("/chat/", { question: asked, style_override: mode });
       const richResponse = { ...res.data, askedQuestion: asked };
       setResponse(richResponse);
       setFeedbackComment("");
@@ -271,7 +271,7 @@ export default function ChatbotPage() {
     setDownloadError("");
     setDownloadSuccess("");
     try {
-      const created = await api.post("/downloads/", {
+      const created = await postIdempotent("/downloads/", {
         content_type: contentType,
         topic,
         content: "",
@@ -1,7 +1,7 @@
 import { useEffect, useState } from "react";
 import { useSearchParams } from "react-router-dom";
 import NavBar from "../components/NavBar";
-import api from "../services/api";
+import api, { postIdempotent } from "../services/api";
 
 const EXT_BY_TYPE = {
   task_sheet: ".txt",
@@ -275,7 +275,7 @@ export default function PracticePage() {
     const base_content = contentType === "solution" ? solutionBaseContent : taskBaseContent;
 
     try {
-      const created = await api.post("/downloads/", {
+      const created = await postIdempotent("/downloads/", {
         content_type: contentType,
         topic: selectedTask.task_name,
         content: "",
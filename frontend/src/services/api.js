@@ -13,4 +13,27 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// The API re-issues tokens when role/style claims change; keep the newest one.
+api.interceptors.response.use((response) => {
+  const refreshed = response.headers["x-access-token"];
+  if (refreshed) {
+    localStorage.setItem("token", refreshed);
+  }
+  return response;
+});
+
+// Expensive POSTs (chat answers, downloads) carry an Idempotency-Key. A retry after a
+// dropped connection reuses it, so the server replays the first result instead of
+// generating everything again.
+export async function postIdempotent(url, data, retries = 2) {
+  const headers = { "Idempotency-Key": crypto.randomUUID() };
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      return await api.post(url, data, { headers });
+    } catch (err) {
+      if (err.response || attempt >= retries) throw err;
+    }
+  }
+}
+
 export default api;
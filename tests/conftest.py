@@ -0,0 +1,17 @@
+import pytest
+
+from app.services import provider_resilience, query_inspector
+
+
+@pytest.fixture(autouse=True)
+def _fresh_breakers():
+    # Breakers are per-process state; a test that trips one must not fail the next test fast.
+    provider_resilience._breakers.clear()
+    yield
+    provider_resilience._breakers.clear()
+
+
+@pytest.fixture
+def assert_max_queries():
+    """Usage: `with assert_max_queries(3): client.get(...)` enforces a per-route query budget."""
+    return query_inspector.assert_max_queries
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import httpx
+
+from app import create_app
+from app.extensions import db
+from app.models import ChatHistory, QuestionSignature
+from app.services import answer_index, openai_service
+
+ANSWER = {"choices": [{"message": {"content": "try runs code that may throw; catch handles the exception."}}]}
+
+
+def _client(tmp_path, monkeypatch, operations: list):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'reuse.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "reuse-model")
+    monkeypatch.setenv("ANSWER_REUSE_REFRESH_SECONDS", "0")
+
+    async def _asend(url, *, provider, operation, model, expect_json=True, **kwargs):
+        operations.append(kwargs["json"]["messages"][0]["content"][:40])
+        await asyncio.sleep(0)
+        return httpx.Response(200, json=ANSWER), ANSWER
+
+    monkeypatch.setattr(openai_service, "_asend", _asend)
+    app = create_app()
+    app.config.update(TESTING=True)
+    client = app.test_client()
+    client.post("/api/auth/register", json={"name": "R", "email": "r@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "r@example.com", "password": "secret123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/api/style/select", json={"learning_style": "kinesthetic"}, headers=headers)
+    return app, client, headers
+
+
+def test_paraphrases_share_a_signature_and_unrelated_questions_do_not():
+    same = answer_index.signature("what is try catch in java")
+    assert answer_index.similarity(same, answer_index.signature("Explain try-catch, Java?")) == 1
+    assert answer_index.similarity(same, answer_index.signature("How do I use try catch in Java")) >= 0.6
+    assert answer_index.similarity(same, answer_index.signature("what are java generics")) < 0.3
+    assert answer_index.signature("what is it?") is None
+
+
+def test_java_keywords_are_not_treated_as_filler():
+    for question, other in (
+        ("explain do while loop in java", "explain while loop in java"),
+        ("what is a for loop", "what is a loop"),
+        ("try with resources", "try resources"),
+    ):
+        assert answer_index.similarity(answer_index.signature(question), answer_index.signature(other)) < 0.8
+
+
+def test_equivalent_question_reuses_the_stored_answer(tmp_path, monkeypatch):
+    operations = []
+    _app, client, headers = _client(tmp_path, monkeypatch, operations)
+
+    first = client.post("/api/chat/", json={"question": "what is try catch in java"}, headers=headers).get_json()
+    first_calls = len(operations)
+    again = client.post("/api/chat/", json={"question": "Explain try-catch, Java?"}, headers=headers).get_json()
+
+    assert again["reused_answer"] == {"similarity": 1.0}
+    assert again["text"] == first["text"] and again["ai_used"] is True
+    # Only the practice tasks were generated again.
+    assert len(operations) - first_calls == first_calls - 1
+
+    other_style = client.post(
+        "/api/chat/", json={"question": "Explain try-catch, Java?", "style_override": "auditory"}, headers=headers
+    ).get_json()
+    assert "reused_answer" not in other_style
+
+    client.delete(f"/api/chat/history/{first['chat_id']}", headers=headers)
+    client.delete(f"/api/chat/history/{again['chat_id']}", headers=headers)
+    after_delete = client.post("/api/chat/", json={"question": "try catch java"}, headers=headers).get_json()
+    assert "reused_answer" not in after_delete
+
+
+def test_lookup_is_sub_millisecond(tmp_path, monkeypatch):
+    app, _client_, _headers = _client(tmp_path, monkeypatch, [])
+    monkeypatch.setenv("ANSWER_REUSE_REFRESH_SECONDS", "60")
+    with app.app_context():
+        index = answer_index._index()
+        for i in range(5000):
+            index.add(100000 + i, "visual", answer_index.signature(f"how does feature {i} of module {i % 97} work"))
+        answer_index.find("what is a java record", "visual")
+        started = time.perf_counter()
+        for _ in range(200):
+            assert answer_index.find("what is a java record", "visual") is None
+        assert (time.perf_counter() - started) / 200 < 0.001
+
+
+def test_signatures_committed_out_of_id_order_are_still_loaded(tmp_path, monkeypatch):
+    app, _client_, _headers = _client(tmp_path, monkeypatch, [])
+    with app.app_context():
+
+        def answered(question: str, signature_id: int) -> None:
+            row = ChatHistory(
+                user_id=1, question=question, response=f"answer: {question}", response_type="visual", learning_style_used="visual"
+            )
+            db.session.add(row)
+            db.session.flush()
+            sig = answer_index.signature(question).tobytes()
+            db.session.add(QuestionSignature(signature_id=signature_id, chat_id=row.chat_id, learning_style="visual", signature=sig))
+            db.session.commit()
+
+        answered("how do java streams work", 10)
+        assert answer_index.find("how do java streams work", "visual")["text"] == "answer: how do java streams work"
+        # Another worker took id 5 first but committed after id 10 was already loaded.
+        answered("what is a java record", 5)
+        assert answer_index.find("what is a java record", "visual")["text"] == "answer: what is a java record"
+
+
+def test_index_is_capped_and_loaded_a_page_at_a_time(tmp_path, monkeypatch):
+    app, _client_, _headers = _client(tmp_path, monkeypatch, [])
+    monkeypatch.setenv("ANSWER_REUSE_MAX_ENTRIES", "3")
+    monkeypatch.setattr(answer_index, "PAGE_ROWS", 2)
+    with app.app_context():
+        index = answer_index._index()
+        for chat_id in range(1, 6):
+            index.add(chat_id, "visual", answer_index.signature(f"topic number {chat_id} of the course"))
+        assert list(index.signatures) == [3, 4, 5]
+
+        questions = [f"how does feature {i} of module {i} work" for i in range(5)]
+        for i, question in enumerate(questions):
+            row = ChatHistory(user_id=1, question=question, response=question, response_type="visual", learning_style_used="visual")
+            db.session.add(row)
+            db.session.flush()
+            sig = answer_index.signature(question).tobytes()
+            db.session.add(QuestionSignature(chat_id=row.chat_id, learning_style="visual", signature=sig))
+        db.session.commit()
+
+        fresh = answer_index._Index()
+        loaded = []
+        for _ in range(2):
+            fresh.refresh()
+            loaded.append((len(fresh.signatures), fresh.paging is None))
+        # Only the newest three rows are read, two per lookup.
+        assert loaded == [(2, False), (3, True)]
+        assert set(fresh.signatures) == {3, 4, 5}
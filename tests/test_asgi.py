@@ -0,0 +1,148 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+
+from app import create_app
+from app.asgi import AsgiAdapter
+from app.extensions import db
+from app.models import ChatHistory
+from app.services import openai_service
+
+SUGGESTIONS = "\n".join(f"How would I practise loops with example number {i}?" for i in range(6))
+
+
+async def _slow_upstream(url, **kwargs):
+    await asyncio.sleep(0.3)
+    response = httpx.Response(200, json={"choices": [{"message": {"content": SUGGESTIONS}}]})
+    return response, response.json()
+
+
+def _app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'asgi.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(openai_service, "_apost", _slow_upstream)
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app
+
+
+async def _token(client) -> dict:
+    await client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    res = await client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"})
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+def test_upstream_waits_overlap_on_the_event_loop(tmp_path, monkeypatch):
+    # Two threads for the WSGI routes: 20 overlapping 300 ms waits only fit if they share the loop.
+    adapter = AsgiAdapter(_app(tmp_path, monkeypatch), threads=2)
+    assert {"chat.ask_chatbot", "chat.chat_suggestions", "download.create_download", "style.generate_questions"} <= adapter.async_endpoints
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=adapter)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = await _token(client)
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *(client.get("/api/chat/suggestions", params={"topic": "loops"}, headers=headers) for _ in range(20))
+            )
+            return time.perf_counter() - started, responses, await client.get("/api/health")
+
+    elapsed, responses, health = asyncio.run(scenario())
+    assert all(r.status_code == 200 for r in responses)
+    assert responses[0].json()["prompts"][0].startswith("How would I practise loops")
+    assert "suggestions" in responses[0].headers["Server-Timing"]
+    assert elapsed < 1.5
+    assert health.json() == {"status": "ok"}
+
+
+def test_async_views_still_serve_over_wsgi(tmp_path, monkeypatch):
+    client = _app(tmp_path, monkeypatch).test_client()
+    client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"}).get_json()["access_token"]
+
+    res = client.get("/api/chat/suggestions?topic=loops", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    assert len(res.get_json()["prompts"]) == 6
+    assert client.get("/api/chat/suggestions").status_code == 401
+
+
+def test_wsgi_routes_stream_request_and_response_bodies(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXPORT_CHUNK_SIZE", "50")
+    adapter = AsgiAdapter(_app(tmp_path, monkeypatch), threads=2)
+
+    async def call(method, path, parts=(b"",), headers=()):
+        messages = [{"type": "http.request", "body": part, "more_body": i < len(parts) - 1} for i, part in enumerate(parts)]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "http_version": "1.1", "method": method, "path": path, "query_string": b"", "headers": list(headers)}
+        await adapter(scope, receive, send)
+        return sent
+
+    async def scenario():
+        # A chunked upload with no Content-Length, read as the view consumes it.
+        body = json.dumps({"name": "L", "email": "l@example.com", "password": "secret123"}).encode()
+        register = await call("POST", "/api/auth/register", (body[:10], body[10:]), [(b"content-type", b"application/json")])
+        login = await call(
+            "POST", "/api/auth/login", (json.dumps({"email": "l@example.com", "password": "secret123"}).encode(),),
+            [(b"content-type", b"application/json")],
+        )
+        token = json.loads(b"".join(m.get("body", b"") for m in login[1:]))["access_token"]
+        with adapter.flask_app.app_context():
+            db.session.add_all(
+                ChatHistory(user_id=1, question=f"q{i}", response="a", response_type="text", learning_style_used="visual")
+                for i in range(120)
+            )
+            db.session.commit()
+        export = await call(
+            "GET", "/api/auth/me/export", headers=[(b"authorization", f"Bearer {token}".encode())]
+        )
+        return register, export
+
+    register, export = asyncio.run(scenario())
+    assert register[0]["status"] == 201
+    assert export[0]["status"] == 200
+    bodies = export[1:]
+    # Header row plus one chunk per 50-row batch, then the closing message.
+    assert len(bodies) >= 4 and all(m["more_body"] for m in bodies[:-1]) and not bodies[-1].get("more_body")
+    assert b"".join(m["body"] for m in bodies).count(b"\n") == 121
+
+
+def test_async_routes_verify_jwt_and_query_off_the_loop(tmp_path, monkeypatch):
+    from flask_jwt_extended import view_decorators
+    from sqlalchemy import event
+
+    app = _app(tmp_path, monkeypatch)
+    adapter = AsgiAdapter(app, threads=2)
+    threads = {"jwt": [], "sql": []}
+    verify = view_decorators.verify_jwt_in_request
+
+    def recording_verify(*args, **kwargs):
+        threads["jwt"].append(threading.get_ident())
+        return verify(*args, **kwargs)
+
+    monkeypatch.setattr(view_decorators, "verify_jwt_in_request", recording_verify)
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *a: threads["sql"].append(threading.get_ident()))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=adapter)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = await _token(client)
+            threads["sql"].clear()
+            res = await client.get("/api/chat/suggestions", params={"topic": "loops"}, headers=headers)
+            return res, threading.get_ident()
+
+    res, loop_thread = asyncio.run(scenario())
+    assert res.status_code == 200
+    assert threads["jwt"] and loop_thread not in threads["jwt"]
+    assert threads["sql"] and loop_thread not in threads["sql"]
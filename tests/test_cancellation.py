@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+
+import httpx
+import requests
+
+from app import create_app
+from app.asgi import AsgiAdapter
+from app.services import cancellation, openai_service
+from app.services.provider_telemetry import last_failure_reason
+
+
+def _app(tmp_path, monkeypatch, cancelled: list):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'cancel.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("UPSTREAM_CANCEL_DIR", str(tmp_path / "cancelled"))
+    monkeypatch.setattr(cancellation, "POLL_SECONDS", 0.05)
+
+    real_post = httpx.AsyncClient.post
+
+    async def _hanging_post(self, url, **kwargs):
+        if str(url).startswith("/"):
+            return await real_post(self, url, **kwargs)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+
+    monkeypatch.setattr(httpx.AsyncClient, "post", _hanging_post)
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app
+
+
+async def _token(client) -> dict:
+    await client.post("/api/auth/register", json={"name": "C", "email": "c@example.com", "password": "secret123"})
+    res = await client.post("/api/auth/login", json={"email": "c@example.com", "password": "secret123"})
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    await client.post("/api/style/select", json={"learning_style": "visual"}, headers=headers)
+    return headers
+
+
+def test_cancel_endpoint_stops_upstream_calls(tmp_path, monkeypatch):
+    cancelled = []
+    adapter = AsgiAdapter(_app(tmp_path, monkeypatch, cancelled), threads=2)
+    before = cancellation.wasted_report()["wasted_upstream_calls_last_hour"]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=adapter)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = await _token(client)
+
+            async def cancel_soon():
+                await asyncio.sleep(0.3)
+                return await client.post("/api/chat/cancel/chat-42", headers=headers)
+
+            started = time.perf_counter()
+            answer, cancel = await asyncio.gather(
+                client.post("/api/chat/", json={"question": "What is a Java interface?"}, headers={**headers, "X-Request-ID": "chat-42"}),
+                cancel_soon(),
+            )
+            return time.perf_counter() - started, answer, cancel, await client.get("/api/chat/history", headers=headers)
+
+    elapsed, answer, cancel, history = asyncio.run(scenario())
+    assert cancel.status_code == 202
+    assert answer.status_code == 499
+    assert elapsed < 2
+    assert cancelled
+    assert history.json() == []
+    assert cancellation.wasted_report()["wasted_upstream_calls_last_hour"] >= before + len(cancelled)
+    assert not list((tmp_path / "cancelled").iterdir())
+
+
+def test_client_disconnect_cancels_the_view(tmp_path, monkeypatch):
+    cancelled = []
+    adapter = AsgiAdapter(_app(tmp_path, monkeypatch, cancelled), threads=2)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=adapter)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = await _token(client)
+        body = json.dumps({"question": "Explain Java generics"}).encode()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(0.3)
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": "POST",
+            "path": "/api/chat/",
+            "query_string": b"",
+            "headers": [
+                (b"authorization", headers["Authorization"].encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+        started = time.perf_counter()
+        await adapter(scope, receive, send)
+        return time.perf_counter() - started, sent
+
+    elapsed, sent = asyncio.run(scenario())
+    assert sent == []
+    assert elapsed < 2
+    assert cancelled
+    assert cancellation.wasted_report()["by_reason"]["disconnect"]["requests"] >= 1
+
+
+def test_sync_provider_calls_fail_fast_once_cancelled(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("UPSTREAM_CANCEL_DIR", str(tmp_path))
+    monkeypatch.setattr(requests, "post", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("called upstream")))
+
+    with cancellation.cancel_scope(7, "sync-1"):
+        assert cancellation.request_cancel(7, "sync-1")
+        assert openai_service.chatgpt_text("sys", "user") is None
+        assert last_failure_reason() == "cancelled"
+    assert not cancellation.request_cancel(7, "/?")
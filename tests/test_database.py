@@ -0,0 +1,27 @@
+from app import create_app
+from app.database import engine_options
+from app.extensions import db
+
+
+def test_every_pooled_sqlite_connection_gets_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'pragmas.db'}")
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "4321")
+    app = create_app()
+    with app.app_context():
+        # Hold two connections at once so the second one is freshly opened by the pool.
+        with db.engine.connect() as first, db.engine.connect() as second:
+            for conn in (first, second):
+                assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+                assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+                assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 4321
+                assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+                assert conn.exec_driver_sql("PRAGMA cache_size").scalar() == -20000
+
+
+def test_postgres_pool_options_come_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+    options = engine_options("postgresql+psycopg2://u:p@db/app")
+    assert options["pool_size"] == 3
+    assert options["pool_pre_ping"] is False
+    assert {"max_overflow", "pool_recycle", "pool_timeout"} <= options.keys()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import time
+
+import httpx
+import requests
+
+from app import create_app
+from app.services import openai_service
+from app.services.chatbot_service import agenerate_adaptive_response
+from app.services.deadlines import deadline
+
+ANSWER = {"choices": [{"message": {"content": "Try wraps risky code; catch handles the failure."}}]}
+
+
+def _response(payload: dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = 200
+    res._content = json.dumps(payload).encode("utf-8")
+    res.headers["Content-Type"] = "application/json"
+    return res
+
+
+def test_provider_timeout_is_capped_by_the_remaining_budget(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "deadline-model")
+    timeouts = []
+    monkeypatch.setattr(requests, "post", lambda url, **kwargs: timeouts.append(kwargs["timeout"]) or _response(ANSWER))
+
+    openai_service.chatgpt_text("sys", "user")
+    with deadline("chat", 2):
+        openai_service.chatgpt_text("sys", "user")
+    assert timeouts[0] == 25
+    assert 1.5 < timeouts[1] <= 2
+
+
+def test_optional_visual_work_is_skipped_once_the_budget_is_spent(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "deadline-visual-model")
+    monkeypatch.setenv("DEADLINE_CHAT_SECONDS", "1")
+    urls = []
+
+    async def _slow(self, url, **kwargs):
+        urls.append(url)
+        await asyncio.sleep(0.6)
+        return httpx.Response(200, json=ANSWER, request=httpx.Request("POST", url))
+
+    async def answer():
+        with deadline("chat", 45):
+            return await agenerate_adaptive_response("What is try catch in Java?", "visual")
+
+    monkeypatch.setattr(httpx.AsyncClient, "post", _slow)
+    started = time.perf_counter()
+    result = asyncio.run(answer())
+    assert time.perf_counter() - started < 1
+    assert result["ai_used"] is True
+    assert result["assets"]["visual_status"] == "fallback_generated"
+    assert urls == [openai_service.OPENAI_CHAT_COMPLETIONS_URL]
+
+
+def test_chat_route_answers_within_its_budget(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'deadline.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "deadline-route-model")
+    monkeypatch.setenv("DEADLINE_CHAT_SECONDS", "1.5")
+    operations = []
+
+    async def _asend(url, *, provider, operation, model, expect_json=True, **kwargs):
+        operations.append(operation)
+        await asyncio.sleep(min(kwargs["timeout"], 0.8))
+        return httpx.Response(200, json=ANSWER), ANSWER
+
+    monkeypatch.setattr(openai_service, "_asend", _asend)
+    client = create_app().test_client()
+    client.post("/api/auth/register", json={"name": "D", "email": "d@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "d@example.com", "password": "secret123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/api/style/select", json={"learning_style": "visual"}, headers=headers)
+
+    started = time.perf_counter()
+    res = client.post("/api/chat/", json={"question": "Why use finally in recursive descent parsers?"}, headers=headers)
+    assert res.status_code == 200
+    assert time.perf_counter() - started < 2.5
+    assert res.get_json()["ai_used"] is True
+    assert "image" not in operations
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+
+from app import create_app
+from app.extensions import db
+from app.models import ChatFeedback, ChatHistory, Download
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'export.db'}")
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app, app.test_client()
+
+
+def _login(client, email="learner@example.com"):
+    client.post("/api/auth/register", json={"name": "Learner", "email": email, "password": "secret123"})
+    res = client.post("/api/auth/login", json={"email": email, "password": "secret123"})
+    data = res.get_json()
+    return data["user"]["user_id"], {"Authorization": f"Bearer {data['access_token']}"}
+
+
+def test_me_export_streams_chats_with_feedback(tmp_path, monkeypatch):
+    app, client = _client(tmp_path, monkeypatch)
+    user_id, headers = _login(client)
+    with app.app_context():
+        for i in range(3):
+            db.session.add(
+                ChatHistory(
+                    user_id=user_id,
+                    question=f"question {i}",
+                    response="answer, with comma",
+                    response_type="visual",
+                    learning_style_used="visual",
+                )
+            )
+        db.session.flush()
+        db.session.add(ChatFeedback(chat_id=1, user_id=user_id, rating=1, comment="nice"))
+        db.session.commit()
+
+    res = client.get("/api/auth/me/export?dataset=chats&format=csv", headers=headers)
+    assert res.status_code == 200
+    assert res.is_streamed
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert [r["question"] for r in rows] == ["question 0", "question 1", "question 2"]
+    assert rows[0]["response"] == "answer, with comma"
+    assert rows[0]["feedback_rating"] == "1"
+    assert rows[1]["feedback_rating"] == ""
+
+    res = client.get("/api/auth/me/export?dataset=chats&format=ndjson", headers=headers)
+    lines = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert len(lines) == 3
+    assert lines[0]["feedback_comment"] == "nice"
+
+
+def test_me_export_rejects_unknown_dataset(tmp_path, monkeypatch):
+    _, client = _client(tmp_path, monkeypatch)
+    _, headers = _login(client)
+    res = client.get("/api/auth/me/export?dataset=passwords", headers=headers)
+    assert res.status_code == 400
+
+
+def test_downloads_export_links_files_without_server_paths(tmp_path, monkeypatch):
+    app, client = _client(tmp_path, monkeypatch)
+    user_id, headers = _login(client)
+    with app.app_context():
+        db.session.add(Download(user_id=user_id, content_type="solution", file_path="/srv/app/downloads/secret.md"))
+        db.session.commit()
+
+    res = client.get("/api/auth/me/export?dataset=downloads&format=ndjson", headers=headers)
+    (row,) = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert row["download_url"] == f"/api/downloads/file/{row['download_id']}"
+    assert "file_path" not in row and "/srv/app" not in res.get_data(as_text=True)
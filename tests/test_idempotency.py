@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.asgi import AsgiAdapter
+from app.services import idempotency, openai_service
+
+ANSWER = {"choices": [{"message": {"content": "An interface lists methods a class promises to implement."}}]}
+
+
+def _app(tmp_path, monkeypatch, calls: list):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'idempotency.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "idempotency-model")
+
+    async def _asend(url, *, provider, operation, model, expect_json=True, **kwargs):
+        calls.append(operation)
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json=ANSWER), ANSWER
+
+    monkeypatch.setattr(openai_service, "_asend", _asend)
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app
+
+
+def _headers(client) -> dict:
+    client.post("/api/auth/register", json={"name": "I", "email": "i@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "i@example.com", "password": "secret123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/api/style/select", json={"learning_style": "kinesthetic"}, headers=headers)
+    return headers
+
+
+def test_completed_request_is_replayed_without_upstream_calls(tmp_path, monkeypatch):
+    calls = []
+    client = _app(tmp_path, monkeypatch, calls).test_client()
+    headers = {**_headers(client), "Idempotency-Key": "chat-retry-1"}
+    body = {"question": "What is an interface in Java?"}
+
+    first = client.post("/api/chat/", json=body, headers=headers)
+    upstream_calls = len(calls)
+    again = client.post("/api/chat/", json=body, headers=headers)
+
+    assert first.status_code == again.status_code == 200
+    assert upstream_calls > 0 and len(calls) == upstream_calls
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.get_json() == first.get_json()
+    assert len(client.get("/api/chat/history", headers=headers).get_json()) == 1
+    assert len(client.get("/api/downloads/mine", headers=headers).get_json()) == len(first.get_json()["auto_resources"])
+
+    reused = client.post("/api/chat/", json={"question": "Something else"}, headers=headers)
+    assert reused.status_code == 422
+
+
+def test_concurrent_duplicates_wait_for_the_first_result(tmp_path, monkeypatch):
+    calls = []
+    app = _app(tmp_path, monkeypatch, calls)
+    headers = _headers(app.test_client())
+    single = len(calls)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=AsgiAdapter(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        "/api/downloads/",
+                        json={"content_type": "solution", "topic": "interfaces"},
+                        headers={**headers, "Idempotency-Key": "download-retry-1"},
+                    )
+                    for _ in range(3)
+                )
+            )
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({r.json()["download_id"] for r in responses}) == 1
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 2
+    assert len(calls) - single == 1
+
+
+def test_a_database_error_on_the_retry_claim_is_a_503(tmp_path, monkeypatch):
+    calls = []
+    app = _app(tmp_path, monkeypatch, calls)
+    client = app.test_client()
+    headers = _headers(client)
+    claims = []
+
+    def _claim(key_hash, user_id, request_hash):
+        claims.append(key_hash)
+        if len(claims) == 1:
+            return SimpleNamespace(request_hash=request_hash, status="pending")
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    async def _released(key_hash):
+        return None
+
+    monkeypatch.setattr(idempotency, "_claim", _claim)
+    monkeypatch.setattr(idempotency, "_wait_for", _released)
+    single = len(calls)
+    res = client.post(
+        "/api/downloads/",
+        json={"content_type": "solution", "topic": "interfaces"},
+        headers={**headers, "Idempotency-Key": "download-retry-2"},
+    )
+    assert res.status_code == 503
+    assert len(claims) == 2 and len(calls) == single
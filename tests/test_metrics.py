@@ -0,0 +1,124 @@
+import json
+import logging
+
+from app import create_app
+from app.services import metrics
+
+
+def _client(tmp_path, monkeypatch, **env):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'metrics.db'}")
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def test_metrics_exposes_route_histograms(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    client.get("/api/health")
+    res = client.get("/api/metrics")
+    assert res.status_code == 200
+    body = res.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_requests_total{method="GET",route="/api/health",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/health",le="+Inf"}' in body
+
+
+def test_metrics_aggregates_worker_files(tmp_path, monkeypatch):
+    multiproc_dir = tmp_path / "metrics"
+    multiproc_dir.mkdir()
+    # Snapshot left behind by a worker that has since exited.
+    (multiproc_dir / "metrics_999999.json").write_text(
+        json.dumps(
+            {
+                "counters": [["http_requests_total", [["method", "GET"], ["route", "/gone"], ["status", "200"]], 5]],
+                "gauges": [["http_requests_in_flight", [["method", "GET"], ["route", "/gone"]], 3]],
+                "histograms": [],
+                "descriptions": {},
+            }
+        )
+    )
+    client = _client(tmp_path, monkeypatch, METRICS_MULTIPROC_DIR=str(multiproc_dir))
+    body = client.get("/api/metrics").get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/gone",status="200"} 5' in body
+    assert 'http_requests_in_flight{method="GET",route="/gone"}' not in body
+
+
+def test_slow_requests_are_logged(tmp_path, monkeypatch, caplog):
+    client = _client(tmp_path, monkeypatch, SLOW_REQUEST_THRESHOLD_MS="0")
+    with caplog.at_level(logging.WARNING, logger="app.slow_requests"):
+        client.get("/api/ready")
+    assert any("route=/api/ready" in r.getMessage() and "db_ms=" in r.getMessage() for r in caplog.records)
+
+
+def test_server_timing_header_breaks_down_request(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch, SERVER_TIMING_DEBUG_FIELD="1")
+    res = client.get("/api/ready")
+    header = res.headers["Server-Timing"]
+    assert header.startswith("total;dur=")
+    assert "db;dur=" in header
+    names = [row["name"] for row in res.get_json()["_timings"]]
+    assert names[0] == "total"
+    assert "db" in names
+
+
+def test_metrics_fail_closed_in_production_without_token(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch, APP_ENV="production", SECRET_KEY="s" * 32, JWT_SECRET_KEY="j" * 32)
+    assert client.get("/api/metrics").status_code == 403
+
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-me")
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+
+
+def test_metrics_files_track_live_workers(tmp_path, monkeypatch):
+    multiproc_dir = tmp_path / "metrics"
+    client = _client(tmp_path, monkeypatch, METRICS_MULTIPROC_DIR=str(multiproc_dir))
+
+    seen = {}
+
+    @client.application.get("/api/test/in-flight")
+    def _in_flight():
+        # A scrape served by this worker mid-request publishes the in-memory gauge first.
+        seen["body"] = metrics.render_prometheus()
+        seen["files"] = sorted(p.name for p in multiproc_dir.glob("*.json"))
+        return {}
+
+    client.get("/api/test/in-flight")
+    assert 'http_requests_in_flight{method="GET",route="/api/test/in-flight"} 1' in seen["body"]
+    assert all(name.startswith("metrics_") for name in seen["files"])
+
+    for dead in ("metrics_999998_aaaa.json", "metrics_999999_bbbb.json"):
+        (multiproc_dir / dead).write_text(
+            json.dumps(
+                {
+                    "counters": [["http_requests_total", [["method", "GET"], ["route", "/gone"], ["status", "200"]], 2]],
+                    "histograms": [],
+                    "descriptions": {},
+                }
+            )
+        )
+    for _ in range(2):
+        body = client.get("/api/metrics").get_data(as_text=True)
+        assert 'http_requests_total{method="GET",route="/gone",status="200"} 4' in body
+    names = sorted(p.name for p in multiproc_dir.glob("*.json"))
+    assert "metrics_retired.json" in names
+    assert not any(name.startswith(("metrics_99999", "gauges_99999")) for name in names)
+
+
+def test_gauges_are_written_on_the_flush_interval(tmp_path, monkeypatch):
+    multiproc_dir = tmp_path / "metrics"
+    client = _client(tmp_path, monkeypatch, METRICS_MULTIPROC_DIR=str(multiproc_dir), METRICS_FLUSH_SECONDS="60")
+    monkeypatch.setattr(metrics, "_last_flush", 0.0)
+    monkeypatch.setattr(metrics, "_flush_timer", None)
+    writes = []
+    write_json = metrics._write_json
+    monkeypatch.setattr(metrics, "_write_json", lambda target, payload: (writes.append(target.name), write_json(target, payload)))
+
+    for _ in range(20):
+        assert client.get("/api/health").status_code == 200
+    # At most the first change goes straight out; the rest wait for the (deferred) interval flush.
+    assert len(writes) <= 1
+    assert metrics._flush_timer is not None
+    metrics._flush_timer[1].cancel()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import time
+
+import requests
+
+from app.services import model_router, openai_service
+from app.services.provider_telemetry import record_provider_call
+
+
+def _response(status: int, payload: dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = status
+    res._content = json.dumps(payload).encode("utf-8")
+    res.headers["Content-Type"] = "application/json"
+    return res
+
+
+def _seed(operation: str, model: str, seconds: float, count: int = 10) -> None:
+    for _ in range(count):
+        record_provider_call("openai", operation, model, seconds, "ok", status=200)
+
+
+def test_image_models_missing_for_our_key_are_skipped(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_IMAGE_MODEL", "router-image-model,router-backup-model")
+    tried = []
+
+    def _post(url, **kwargs):
+        model = kwargs["json"]["model"]
+        tried.append(model)
+        if model == "router-image-model":
+            return _response(404, {"error": {"code": "model_not_found"}})
+        return _response(200, {"data": [{"url": "https://img.example/x.png"}]})
+
+    monkeypatch.setattr(requests, "post", _post)
+    assert openai_service.generate_image_data_url("loop diagram") == "https://img.example/x.png"
+    assert openai_service.generate_image_data_url("class diagram") == "https://img.example/x.png"
+    assert tried == ["router-image-model", "router-backup-model", "router-backup-model"]
+    assert model_router.is_unavailable("openai", "router-image-model")
+
+
+def test_fastest_healthy_model_is_ranked_first():
+    _seed("chat_text", "rank-slow", 4.0)
+    _seed("chat_text", "rank-fast", 0.5)
+    calls = [{"provider": "openai", "operation": "chat_text", "model": m} for m in ("rank-slow", "rank-fast", "rank-new")]
+    assert [c["model"] for c in model_router.rank(calls)] == ["rank-fast", "rank-slow", "rank-new"]
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "hedge-primary,hedge-alternate")
+    _seed("chat_text", "hedge-primary", 0.05)
+    cancelled = []
+
+    async def _apost(url, **kwargs):
+        if kwargs["model"] == "hedge-primary":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(kwargs["model"])
+                raise
+        return None, {"choices": [{"message": {"content": f"from {kwargs['model']}"}}]}
+
+    monkeypatch.setattr(openai_service, "_apost", _apost)
+    started = time.perf_counter()
+    answer = asyncio.run(openai_service.achatgpt_text("sys", "user"))
+    assert answer == "from hedge-alternate"
+    assert time.perf_counter() - started < 1
+    assert cancelled == ["hedge-primary"]
@@ -0,0 +1,58 @@
+from app import create_app
+from app.extensions import db
+from app.models import User
+from app.services import password_hashing
+
+
+def _client(tmp_path, monkeypatch, method):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'hashing.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", method)
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app, app.test_client()
+
+
+def _stored_method(app, email):
+    with app.app_context():
+        return db.session.query(User.password_hash).filter_by(email=email).scalar().split("$", 1)[0]
+
+
+def test_login_rehashes_when_cost_changes(tmp_path, monkeypatch):
+    app, client = _client(tmp_path, monkeypatch, "pbkdf2:sha256:1000")
+    client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    assert _stored_method(app, "l@example.com") == "pbkdf2:sha256:1000"
+
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:2000")
+    res = client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"})
+    assert res.status_code == 200
+    assert _stored_method(app, "l@example.com") == "pbkdf2:sha256:2000"
+
+    res = client.post("/api/auth/login", json={"email": "l@example.com", "password": "wrong-pass"})
+    assert res.status_code == 401
+
+
+def test_pool_hashes_and_verifies(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "1")
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    try:
+        stored = password_hashing.hash_password("secret123")
+        assert password_hashing.verify_password(stored, "secret123")
+        assert not password_hashing.verify_password(stored, "nope")
+    finally:
+        password_hashing.shutdown_executor()
+
+
+def test_full_hashing_queue_returns_503(tmp_path, monkeypatch):
+    _app, client = _client(tmp_path, monkeypatch, "pbkdf2:sha256:1000")
+
+    def busy(*_args):
+        raise password_hashing.HashingBusyError("full")
+
+    monkeypatch.setattr(password_hashing, "_dispatch", busy)
+    res = client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"})
+    assert res.status_code == 401  # unknown user never reaches the hasher
+
+    res = client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "2"
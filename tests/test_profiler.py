@@ -0,0 +1,61 @@
+from app import create_app
+from app.services import profiler
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'profiler.db'}")
+    monkeypatch.setenv("PROFILING_ENABLED", "1")
+    monkeypatch.setenv("ADMIN_EMAILS", "admin@example.com")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path / "profiles"))
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def _admin_headers(client):
+    client.post("/api/auth/register", json={"name": "Admin", "email": "admin@example.com", "password": "secret123"})
+    res = client.post("/api/auth/login-admin", json={"email": "admin@example.com", "password": "secret123"})
+    return {"Authorization": f"Bearer {res.get_json()['access_token']}"}
+
+
+def test_profiling_session_captures_matching_routes(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    headers = _admin_headers(client)
+    res = client.put(
+        "/api/admin/profiling",
+        json={"sample_rate": 1, "routes": ["/api/health"], "duration_seconds": 60},
+        headers=headers,
+    )
+    assert res.status_code == 200
+
+    client.get("/api/health")
+    client.get("/")
+
+    results = client.get("/api/admin/profiling", headers=headers).get_json()["results"]
+    assert len(results) == 1
+    assert "api-health" in results[0]["name"]
+
+    download = client.get(f"/api/admin/profiling/files/{results[0]['name']}", headers=headers)
+    assert download.status_code == 200
+    assert client.get("/api/admin/profiling/files/..%2Fsettings.json", headers=headers).status_code == 404
+
+    client.delete("/api/admin/profiling", headers=headers)
+    client.get("/api/health")
+    assert len(profiler.list_results()) == 1
+
+
+def test_profile_cap_counts_only_profiles(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    headers = _admin_headers(client)
+    (tmp_path / "profiles").mkdir()
+    (tmp_path / "profiles" / "20240101_1_snapshot.txt").write_text("top allocations")
+    client.put(
+        "/api/admin/profiling",
+        json={"sample_rate": 1, "routes": ["/api/health"], "duration_seconds": 60, "max_profiles": 1},
+        headers=headers,
+    )
+
+    client.get("/api/health")
+    client.get("/api/health")
+    assert [r["name"].endswith(".prof") for r in profiler.list_results()] == [True, False]
+    client.delete("/api/admin/profiling", headers=headers)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import time
+
+import httpx
+import requests
+
+from app.services import openai_service, provider_resilience
+from app.services.chatbot_service import agenerate_adaptive_response
+from app.services.practice_task_service import DEFAULT_TASKS, generate_practice_tasks_from_topic
+
+
+def _response(status: int, payload: dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = status
+    res._content = json.dumps(payload).encode("utf-8")
+    res.headers["Content-Type"] = "application/json"
+    return res
+
+
+def _ok(text: str = "hello") -> requests.Response:
+    return _response(200, {"choices": [{"message": {"content": text}}]})
+
+
+def _env(monkeypatch, model: str) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", model)
+    monkeypatch.setenv("UPSTREAM_COALESCE", "0")
+    monkeypatch.setenv("UPSTREAM_RETRY_BASE_SECONDS", "0")
+
+
+def test_open_breaker_serves_fallbacks_without_calling_upstream(monkeypatch):
+    _env(monkeypatch, "breaker-model")
+    monkeypatch.setenv("PROVIDER_BREAKER_FAILURES", "3")
+    monkeypatch.setenv("PROVIDER_BREAKER_RESET_SECONDS", "0.2")
+    calls = []
+
+    def _timeout(url, **kwargs):
+        calls.append(url)
+        raise requests.Timeout("degraded")
+
+    async def _atimeout(self, url, **kwargs):
+        calls.append(str(url))
+        raise httpx.ReadTimeout("degraded")
+
+    monkeypatch.setattr(requests, "post", _timeout)
+    monkeypatch.setattr(httpx.AsyncClient, "post", _atimeout)
+    for _ in range(3):
+        assert openai_service.chatgpt_text("sys", "user") is None
+    assert provider_resilience.breaker_states()["openai:breaker-model"]["state"] == "open"
+
+    calls.clear()
+    started = time.perf_counter()
+    result = asyncio.run(agenerate_adaptive_response("What is try catch in Java?", "visual"))
+    tasks, source = generate_practice_tasks_from_topic("recursive descent parsers in Java", 3)
+    assert time.perf_counter() - started < 1
+    assert result["ai_used"] is False
+    assert (tasks, source) == (DEFAULT_TASKS[:3], "default")
+    assert not [url for url in calls if url == openai_service.OPENAI_CHAT_COMPLETIONS_URL]
+
+    # Half-open: one probe goes through and a success closes the breaker.
+    time.sleep(0.25)
+    monkeypatch.setattr(requests, "post", lambda url, **kwargs: _ok())
+    assert openai_service.chatgpt_text("sys", "user") == "hello"
+    assert provider_resilience.breaker_states()["openai:breaker-model"]["state"] == "closed"
+
+
+def test_only_429_and_5xx_are_retried(monkeypatch):
+    _env(monkeypatch, "retry-model")
+    statuses = [503, 429]
+
+    def _flaky(url, **kwargs):
+        if statuses:
+            res = _response(statuses.pop(0), {"error": "busy"})
+            res.raise_for_status()
+        return _ok("recovered")
+
+    monkeypatch.setattr(requests, "post", _flaky)
+    assert openai_service.chatgpt_text("sys", "user") == "recovered"
+    assert statuses == []
+
+    calls = []
+
+    def _bad_request(url, **kwargs):
+        calls.append(url)
+        _response(400, {"error": "bad"}).raise_for_status()
+
+    monkeypatch.setattr(requests, "post", _bad_request)
+    assert openai_service.chatgpt_text("sys", "user") is None
+    assert len(calls) == 1
+    assert provider_resilience.breaker_states()["openai:retry-model"]["consecutive_failures"] == 0
+
+
+def test_timeout_follows_observed_p95(monkeypatch):
+    _env(monkeypatch, "adaptive-model")
+    monkeypatch.setenv("UPSTREAM_TIMEOUT_MIN_SAMPLES", "5")
+    monkeypatch.setenv("UPSTREAM_TIMEOUT_FLOOR_SECONDS", "1")
+    timeouts = []
+
+    def _fast(url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return _ok()
+
+    monkeypatch.setattr(requests, "post", _fast)
+    for _ in range(6):
+        openai_service.chatgpt_text("sys", "user")
+    assert timeouts[0] == 25
+    assert timeouts[-1] == 1
+
+
+def test_timeouts_grow_the_timeout_back_and_probes_get_the_configured_one(monkeypatch):
+    _env(monkeypatch, "slowing-model")
+    monkeypatch.setenv("UPSTREAM_TIMEOUT_MIN_SAMPLES", "5")
+    monkeypatch.setenv("UPSTREAM_TIMEOUT_FLOOR_SECONDS", "1")
+    monkeypatch.setenv("PROVIDER_BREAKER_FAILURES", "1000")
+    timeouts = []
+
+    def _fast(url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return _ok()
+
+    def _slow(url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        raise requests.Timeout("slow")
+
+    monkeypatch.setattr(requests, "post", _fast)
+    for _ in range(30):
+        openai_service.chatgpt_text("sys", "user")
+    assert timeouts[-1] == 1
+
+    # The provider got slower for good: every tightened timeout fails, so the timeout climbs back.
+    monkeypatch.setattr(requests, "post", _slow)
+    for _ in range(20):
+        openai_service.chatgpt_text("sys", "user")
+    assert timeouts[-1] == 25
+
+    monkeypatch.setenv("OPENAI_MODEL", "probed-model")
+    monkeypatch.setattr(requests, "post", _fast)
+    for _ in range(30):
+        openai_service.chatgpt_text("sys", "user")
+    assert timeouts[-1] == 1
+    monkeypatch.setenv("PROVIDER_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("PROVIDER_BREAKER_RESET_SECONDS", "0.05")
+    monkeypatch.setattr(requests, "post", _slow)
+    openai_service.chatgpt_text("sys", "user")
+    assert provider_resilience.breaker_states()["openai:probed-model"]["state"] == "open"
+
+    time.sleep(0.1)
+    timeouts.clear()
+    monkeypatch.setattr(requests, "post", _fast)
+    assert openai_service.chatgpt_text("sys", "user") == "hello"
+    assert timeouts[0] == 25
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import httpx
+import requests
+
+from app.services import openai_service
+from app.services.chatbot_service import agenerate_adaptive_response
+from app.services.provider_telemetry import last_failure_reason, provider_report, set_failure_reason
+
+
+def _response(status: int, payload: dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = status
+    res._content = json.dumps(payload).encode("utf-8")
+    res.headers["Content-Type"] = "application/json"
+    res.url = openai_service.OPENAI_CHAT_COMPLETIONS_URL
+    return res
+
+
+def _row(report, operation, model):
+    return next(r for r in report["providers"] if r["operation"] == operation and r["model"] == model)
+
+
+def test_chat_call_records_usage_and_bytes(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "telemetry-model")
+    payload = {
+        "choices": [{"message": {"content": "hello"}}],
+        "usage": {"prompt_tokens": 12, "completion_tokens": 30, "total_tokens": 42},
+    }
+    monkeypatch.setattr(requests, "post", lambda *a, **k: _response(200, payload))
+
+    assert openai_service.chatgpt_text("sys", "user") == "hello"
+    row = _row(provider_report(), "chat_text", "telemetry-model")
+    assert row["calls"] >= 1
+    assert row["tokens"] >= 42
+    assert row["response_bytes"] > 0
+    assert row["statuses"].get("200")
+
+
+def test_failed_call_records_fallback_reason(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "failing-model")
+
+    async def _timeout(self, url, **kwargs):
+        raise httpx.ReadTimeout("slow upstream")
+
+    monkeypatch.setattr(httpx.AsyncClient, "post", _timeout)
+    result = asyncio.run(agenerate_adaptive_response("What is try catch in Java?", "auditory"))
+    assert result["ai_used"] is False
+
+    report = provider_report()
+    assert _row(report, "chat_text", "failing-model")["timeouts"] >= 1
+    assert report["fallbacks"]["explanation"].get("timeout", 0) >= 1
+
+
+def test_failure_reason_is_cleared_for_each_call(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "fresh-model")
+    monkeypatch.setattr(requests, "post", lambda *a, **k: _response(200, {"choices": [{"message": {"content": "ok"}}]}))
+
+    set_failure_reason("timeout")
+    assert openai_service.chatgpt_text("sys", "user") == "ok"
+    assert last_failure_reason() == "unknown"
@@ -0,0 +1,87 @@
+import logging
+
+from app import create_app
+from app.extensions import db
+from app.models import ChatHistory, User
+from app.services.query_inspector import capture_queries
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'budgets.db'}")
+    monkeypatch.setenv("ADMIN_EMAILS", "admin@example.com")
+    # Keep the periodic claims/revocation cache refreshes out of the measured requests.
+    monkeypatch.setenv("CLAIMS_REFRESH_SECONDS", "300")
+    monkeypatch.setenv("REVOCATION_REFRESH_SECONDS", "300")
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app, app.test_client()
+
+
+def _login(client, email, admin=False):
+    client.post("/api/auth/register", json={"name": email.split("@")[0], "email": email, "password": "secret123"})
+    path = "/api/auth/login-admin" if admin else "/api/auth/login"
+    res = client.post(path, json={"email": email, "password": "secret123"})
+    return {"Authorization": f"Bearer {res.get_json()['access_token']}"}
+
+
+def test_admin_users_query_count_is_independent_of_user_count(tmp_path, monkeypatch, assert_max_queries):
+    app, client = _client(tmp_path, monkeypatch)
+    headers = _login(client, "admin@example.com", admin=True)
+    for i in range(12):
+        _login(client, f"learner{i}@example.com")
+    client.get("/api/auth/me", headers=headers)  # first authenticated request loads the revocation cache
+
+    with assert_max_queries(6):
+        res = client.get("/api/admin/users", headers=headers)
+    assert res.status_code == 200
+    assert len(res.get_json()) == 13
+
+
+def test_learner_read_routes_stay_within_budget(tmp_path, monkeypatch, assert_max_queries):
+    app, client = _client(tmp_path, monkeypatch)
+    headers = _login(client, "learner@example.com")
+    client.post("/api/style/select", json={"learning_style": "visual"}, headers=headers)
+    with app.app_context():
+        user = User.query.filter_by(email="learner@example.com").first()
+        for i in range(10):
+            db.session.add(
+                ChatHistory(user_id=user.user_id, question=f"q{i}", response="a", response_type="visual", learning_style_used="visual")
+            )
+        db.session.commit()
+
+    with assert_max_queries(2):
+        assert client.get("/api/chat/history", headers=headers).status_code == 200
+    with assert_max_queries(3):
+        assert client.get("/api/dashboard/insights", headers=headers).status_code == 200
+    with assert_max_queries(1):
+        assert client.get("/api/style/mine", headers=headers).status_code == 200
+
+
+def test_repeated_statements_are_reported(tmp_path, monkeypatch, caplog):
+    app, client = _client(tmp_path, monkeypatch)
+    monkeypatch.setenv("N_PLUS_ONE_THRESHOLD", "3")
+
+    @app.get("/api/test-n-plus-one")
+    def n_plus_one():
+        for user_id in range(4):
+            db.session.get(User, user_id + 1)
+        return {"ok": True}
+
+    with caplog.at_level(logging.WARNING, logger="app.queries"):
+        with capture_queries() as statements:
+            client.get("/api/test-n-plus-one")
+    assert len(statements) == 4
+    assert any("possible N+1 route=/api/test-n-plus-one repeats=4" in r.getMessage() for r in caplog.records)
+
+
+def test_async_route_budget_counts_queries_run_on_worker_threads(tmp_path, monkeypatch, assert_max_queries):
+    app, client = _client(tmp_path, monkeypatch)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    headers = _login(client, "learner@example.com")
+    client.post("/api/style/select", json={"learning_style": "visual"}, headers=headers)
+
+    # The chat view does all of its database work through asyncio.to_thread.
+    with assert_max_queries(9) as statements:
+        res = client.post("/api/chat/", json={"question": "How do I reverse a list in Java?"}, headers=headers)
+    assert res.status_code == 200
+    assert any(s.startswith("INSERT INTO chat_history") for s in statements)
@@ -0,0 +1,136 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+
+from app import create_app
+from app.extensions import db
+from app.migrations import available_migrations, run_migrations
+from app.models import ChatFeedback, ChatHistory
+from app.services.query_inspector import capture_queries
+
+HOT_TABLES = ("chat_history", "downloads", "practice_activity", "chat_feedback")
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'plans.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    app = create_app()
+    app.config.update(TESTING=True)
+    client = app.test_client()
+    client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    res = client.post("/api/style/select", json={"learning_style": "kinesthetic"}, headers=headers)
+    return app, client, {"Authorization": f"Bearer {res.headers['X-Access-Token']}"}
+
+
+def _plan(app, statement: str) -> list[str]:
+    with app.app_context():
+        conn = db.engine.raw_connection()
+        try:
+            # The plan does not depend on parameter values, so bind NULLs.
+            rows = conn.cursor().execute("EXPLAIN QUERY PLAN " + statement, [None] * statement.count("?")).fetchall()
+            return [row[-1] for row in rows]
+        finally:
+            conn.close()
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/api/chat/history", "/api/downloads/mine", "/api/practice/mine", "/api/dashboard/insights", "/api/practice/tasks"],
+)
+def test_hot_learner_queries_use_indexes(tmp_path, monkeypatch, path):
+    app, client, headers = _client(tmp_path, monkeypatch)
+    with capture_queries() as statements:
+        assert client.get(path, headers=headers).status_code == 200
+
+    checked = 0
+    for statement in statements:
+        if not statement.lstrip().upper().startswith("SELECT") or not any(t in statement for t in HOT_TABLES):
+            continue
+        plan = _plan(app, statement)
+        checked += 1
+        for step in plan:
+            assert not (step.startswith("SCAN ") and any(t in step for t in HOT_TABLES)), f"{path}: {step}\n{statement}"
+            assert "TEMP B-TREE FOR ORDER BY" not in step, f"{path}: {step}\n{statement}"
+    assert checked, f"{path} ran no queries against hot tables"
+
+
+def test_migration_upgrades_an_existing_database(tmp_path, monkeypatch):
+    path = tmp_path / "legacy.db"
+    # A database from before migrations: tables without composite indexes and duplicate feedback.
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE chat_feedback (feedback_id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL, comment VARCHAR(600), created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL);
+        INSERT INTO chat_feedback VALUES (1, 7, 1, -1, NULL, '2024-01-01', '2024-01-01');
+        INSERT INTO chat_feedback VALUES (2, 7, 1, 1, 'better', '2024-01-02', '2024-01-02');
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{path}")
+    app = create_app()
+    with app.app_context():
+        rows = db.session.execute(db.text("SELECT feedback_id, rating FROM chat_feedback")).all()
+        assert [tuple(r) for r in rows] == [(2, 1)]
+        index_names = {r[1] for r in db.session.execute(db.text("PRAGMA index_list('chat_history')"))}
+        assert "ix_chat_history_user_timestamp" in index_names
+        versions = db.session.execute(db.text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+        assert versions == [version for version, _name, _module in available_migrations()]
+        assert db.session.query(ChatHistory).count() == 0
+
+
+def test_concurrent_first_feedback_updates_instead_of_failing(tmp_path, monkeypatch):
+    app, client, headers = _client(tmp_path, monkeypatch)
+    with app.app_context():
+        chat = ChatHistory(user_id=1, question="q", response="a", response_type="text", learning_style_used="kinesthetic")
+        db.session.add(chat)
+        db.session.commit()
+        chat_id = chat.chat_id
+
+    raced = []
+
+    def _rival_rates_first(session, _context, _instances):
+        # Another request commits the first rating between our lookup and our INSERT.
+        if raced or not any(isinstance(obj, ChatFeedback) for obj in session.new):
+            return
+        raced.append(True)
+        with db.engine.begin() as conn:
+            conn.execute(
+                ChatFeedback.__table__.insert().values(
+                    chat_id=chat_id, user_id=1, rating=-1, created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+                )
+            )
+
+    event.listen(db.session, "before_flush", _rival_rates_first)
+    try:
+        res = client.post("/api/chat/feedback", json={"chat_id": chat_id, "rating": 1}, headers=headers)
+    finally:
+        event.remove(db.session, "before_flush", _rival_rates_first)
+    assert raced and res.status_code == 200
+    with app.app_context():
+        assert [row.rating for row in ChatFeedback.query.filter_by(chat_id=chat_id)] == [1]
+
+
+def test_migrations_create_every_model_column(tmp_path, monkeypatch):
+    # Migrations no longer read the models, so a model change without a migration must fail here.
+    app, _client_, _headers = _client(tmp_path, monkeypatch)
+    with app.app_context():
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            assert set(table.columns.keys()) <= columns, table.name
+
+
+def test_concurrent_boots_migrate_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _i: run_migrations(engine), range(4)))
+    assert sorted(v for applied in results for v in applied) == [v for v, _n, _m in available_migrations()]
+    engine.dispose()
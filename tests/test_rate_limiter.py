@@ -0,0 +1,111 @@
+import asyncio
+import fcntl
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services import openai_service, rate_limiter
+from app.services.provider_telemetry import last_failure_reason
+
+
+class _StubProvider(BaseHTTPRequestHandler):
+    hits: list[str] = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        _StubProvider.hits.append(body["model"])
+        payload = json.dumps({"choices": [{"message": {"content": "stub answer"}}], "usage": {"total_tokens": 40}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def _limits(tmp_path, monkeypatch, limits: str, burst_seconds: str) -> None:
+    monkeypatch.setenv("UPSTREAM_RATE_DIR", str(tmp_path))
+    monkeypatch.setenv("UPSTREAM_RATE_LIMITS", limits)
+    monkeypatch.setenv("UPSTREAM_RATE_BURST_SECONDS", burst_seconds)
+
+
+def test_calls_to_the_stub_provider_are_paced(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "stub-model")
+    # 240 rpm with half a second of burst: two calls at once, then one every 250 ms.
+    _limits(tmp_path, monkeypatch, "openai:stub-model=240rpm/100000tpm,openai:tiny-model=1rpm", "0.5")
+    _StubProvider.hits = []
+
+    started = time.perf_counter()
+    answers = [openai_service.chatgpt_text("sys", f"question {i}") for i in range(6)]
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    assert answers == ["stub answer"] * 6
+    assert _StubProvider.hits == ["stub-model"] * 6
+    assert 0.9 < elapsed < 3
+
+    # An interactive call that would wait past its limit falls back instead of queueing.
+    monkeypatch.setenv("UPSTREAM_RATE_BURST_SECONDS", "60")
+    rate_limiter.acquire("openai", "tiny-model", 10)
+    started = time.perf_counter()
+    monkeypatch.setenv("OPENAI_MODEL", "tiny-model")
+    assert openai_service.chatgpt_text("sys", "one more") is None
+    assert last_failure_reason() == "rate_limited"
+    assert time.perf_counter() - started < 0.5
+
+
+def test_lower_priorities_queue_behind_interactive_calls(tmp_path, monkeypatch):
+    _limits(tmp_path, monkeypatch, "openai:queue-model=240rpm", "0.5")
+    rate_limiter.acquire("openai", "queue-model", 10)
+    rate_limiter.acquire("openai", "queue-model", 10)
+    finished = []
+
+    def call(name):
+        with rate_limiter.priority(name):
+            rate_limiter.acquire("openai", "queue-model", 10)
+        finished.append(name)
+
+    threads = [threading.Thread(target=call, args=(name,)) for name in ("background", "interactive")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert finished == ["interactive", "background"]
+
+
+def test_async_waiters_queue_in_order_without_blocking_the_loop(tmp_path, monkeypatch):
+    _limits(tmp_path, monkeypatch, "openai:fifo-model=240rpm", "0.5")
+    rate_limiter.acquire("openai", "fifo-model", 10)
+    rate_limiter.acquire("openai", "fifo-model", 10)
+    finished, ticks = [], []
+
+    async def call(name):
+        with rate_limiter.priority("downloads"):
+            await rate_limiter.aacquire("openai", "fifo-model", 10)
+        finished.append(name)
+
+    async def tick():
+        while len(finished) < 3:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        # Another worker holds the bucket file for a while; the loop must keep running meanwhile.
+        with open(tmp_path / "openai_fifo-model.json", "a+") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            tasks = [asyncio.create_task(call(name)) for name in ("first", "second", "third")]
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0.3)
+            fcntl.flock(held, fcntl.LOCK_UN)
+        await asyncio.wait_for(asyncio.gather(*tasks, ticker), 5)
+
+    asyncio.run(main())
+    assert finished == ["first", "second", "third"]
+    assert len([t for t in ticks if t - ticks[0] < 0.3]) > 10
@@ -0,0 +1,49 @@
+from app import create_app
+from app.extensions import db
+from app.models import ChatHistory
+
+
+def _client(tmp_path, monkeypatch, create_replica_schema=True):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setenv("REPLICA_STICKY_DIR", str(tmp_path / "sticky"))
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    app = create_app()
+    app.config.update(TESTING=True)
+    client = app.test_client()
+    client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"}).get_json()["access_token"]
+
+    with app.app_context():
+        targets = [(db.engine, "from primary")]
+        if create_replica_schema:
+            db.metadata.create_all(db.engines["replica_0"])
+            targets.append((db.engines["replica_0"], "from replica"))
+        # Same user id on both sides, different content, so the answer shows which database served it.
+        for engine, question in targets:
+            with engine.begin() as conn:
+                conn.execute(
+                    ChatHistory.__table__.insert(),
+                    {"user_id": 1, "question": question, "response": "r", "response_type": "text", "learning_style_used": "visual"},
+                )
+    return client, {"Authorization": f"Bearer {token}"}
+
+
+def _questions(client, headers):
+    res = client.get("/api/chat/history", headers=headers)
+    assert res.status_code == 200
+    return [row["question"] for row in res.get_json()]
+
+
+def test_reads_go_to_replica_until_the_user_writes(tmp_path, monkeypatch):
+    client, headers = _client(tmp_path, monkeypatch)
+    assert _questions(client, headers) == ["from replica"]
+
+    client.post("/api/style/select", json={"learning_style": "visual"}, headers=headers)
+    assert _questions(client, headers) == ["from primary"]  # read-your-writes window
+
+
+def test_unhealthy_replica_falls_back_to_primary(tmp_path, monkeypatch):
+    client, headers = _client(tmp_path, monkeypatch, create_replica_schema=False)
+    assert _questions(client, headers) == ["from primary"]
+    assert _questions(client, headers) == ["from primary"]
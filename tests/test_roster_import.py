@@ -0,0 +1,79 @@
+import time
+
+from app import create_app
+from app.extensions import db
+from app.models import LearningStyle, User
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'roster.db'}")
+    monkeypatch.setenv("ADMIN_EMAILS", "admin@example.com")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("PASSWORD_HASH_BULK_WORKERS", "2")
+    monkeypatch.setenv("ROSTER_IMPORT_HASH_METHOD", "pbkdf2:sha256:1000")
+    app = create_app()
+    app.config.update(TESTING=True)
+    client = app.test_client()
+    client.post("/api/auth/register", json={"name": "Admin", "email": "admin@example.com", "password": "secret123"})
+    res = client.post("/api/auth/login-admin", json={"email": "admin@example.com", "password": "secret123"})
+    return app, client, {"Authorization": f"Bearer {res.get_json()['access_token']}"}
+
+
+def _finished(client, headers, res) -> dict:
+    assert res.status_code == 202
+    url = res.headers["Location"]
+    for _ in range(200):
+        job = client.get(url, headers=headers).get_json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"import still {job['status']}")
+
+
+def test_csv_roster_import_reports_each_row(tmp_path, monkeypatch, assert_max_queries):
+    monkeypatch.setenv("ROSTER_IMPORT_BATCH_ROWS", "2")
+    app, client, headers = _client(tmp_path, monkeypatch)
+    client.post("/api/auth/register", json={"name": "Old", "email": "old@example.com", "password": "secret123"})
+    roster = "\n".join(
+        [
+            "name,email,password,learning_style",
+            "Ada,ada@example.com,secret123,visual",
+            "Bo,BO@example.com,secret123,",
+            "Cy,ada@example.com,secret123,auditory",
+            "Old,old@example.com,secret123,",
+            "Dee,dee@example.com,short,",
+            "Eve,eve@example.com,secret123,musical",
+        ]
+    )
+
+    # The request only validates and queues; the rows are written by the job.
+    with assert_max_queries(4):
+        res = client.post("/api/admin/users/import", data=roster, headers=dict(headers, **{"Content-Type": "text/csv"}))
+    body = _finished(client, headers, res)
+    assert body["status"] == "done" and body["processed"] == 6
+    assert body["summary"] == {"created": 2, "duplicate": 2, "invalid": 2, "total": 6}
+    assert [row["status"] for row in body["rows"]] == ["created", "created", "duplicate", "duplicate", "invalid", "invalid"]
+
+    with app.app_context():
+        ada = User.query.filter_by(email="ada@example.com").one()
+        assert db.session.get(LearningStyle, ada.user_id).learning_style == "visual"
+        assert db.session.get(LearningStyle, body["rows"][1]["user_id"]) is None
+
+        # The job upgrades bulk-method hashes itself, whether or not the student ever logs in.
+        assert not User.query.filter_by(email="bo@example.com").one().password_hash.startswith("pbkdf2:sha256:1000$")
+    res = client.post("/api/auth/login", json={"email": "bo@example.com", "password": "secret123"})
+    assert res.status_code == 200
+
+
+def test_json_roster_import_requires_admin_and_valid_payload(tmp_path, monkeypatch):
+    _app, client, headers = _client(tmp_path, monkeypatch)
+    res = client.post("/api/admin/users/import", json={"students": "nope"}, headers=headers)
+    assert res.status_code == 400
+
+    res = client.post(
+        "/api/admin/users/import",
+        json=[{"name": "Ada", "email": "ada@example.com", "password": "secret123", "learning_style": "kinesthetic"}],
+        headers=headers,
+    )
+    assert _finished(client, headers, res)["rows"][0]["learning_style"] == "kinesthetic"
+    assert client.get("/api/admin/users/import/unknown", headers=headers).status_code == 404
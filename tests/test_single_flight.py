@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.services import openai_service, single_flight
+from app.services.provider_telemetry import provider_report
+
+
+def _response(payload: dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = 200
+    res._content = json.dumps(payload).encode("utf-8")
+    res.headers["Content-Type"] = "application/json"
+    return res
+
+
+def test_identical_concurrent_calls_share_one_upstream_request(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_COALESCE_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "coalesce-model")
+    calls = []
+
+    def _slow_post(url, **kwargs):
+        calls.append(kwargs["json"])
+        time.sleep(0.3)
+        return _response({"choices": [{"message": {"content": "shared answer"}}]})
+
+    monkeypatch.setattr(requests, "post", _slow_post)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        answers = list(pool.map(lambda _: openai_service.chatgpt_text("sys", "What is a loop?"), range(8)))
+    assert answers == ["shared answer"] * 8
+    assert len(calls) == 1
+
+    # A different prompt is a different fingerprint.
+    assert openai_service.chatgpt_text("sys", "What is a class?") == "shared answer"
+    assert len(calls) == 2
+
+    coalescing = provider_report()["coalescing"]["chat_text"]
+    assert coalescing["process"] >= 7
+    assert 0 < coalescing["dedup_ratio"] < 1
+
+
+def test_workers_share_results_through_the_lock_file(tmp_path, monkeypatch):
+    # Each leader opens its own lock handle, so two threads contend on flock exactly like two workers.
+    monkeypatch.setenv("UPSTREAM_COALESCE_DIR", str(tmp_path))
+    calls, scopes = [], []
+    leader_started = threading.Event()
+
+    def call():
+        calls.append(1)
+        leader_started.set()
+        time.sleep(0.3)
+        return b"tts-audio"
+
+    def worker():
+        return single_flight._run_leader("speech-key", call, lambda body: body, lambda body: body, scopes.append)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(worker)
+        leader_started.wait(1)
+        second = pool.submit(worker)
+        assert first.result() == second.result() == b"tts-audio"
+    assert len(calls) == 1
+    assert scopes == ["worker"]
+    # The leader removed its lock file; only the short-lived result remains.
+    assert [p.suffix for p in tmp_path.iterdir()] == [".result"]
+
+
+def test_abandoned_lock_files_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_COALESCE_DIR", str(tmp_path))
+    monkeypatch.setattr(single_flight, "_next_prune", 0.0)
+    abandoned = tmp_path / "crashed-worker.lock"
+    abandoned.touch()
+    old = time.time() - single_flight.RESULT_TTL_SECONDS - 5
+    os.utime(abandoned, (old, old))
+
+    single_flight._run_leader("fresh-key", lambda: b"ok", lambda body: body, lambda body: body, lambda scope: None)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["fresh-key.result"]
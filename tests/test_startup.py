@@ -0,0 +1,50 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import inspect
+
+from app import create_app
+from app.database import dispose_engines
+from app.extensions import db
+from app.migrations import available_migrations, migrate_from_env
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+
+
+def _production_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_ENV", "production")
+    monkeypatch.setenv("SECRET_KEY", "test-secret-key")
+    monkeypatch.setenv("JWT_SECRET_KEY", "test-jwt-secret-key")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'prod.db'}")
+    monkeypatch.delenv("MIGRATE_ON_STARTUP", raising=False)
+
+
+def test_production_boot_leaves_schema_to_the_migration_step(tmp_path, monkeypatch):
+    _production_env(tmp_path, monkeypatch)
+    app = create_app()
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+
+    assert migrate_from_env() == [version for version, _name, _module in available_migrations()]
+    assert migrate_from_env() == []
+    with app.app_context():
+        assert "users" in inspect(db.engine).get_table_names()
+    assert app.test_client().get("/api/ready").status_code == 200
+
+
+def test_dispose_engines_gives_the_child_a_fresh_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'fork.db'}")
+    app = create_app()
+    with app.app_context():
+        inherited = db.engine.pool
+    dispose_engines(app)
+    with app.app_context():
+        assert db.engine.pool is not inherited
+
+
+def test_boot_does_not_import_provider_clients(tmp_path):
+    script = "import sys; from app import create_app; create_app(); print('requests' in sys.modules)"
+    env = {"PATH": "", "DATABASE_URL": f"sqlite:///{tmp_path / 'lazy.db'}"}
+    out = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
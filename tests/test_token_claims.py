@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import ClaimsVersion
+from app.services import token_claims
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'claims.db'}")
+    monkeypatch.setenv("CLAIMS_REFRESH_SECONDS", "60")
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def _login(client, email="learner@example.com"):
+    client.post("/api/auth/register", json={"name": "Learner", "email": email, "password": "secret123"})
+    res = client.post("/api/auth/login", json={"email": email, "password": "secret123"})
+    return res.get_json()["access_token"]
+
+
+def test_style_guard_uses_claims_without_db_lookup(tmp_path, monkeypatch, assert_max_queries):
+    client = _client(tmp_path, monkeypatch)
+    token = _login(client)
+    res = client.post(
+        "/api/style/select",
+        json={"learning_style": "kinesthetic"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    refreshed = res.headers["X-Access-Token"]
+
+    with assert_max_queries(0):
+        res = client.get("/api/practice/topics", headers={"Authorization": f"Bearer {refreshed}"})
+    assert res.status_code == 200
+
+
+def test_stale_claims_fall_back_to_db_and_reissue(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    token = _login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    res = client.post("/api/style/select", json={"learning_style": "kinesthetic"}, headers=headers)
+    kinesthetic_token = res.headers["X-Access-Token"]
+
+    client.post(
+        "/api/style/select",
+        json={"learning_style": "visual"},
+        headers={"Authorization": f"Bearer {kinesthetic_token}"},
+    )
+    # The kinesthetic token is now outdated: the guard must see the new style.
+    res = client.get("/api/practice/topics", headers={"Authorization": f"Bearer {kinesthetic_token}"})
+    assert res.status_code == 403
+    assert res.headers.get("X-Access-Token")
+
+
+def test_bump_committed_long_after_its_timestamp_is_still_seen(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    _login(client)
+    with client.application.app_context():
+        token_claims._next_refresh = 0.0
+        token_claims._refresh_versions()
+        # Stamped 30 s ago but only committed now, after this worker's last refresh.
+        db.session.add(ClaimsVersion(user_id=999, version=3, updated_at=datetime.utcnow() - timedelta(seconds=30)))
+        db.session.commit()
+        token_claims._next_refresh = 0.0
+        token_claims._refresh_versions()
+        assert token_claims._versions[999] == 3
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import decode_token
+
+from app import create_app
+from app.extensions import db
+from app.models import PasswordResetToken, RevokedToken, User
+from app.services import token_revocation
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'revocation.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app, app.test_client()
+
+
+def _login(client, email="learner@example.com", password="secret123"):
+    client.post("/api/auth/register", json={"name": "Learner", "email": email, "password": password})
+    res = client.post("/api/auth/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {res.get_json()['access_token']}"}
+
+
+def test_logout_revokes_only_that_token(tmp_path, monkeypatch):
+    _app, client = _client(tmp_path, monkeypatch)
+    first = _login(client)
+    second = _login(client)
+
+    assert client.post("/api/auth/logout", headers=first).status_code == 200
+    res = client.get("/api/auth/me", headers=first)
+    assert res.status_code == 401
+    assert res.get_json() == {"error": "token has been revoked"}
+    assert client.get("/api/auth/me", headers=second).status_code == 200
+
+
+def test_password_reset_invalidates_earlier_tokens(tmp_path, monkeypatch):
+    app, client = _client(tmp_path, monkeypatch)
+    headers = _login(client)
+    with app.app_context():
+        user = User.query.filter_by(email="learner@example.com").one()
+        reset = PasswordResetToken.create_for_user(user.user_id)
+        db.session.add(reset)
+        db.session.commit()
+        reset_token = reset.token
+
+    res = client.post("/api/auth/reset-password", json={"token": reset_token, "new_password": "newsecret1"})
+    assert res.status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+    fresh = _login(client, password="newsecret1")
+    assert client.get("/api/auth/me", headers=fresh).status_code == 200
+
+
+def test_other_workers_pick_up_revocations_from_the_db(tmp_path, monkeypatch):
+    _app, client = _client(tmp_path, monkeypatch)
+    headers = _login(client)
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+
+    # Simulate a worker that never saw the logout: empty cache, refresh due.
+    token_revocation._revoked.clear()
+    token_revocation._last_refresh = None
+    token_revocation._next_refresh = 0.0
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_a_revocation_committed_long_after_its_timestamp_is_still_seen(tmp_path, monkeypatch):
+    app, client = _client(tmp_path, monkeypatch)
+    headers = _login(client)
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    # Another worker stamped the revocation 30s ago but its commit waited out a busy database.
+    with app.app_context():
+        payload = decode_token(headers["Authorization"].split()[1])
+        now = datetime.utcnow()
+        db.session.add(
+            RevokedToken(
+                jti=payload["jti"],
+                user_id=int(payload["sub"]),
+                expires_at=now + timedelta(hours=1),
+                revoked_at=now - timedelta(seconds=30),
+            )
+        )
+        db.session.commit()
+    token_revocation._next_refresh = 0.0
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
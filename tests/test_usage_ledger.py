@@ -0,0 +1,125 @@
+import asyncio
+from collections import Counter
+from datetime import timedelta
+
+import httpx
+from sqlalchemy import event
+
+from app import create_app
+from app.services import usage_ledger
+
+ANSWER = {
+    "choices": [{"message": {"content": "A HashMap stores key/value pairs and looks keys up by their hash."}}],
+    "usage": {"total_tokens": 120},
+}
+
+
+def _client(tmp_path, monkeypatch, calls: list):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'usage.db'}")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_MODEL", "usage-model")
+    monkeypatch.setenv("ADMIN_EMAILS", "admin@example.com")
+
+    async def _post(self, url, **kwargs):
+        calls.append(kwargs["json"]["model"])
+        return httpx.Response(200, json=ANSWER, request=httpx.Request("POST", url))
+
+    monkeypatch.setattr(httpx.AsyncClient, "post", _post)
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def _login(client, email: str) -> dict:
+    client.post("/api/auth/register", json={"name": email.split("@")[0], "email": email, "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": email, "password": "secret123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/api/style/select", json={"learning_style": "auditory"}, headers=headers)
+    return headers
+
+
+def test_usage_is_charged_per_user_and_reported(tmp_path, monkeypatch):
+    calls = []
+    client = _client(tmp_path, monkeypatch, calls)
+    heavy, light, admin = (_login(client, e) for e in ("heavy@example.com", "light@example.com", "admin@example.com"))
+
+    for question in ("What is a HashMap?", "What is a TreeMap?"):
+        assert client.post("/api/chat/", json={"question": question}, headers=heavy).status_code == 200
+    assert client.get("/api/chat/suggestions?topic=maps", headers=light).status_code == 200
+
+    report = client.get("/api/admin/usage?days=1", headers=admin).get_json()
+    assert [u["email"] for u in report["users"]] == ["heavy@example.com", "light@example.com"]
+    heavy_row, light_row = report["users"]
+    assert heavy_row["tokens"] > light_row["tokens"] > 0
+    assert heavy_row["tokens"] % 120 == 0
+    assert heavy_row["tts_chars"] > 0 and light_row["tts_chars"] == 0
+    assert client.get("/api/admin/usage", headers=heavy).status_code == 403
+
+
+def test_users_over_quota_get_fallback_content_without_upstream_calls(tmp_path, monkeypatch):
+    calls = []
+    client = _client(tmp_path, monkeypatch, calls)
+    headers = _login(client, "quota@example.com")
+
+    first = client.post("/api/chat/", json={"question": "What is a HashMap?"}, headers=headers).get_json()
+    assert first["ai_used"] is True and "quota_exceeded" not in first
+    made = calls.count("usage-model")
+    # The first answer alone spent 120+ tokens.
+    monkeypatch.setenv("USAGE_QUOTA_TOKENS_PER_DAY", "100")
+
+    second = client.post("/api/chat/", json={"question": "What is a TreeMap?"}, headers=headers).get_json()
+    assert second["quota_exceeded"] is True
+    assert second["ai_used"] is False and second["text"]
+    # TTS has its own quota, so only the chat calls stop.
+    assert calls.count("usage-model") == made
+
+    # Other users keep their own budget. The answer and the practice tasks may be charged in
+    # either order, so leave room for both; the first user has already spent 240.
+    monkeypatch.setenv("USAGE_QUOTA_TOKENS_PER_DAY", "200")
+    other = client.post("/api/chat/", json={"question": "What is a TreeMap?"}, headers=_login(client, "other@example.com"))
+    assert other.get_json()["ai_used"] is True
+
+
+def test_flushes_add_to_the_day_row(tmp_path, monkeypatch):
+    calls = []
+    client = _client(tmp_path, monkeypatch, calls)
+    with client.application.app_context():
+        for _ in range(2):
+            with usage_ledger.usage_scope(42):
+                usage_ledger.record("chat_text", None, 50)
+                usage_ledger.record("tts", {"input": "hello"}, 0)
+            usage_ledger.flush()
+        with usage_ledger.usage_scope(42) as scope:
+            assert usage_ledger.used_today(scope.engine, 42) == {"tokens": 100, "tts_chars": 10, "images": 0}
+
+
+def _on_a_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def test_async_calls_read_the_ledger_off_the_loop_and_old_days_are_evicted(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch, [])
+    monkeypatch.setenv("USAGE_QUOTA_TOKENS_PER_DAY", "1000")
+    monkeypatch.setattr(usage_ledger, "_next_sweep", 0.0)
+    reads = []
+    with client.application.app_context(), usage_ledger.usage_scope(7) as scope:
+        yesterday = (scope.engine, 7, usage_ledger._today() - timedelta(days=1))
+        usage_ledger._cached[yesterday] = (float("inf"), Counter(tokens=5))
+        listener = lambda *args: reads.append(_on_a_loop())  # noqa: E731
+        event.listen(scope.engine, "before_cursor_execute", listener)
+        try:
+
+            async def call():
+                await usage_ledger.aprefetch("chat_text", None)
+                usage_ledger.check_quota("chat_text", None, 10)
+
+            asyncio.run(call())
+        finally:
+            event.remove(scope.engine, "before_cursor_execute", listener)
+    assert reads == [False]
+    assert yesterday not in usage_ledger._cached
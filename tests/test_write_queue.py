@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from app.extensions import db
+from app.models import PracticeActivity, User
+from app.services import write_queue
+from app.services.write_queue import insert_rows, run_write
+
+
+@pytest.fixture(autouse=True)
+def _fresh_writers(monkeypatch):
+    # Each test builds its own app; do not hand it a writer bound to an earlier one.
+    monkeypatch.setattr(write_queue, "_writers", {})
+
+
+def _app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'queue.db'}")
+    monkeypatch.setenv("SQLITE_WRITE_QUEUE", "1")
+    monkeypatch.setenv("WRITE_QUEUE_MAX_WAIT_MS", "20")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app
+
+
+def test_concurrent_writes_are_grouped_and_isolated(tmp_path, monkeypatch):
+    app = _app(tmp_path, monkeypatch)
+    results, errors = [], []
+
+    def duplicate_emails(session):
+        session.add_all([User(name="a", email="dup@x", password_hash="h"), User(name="b", email="dup@x", password_hash="h")])
+        session.flush()
+
+    def write(i):
+        with app.app_context():
+            try:
+                if i == 3:
+                    # Duplicate email: only this job may fail, not the batch it was grouped with.
+                    run_write(duplicate_emails)
+                else:
+                    results.extend(insert_rows([(User, {"name": f"u{i}", "email": f"u{i}@x", "password_hash": "h"})]))
+            except IntegrityError as exc:
+                errors.append(exc)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 1
+    assert len(set(results)) == 7
+    with app.app_context():
+        assert User.query.count() == 7
+
+
+def test_practice_submit_goes_through_writer(tmp_path, monkeypatch):
+    app = _app(tmp_path, monkeypatch)
+    client = app.test_client()
+    client.post("/api/auth/register", json={"name": "L", "email": "l@example.com", "password": "secret123"})
+    token = client.post("/api/auth/login", json={"email": "l@example.com", "password": "secret123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    res = client.post("/api/style/select", json={"learning_style": "kinesthetic"}, headers=headers)
+    headers = {"Authorization": f"Bearer {res.headers['X-Access-Token']}"}
+
+    res = client.post("/api/practice/submit", json={"task_name": "Loops", "time_spent": 30}, headers=headers)
+    assert res.status_code == 200
+    with app.app_context():
+        row = db.session.get(PracticeActivity, res.get_json()["activity_id"])
+        assert row.task_name == "Loops"